@@ -19,7 +19,10 @@ class BaseModuleWidget:
     def render(self, request=None, context=None, **kwargs):
         context = context or {}
         context['widget'] = self.get_context_data(request=request, **kwargs)
+        return self.render_template(context, request)
 
+    def render_template(self, context, request=None):
+        """ Renders the template of the widget with the given context, which contains the widget context """
         template = get_template(self.template_name, using=context.get('template_engine', None))
         rendered_result = template.render(context, request)
 
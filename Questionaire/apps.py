@@ -1,5 +1,51 @@
 from django.apps import AppConfig
+from django.core.signals import request_started, request_finished
+from django.db.models.signals import post_save, post_delete, m2m_changed
 
 
 class QuestionaireConfig(AppConfig):
     name = 'Questionaire'
+
+    def ready(self):
+        super(QuestionaireConfig, self).ready()
+        from Questionaire.models import Page, PageEntry, PageEntryText, PageEntryQuestion, PageRequirement, \
+            Question, AnswerOption, AnswerScoring, AnswerScoringNote, ScoringDeclaration, Technology, TechGroup, \
+            TechScoreLink, Score, Inquiry
+        from Questionaire.processors import questionaire_definition, score_vectors, technology_verdicts, \
+            result_fragments
+
+        # Any change in the questionaire definition invalidates the compiled definition
+        for model in [Page, PageEntry, PageEntryText, PageEntryQuestion, PageRequirement, Question, AnswerOption,
+                      AnswerScoring, ScoringDeclaration, Technology, TechGroup, TechScoreLink]:
+            post_save.connect(questionaire_definition.invalidate_questionaire_definition, sender=model)
+            post_delete.connect(questionaire_definition.invalidate_questionaire_definition, sender=model)
+        for through_model in [Page.include_on.through, Page.exclude_on.through, TechGroup.sub_technologies.through]:
+            m2m_changed.connect(questionaire_definition.invalidate_questionaire_definition, sender=through_model)
+
+        # Direct changes in scores invalidate the compact score copy of the inquiry
+        post_save.connect(score_vectors.invalidate_score_vector_on_change, sender=Score)
+        post_delete.connect(score_vectors.invalidate_score_vector_on_change, sender=Score)
+
+        # Direct changes in scores and changes in notes invalidate the cached result fragments
+        post_save.connect(result_fragments.increment_score_version_on_change, sender=Score)
+        post_delete.connect(result_fragments.increment_score_version_on_change, sender=Score)
+        post_save.connect(result_fragments.touch_technology_on_note_change, sender=AnswerScoringNote)
+        post_delete.connect(result_fragments.touch_technology_on_note_change, sender=AnswerScoringNote)
+        for through_model in [AnswerScoringNote.include_on.through, AnswerScoringNote.exclude_on.through]:
+            m2m_changed.connect(result_fragments.touch_technology_on_note_requirement_change, sender=through_model)
+
+        # Keep the stored technology verdicts up to date, these are connected after the definition invalidation so
+        # the verdicts are computed with the adjusted definition
+        post_save.connect(technology_verdicts.refresh_verdicts_on_inquiry_creation, sender=Inquiry)
+        post_save.connect(technology_verdicts.refresh_verdicts_on_score_change, sender=Score)
+        post_delete.connect(technology_verdicts.refresh_verdicts_on_score_change, sender=Score)
+        post_save.connect(technology_verdicts.refresh_verdicts_on_link_change, sender=TechScoreLink)
+        post_delete.connect(technology_verdicts.refresh_verdicts_on_link_change, sender=TechScoreLink)
+        post_save.connect(technology_verdicts.refresh_verdicts_on_declaration_change, sender=ScoringDeclaration)
+        post_save.connect(technology_verdicts.refresh_verdicts_on_technology_change, sender=Technology)
+        post_save.connect(technology_verdicts.refresh_verdicts_on_technology_change, sender=TechGroup)
+        m2m_changed.connect(technology_verdicts.refresh_verdicts_on_tech_group_change,
+                            sender=TechGroup.sub_technologies.through)
+
+        request_started.connect(questionaire_definition.start_request)
+        request_finished.connect(questionaire_definition.finish_request)
@@ -0,0 +1,209 @@
+import json
+import random
+import subprocess
+import time
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from Questionaire.benchmarks.synthetic import get_synthetic_answer
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+
+""" This file contains code that drives synthetic inquirers through the questionaire and measures each request
+
+Each inquirer is a separate test client that creates an inquirer, answers every page it is led to, views the result
+pages and downloads the requested reports. The duration and number of queries of every request are recorded per view.
+"""
+
+__all__ = ['percentile', 'ViewMeasurements', 'BenchmarkRunner', 'save_benchmark_results', 'load_benchmark_results',
+           'compare_benchmark_results']
+
+
+def percentile(values, fraction):
+    """ Returns the value below which the given fraction of the values lies (nearest rank)
+    :param values: A sorted list of values
+    :param fraction: The fraction, e.g. 0.9 for the 90th percentile
+    """
+    if not values:
+        return None
+    rank = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(rank, len(values) - 1)]
+
+
+class ViewMeasurements:
+    """ The measured durations and query counts of all requests to a single view """
+
+    def __init__(self):
+        self.durations = []
+        self.query_counts = []
+        self.errors = 0
+
+    def add(self, duration, query_count, is_error=False):
+        self.durations.append(duration)
+        self.query_counts.append(query_count)
+        if is_error:
+            self.errors += 1
+
+    def summarize(self):
+        """ Returns the latency percentiles (in ms) and query counts as a dictionary """
+        durations = sorted(self.durations)
+        query_counts = sorted(self.query_counts)
+        return {
+            'requests': len(durations),
+            'errors': self.errors,
+            'mean_ms': round(sum(durations) / len(durations) * 1000, 3) if durations else None,
+            'p50_ms': round(percentile(durations, 0.5) * 1000, 3) if durations else None,
+            'p90_ms': round(percentile(durations, 0.9) * 1000, 3) if durations else None,
+            'p99_ms': round(percentile(durations, 0.99) * 1000, 3) if durations else None,
+            'max_ms': round(durations[-1] * 1000, 3) if durations else None,
+            'queries_mean': round(sum(query_counts) / len(query_counts), 2) if query_counts else None,
+            'queries_p50': percentile(query_counts, 0.5),
+            'queries_max': query_counts[-1] if query_counts else None,
+        }
+
+
+class BenchmarkRunner:
+    """ Drives synthetic inquirers through the questionaire with the Django test client
+
+    The questionaire should be present in the database, e.g. through build_synthetic_questionaire.
+
+    :param num_inquirers: The number of inquirers that complete the questionaire
+    :param report_slugs: The slugs of the reports each inquirer downloads at the end
+    :param seed: The seed of the random generator that draws the answers
+    """
+    # Safeguard against questionaires that never complete
+    max_requests_per_inquirer = 500
+
+    def __init__(self, num_inquirers=10, report_slugs=None, seed=0):
+        self.num_inquirers = num_inquirers
+        self.report_slugs = report_slugs or []
+        self.seed = seed
+        self.measurements = {}
+        self.incomplete_inquirers = 0
+
+    def request(self, client, view_name, method, url, data=None):
+        """ Executes a request and records its duration and query count under the given view name
+        :return: The response, None if the request raised an exception
+        """
+        response = None
+        is_error = False
+        with CaptureQueriesContext(connection) as context:
+            start_time = time.perf_counter()
+            try:
+                response = getattr(client, method)(url, data or {})
+                is_error = response.status_code >= 400
+            except Exception:
+                is_error = True
+            duration = time.perf_counter() - start_time
+
+        self.measurements.setdefault(view_name, ViewMeasurements()).add(duration, len(context), is_error=is_error)
+        return response
+
+    def get_page_answers(self, page_id, rng):
+        """ Returns the POST data answering all questions on the given page """
+        definition = get_questionaire_definition()
+        page = definition.get_page(page_id)
+        data = {}
+        if page is None:
+            return data
+        for question_id in page.question_ids:
+            question = definition.get_question(question_id)
+            data[question.name] = get_synthetic_answer(question, rng)
+        return data
+
+    def run_inquirer(self, rng):
+        """ Lets a single synthetic inquirer complete the questionaire and view its results """
+        client = Client()
+        self.request(client, 'new_query', 'post', reverse('new_query'), {
+            'accept_cookies': 'on',
+            'accept_privacy': 'on',
+        })
+        self.request(client, 'start_query', 'post', reverse('start_query'), {'email_ignore': 'on'})
+
+        results_url = reverse('results_display')
+        for i in range(self.max_requests_per_inquirer):
+            response = self.request(client, 'run_query:get', 'get', reverse('run_query'))
+            if response is not None and response.status_code == 302 and response.url == results_url:
+                # No remaining page is valid for the inquiry, so it has been completed
+                break
+            answers = self.get_page_answers(client.session.get('page_id', None), rng)
+            response = self.request(client, 'run_query:post', 'post', reverse('run_query'), answers)
+            if response is None or response.status_code != 302:
+                # The page could not be processed, stop this inquirer
+                self.incomplete_inquirers += 1
+                return
+            if response.url == results_url:
+                break
+        else:
+            self.incomplete_inquirers += 1
+            return
+
+        self.request(client, 'results_display', 'get', results_url)
+        self.request(client, 'results_advised', 'get', reverse('results_advised'))
+        self.request(client, 'results_not_advised', 'get', reverse('results_not_advised'))
+        for report_slug in self.report_slugs:
+            self.request(client, 'download_pdf', 'get', reverse('download_pdf', kwargs={'report_slug': report_slug}))
+
+    def run(self):
+        """ Runs the benchmark
+        :return: A dictionary with the measurements per view
+        """
+        rng = random.Random(self.seed)
+        start_time = time.perf_counter()
+        for i in range(self.num_inquirers):
+            self.run_inquirer(rng)
+        duration = time.perf_counter() - start_time
+
+        return {
+            'created_on': timezone.now().isoformat(),
+            'commit': get_current_commit(),
+            'num_inquirers': self.num_inquirers,
+            'incomplete_inquirers': self.incomplete_inquirers,
+            'duration_s': round(duration, 3),
+            'views': {view_name: measurements.summarize()
+                      for view_name, measurements in sorted(self.measurements.items())},
+        }
+
+
+def get_current_commit():
+    """ Returns the git commit the code is on, None if it can not be determined """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_benchmark_results(results, file_path):
+    with open(file_path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def load_benchmark_results(file_path):
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def compare_benchmark_results(baseline, current, tolerance=0.1, keys=('p50_ms', 'p90_ms', 'queries_mean')):
+    """ Compares two benchmark results view by view
+    :param baseline: The results to compare against
+    :param current: The new results
+    :param tolerance: The relative increase that is still accepted
+    :param keys: The measurements to compare
+    :return: A list of (view_name, key, baseline value, current value, is_regression) tuples
+    """
+    comparison = []
+    for view_name, current_view in current['views'].items():
+        baseline_view = baseline['views'].get(view_name, None)
+        if baseline_view is None:
+            continue
+        for key in keys:
+            old_value = baseline_view.get(key, None)
+            new_value = current_view.get(key, None)
+            if old_value is None or new_value is None:
+                continue
+            is_regression = new_value > old_value * (1 + tolerance)
+            comparison.append((view_name, key, old_value, new_value, is_regression))
+    return comparison
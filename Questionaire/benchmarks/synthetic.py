@@ -0,0 +1,175 @@
+import random
+from decimal import Decimal
+
+from Questionaire.models import Page, PageEntryText, PageEntryQuestion, PageRequirement, Question, AnswerOption, \
+    AnswerScoring, ScoringDeclaration, Technology, TechGroup, TechScoreLink
+from Questionaire.processors.questionaire_definition import invalidate_questionaire_definition
+
+""" This file contains code that builds a synthetic questionaire and synthetic answers for it
+
+The questionaire resembles a real questionaire: pages with a mix of question types, answer options that adjust the
+scores of the technologies, tech groups combining technologies and pages that are only displayed for some scores.
+"""
+
+__all__ = ['SyntheticQuestionaireConfig', 'build_synthetic_questionaire', 'get_synthetic_answer']
+
+
+class SyntheticQuestionaireConfig:
+    """ The size of a synthetic questionaire
+
+    :param num_pages: The number of question pages
+    :param questions_per_page: The number of questions on each page
+    :param options_per_question: The number of answer options of choice and numeric questions
+    :param num_technologies: The number of technologies, each with its own ScoringDeclaration
+    :param num_tech_groups: The number of tech groups combining the technologies
+    :param requirement_ratio: The fraction of pages with a PageRequirement
+    :param seed: The seed of the random generator, the same seed results in the same questionaire
+    """
+
+    def __init__(self, num_pages=10, questions_per_page=5, options_per_question=4, num_technologies=20,
+                 num_tech_groups=4, requirement_ratio=0.2, seed=0):
+        self.num_pages = num_pages
+        self.questions_per_page = questions_per_page
+        self.options_per_question = options_per_question
+        self.num_technologies = num_technologies
+        self.num_tech_groups = num_tech_groups
+        self.requirement_ratio = requirement_ratio
+        self.seed = seed
+
+    def as_dict(self):
+        return {
+            'num_pages': self.num_pages,
+            'questions_per_page': self.questions_per_page,
+            'options_per_question': self.options_per_question,
+            'num_technologies': self.num_technologies,
+            'num_tech_groups': self.num_tech_groups,
+            'requirement_ratio': self.requirement_ratio,
+            'seed': self.seed,
+        }
+
+
+# The question types in the synthetic questionaire, in the rotation they are assigned in
+QUESTION_TYPES = [Question.TYPE_CHOICE, Question.TYPE_INT, Question.TYPE_YESNO, Question.TYPE_DOUBLE,
+                  Question.TYPE_BESTMULTI, Question.TYPE_OPEN]
+
+
+def _create_answer_options(question, config):
+    """ Returns the (unsaved) answer options of the given question """
+    if question.question_type == Question.TYPE_YESNO:
+        return [AnswerOption(question=question, answer="True", value=1),
+                AnswerOption(question=question, answer="False", value=0)]
+    if question.question_type == Question.TYPE_OPEN:
+        return [AnswerOption(question=question, answer="NotNone", value=1)]
+    if question.question_type in (Question.TYPE_INT, Question.TYPE_DOUBLE):
+        # Numeric questions select the option with the highest threshold below the answer
+        return [AnswerOption(question=question, answer=str(i * 100), value=i)
+                for i in range(config.options_per_question)]
+    return [AnswerOption(question=question, answer=f"Option {i}", value=i + 1)
+            for i in range(config.options_per_question)]
+
+
+def build_synthetic_questionaire(config=None):
+    """ Creates a synthetic questionaire in the database
+    :param config: A SyntheticQuestionaireConfig, defaults to the default configuration
+    :return: The created pages in order
+    """
+    config = config or SyntheticQuestionaireConfig()
+    rng = random.Random(config.seed)
+
+    declarations = []
+    technologies = []
+    for i in range(config.num_technologies):
+        declaration = ScoringDeclaration.objects.create(name=f"synth_score_{i}", description="Synthetic score")
+        technology = Technology.objects.create(
+            name=f"Synthetic technology {i}",
+            short_text="Synthetic technology",
+            display_in_step_1_list=(i % 2 == 0),
+            display_in_step_2_list=True,
+            display_in_step_3_list=True,
+            display_order=i,
+        )
+        TechScoreLink.objects.create(
+            score_declaration=declaration,
+            technology=technology,
+            score_threshold_approve=Decimal('1.5'),
+            score_threshold_deny=Decimal('-0.5'),
+        )
+        declarations.append(declaration)
+        technologies.append(technology)
+
+    for i in range(config.num_tech_groups):
+        tech_group = TechGroup.objects.create(
+            name=f"Synthetic tech group {i}",
+            short_text="Synthetic tech group",
+            display_in_step_2_list=True,
+            display_order=config.num_technologies + i,
+        )
+        tech_group.sub_technologies.add(*rng.sample(technologies, min(3, len(technologies))))
+
+    pages = []
+    questions = []
+    for page_nr in range(config.num_pages):
+        page = Page.objects.create(name=f"Synthetic page {page_nr}", position=page_nr + 1)
+        # The text refers to a score, so the text formatting is part of the benchmark
+        PageEntryText.objects.create(page=page, position=0,
+                                     text=f"Synthetic page {page_nr}, score {{v_synth_score_0}}")
+
+        # Pages after the first can be hidden depending on the scores so far
+        if page_nr > 0 and declarations and rng.random() < config.requirement_ratio:
+            PageRequirement.objects.create(
+                page=page,
+                score_declaration=rng.choice(declarations),
+                threshold=Decimal('0'),
+                comparison=1,
+            )
+
+        for question_nr in range(config.questions_per_page):
+            question_type = QUESTION_TYPES[len(questions) % len(QUESTION_TYPES)]
+            question = Question.objects.create(
+                name=f"synth_q_{page_nr}_{question_nr}",
+                description="Synthetic question",
+                question_text=f"Synthetic question {question_nr} on page {page_nr}",
+                question_type=question_type,
+            )
+            PageEntryQuestion.objects.create(page=page, question=question, position=question_nr + 1)
+            questions.append(question)
+        pages.append(page)
+
+    answer_options = []
+    for question in questions:
+        answer_options.extend(_create_answer_options(question, config))
+    AnswerOption.objects.bulk_create(answer_options)
+
+    scorings = []
+    for answer_option in AnswerOption.objects.filter(question__in=questions).order_by('id'):
+        for declaration in rng.sample(declarations, min(2, len(declarations))):
+            scorings.append(AnswerScoring(
+                answer_option=answer_option,
+                declaration=declaration,
+                score_change_value=Decimal(rng.randint(-2, 2)),
+            ))
+    AnswerScoring.objects.bulk_create(scorings)
+
+    # Bulk creation does not send the signals that keep the compiled questionaire up to date
+    invalidate_questionaire_definition()
+    return pages
+
+
+def get_synthetic_answer(question, rng):
+    """ Returns a random answer for the given question in the format of its form field
+    :param question: The QuestionDefinition to answer
+    :param rng: The random.Random instance to draw the answer from
+    """
+    if question.question_type == Question.TYPE_YESNO:
+        return rng.choice(["True", "False"])
+    if question.question_type == Question.TYPE_OPEN:
+        return f"Synthetic answer {rng.randint(0, 1000)}"
+    if question.question_type == Question.TYPE_INT:
+        return str(rng.randint(0, 500))
+    if question.question_type == Question.TYPE_DOUBLE:
+        return str(round(rng.uniform(0, 500), 2))
+    if question.question_type == Question.TYPE_BESTMULTI:
+        # Select at least one option, so the question is always answered
+        selected = [str(option.value) for option in question.answer_options if rng.random() < 0.5]
+        return selected or [str(rng.choice(question.answer_options).value)]
+    return str(rng.choice(question.answer_options).value)
@@ -4,8 +4,9 @@ from django.core.exceptions import ValidationError
 
 from .widgets_question import *
 from .widgets_question import IgnorableInputMixin
-from .models import ExternalQuestionSource, InquiryQuestionAnswer, Question, AnswerOption
+from .models import ExternalQuestionSource, InquiryQuestionAnswer, Question
 from .processors.question_processors import get_answer_option_through_question
+from .processors.questionaire_definition import get_questionaire_definition
 
 
 class QuestionFieldFactory:
@@ -29,34 +30,60 @@ class QuestionFieldFactory:
             return QuestionFieldFactory.get_field_by_questionmodel(peq.question, inquiry=inquiry, required=peq.required)
 
     @staticmethod
-    def get_field_by_questionmodel(question, inquiry=None, required=False):
+    def get_field_by_entry_definition(entry, inquiry=None, answers=None, external_sources=None):
+        """
+        Returns an initiated field based on the entry type
+        :param entry: The PageEntryDefinition object from the compiled questionaire definition
+        :param inquiry: The inquiry object (can be left out to generate blank questions)
+        :param answers: A prefetched dictionary of InquiryQuestionAnswers keyed by question id
+        :param external_sources: A prefetched dictionary of ExternalQuestionSources keyed by question id
+        :return: An initiated Field instance
+        """
+        if entry.entry_type == 1:
+            return InformationField(entry, inquiry=inquiry)
+        elif entry.entry_type == 2:
+            question = get_questionaire_definition().get_question(entry.question_id).get_model()
+            return QuestionFieldFactory.get_field_by_questionmodel(question, inquiry=inquiry, required=entry.required,
+                                                                   answers=answers,
+                                                                   external_sources=external_sources)
+
+    @staticmethod
+    def get_field_by_questionmodel(question, inquiry=None, required=False, answers=None, external_sources=None):
         """
         Returns an initiated QuestionField based on the question entered
         :param question: The question object
         :param inquiry: The inquiry object
         :param required: Whether the field should be required, defaults to false
+        :param answers: A prefetched dictionary of InquiryQuestionAnswers keyed by question id, queried if not given
+        :param external_sources: A prefetched dictionary of ExternalQuestionSources keyed by question id, queried if
+        not given
         :return:
         """
         q_type = question.question_type
+        kwargs = {
+            'required': required,
+            'answers': answers,
+            'external_sources': external_sources,
+        }
 
         if q_type == Question.TYPE_OPEN:
             # Text question
-            return CharQuestionField(question, inquiry, required=required)
+            return CharQuestionField(question, inquiry, **kwargs)
         if q_type == Question.TYPE_INT:
             # Integer question
-            return IntegerQuestionField(question, inquiry, required=required)
+            return IntegerQuestionField(question, inquiry, **kwargs)
         if q_type == Question.TYPE_DOUBLE:
             # Double question
-            return DecimalQuestionField(question, inquiry, required=required)
+            return DecimalQuestionField(question, inquiry, **kwargs)
         if q_type == Question.TYPE_CHOICE:
             # Single choice question
-            return ChoiceQuestionField(question, inquiry, required=required)
+            return ChoiceQuestionField(question, inquiry, **kwargs)
         if q_type == Question.TYPE_YESNO:
             # Yes / No question
-            return YesNoQuestionField(question, inquiry, required=required)
+            return YesNoQuestionField(question, inquiry, **kwargs)
         if q_type == Question.TYPE_BESTMULTI:
             # Multiple choice question
-            return BestChoiceQuestionField(question, inquiry, required=required)
+            return BestChoiceQuestionField(question, inquiry, **kwargs)
 
         raise ValueError("q_type is beyond expected range")
 
@@ -82,12 +109,17 @@ class QuestionFieldMixin:
     :param question: the question object
     """
 
-    def __init__(self, question, inquiry, *args, **kwargs):
+    def __init__(self, question, inquiry, *args, answers=None, external_sources=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.answers = answers
 
-        if ExternalQuestionSource.objects.filter(question=question).exists():
+        if external_sources is None:
+            external_source = ExternalQuestionSource.objects.filter(question=question).first()
+        else:
+            external_source = external_sources.get(question.id, None)
+        if external_source is not None:
             # Check if the input of this question should come from elsewhere, if so replace the widget
-            self.widget = ExternalDataInputLocal(inquiry, question.externalquestionsource)
+            self.widget = ExternalDataInputLocal(inquiry, external_source)
 
         # Set the local attributes
         self.question = question
@@ -112,9 +144,13 @@ class QuestionFieldMixin:
 
     def get_current_answer(self, inquiry):
         """ Returns the initial answer. Can be overwritten in case of multiple answers or complex answer retrieval """
-        answer_obj = InquiryQuestionAnswer.objects.filter(question=self.question, inquiry=inquiry)
-        if answer_obj.exists():
-            return answer_obj.first().answer
+        if self.answers is not None:
+            answer_obj = self.answers.get(self.question.id, None)
+        else:
+            answer_obj = InquiryQuestionAnswer.objects.filter(question=self.question, inquiry=inquiry).first()
+
+        if answer_obj is not None:
+            return answer_obj.answer
         else:
             return None
 
@@ -215,11 +251,11 @@ class ChoiceQuestionField(IgnorableQuestionFieldMixin, ChoiceField):
         images = {}
 
         # Get all the answer options and place them in a list
-        for answer in question.answeroption_set.order_by("value"):
+        for answer in get_questionaire_definition().get_answer_options(question.id):
             choices.append((answer.value, answer.answer))
             # If answer option has an image, load that image onto the widget
             if answer.image:
-                images[answer.value] = answer.image
+                images[answer.value] = answer.get_model().image
 
         self.choices = choices
         self.widget.images = images
@@ -246,11 +282,9 @@ class YesNoQuestionField(IgnorableQuestionFieldMixin, ChoiceField):
         self.choices = choices
 
         def get_answer_image(answer_str):
-            try:
-                answer = question.answeroption_set.get(answer=answer_str)
-                return answer.image
-            except AnswerOption.DoesNotExist:
-                pass
+            for answer in get_questionaire_definition().get_answer_options(question.id):
+                if answer.answer == answer_str:
+                    return answer.get_model().image
 
         self.widget.images = {
             'True': get_answer_image("True"),
@@ -274,11 +308,11 @@ class BestChoiceQuestionField(IgnorableQuestionFieldMixin, MultipleChoiceField):
         images = {}
 
         # Get all the answer options and place them in a list
-        for answer in question.answeroption_set.order_by("value"):
+        for answer in get_questionaire_definition().get_answer_options(question.id):
             choices.append((answer.value, answer.answer))
             # If answer option has an image, load that image onto the widget
             if answer.image:
-                images[answer.value] = answer.image
+                images[answer.value] = answer.get_model().image
 
         self.choices = choices
         self.widget.images = images
@@ -1,12 +1,15 @@
 from django import forms
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 
 from mailing.forms import MailForm
 from inquirer_settings.models import PendingMailVerifyer
 
-from .models import PageEntry, Inquirer, Question, InquiryQuestionAnswer
+from .models import Inquirer, Inquiry, InquiryQuestionAnswer, ExternalQuestionSource
 from .fields import QuestionFieldFactory, IgnorableEmailField
 from .widgets import SimpleBootstrapCheckBox
+from .processors.score_processing import ScoreChanges
+from .processors.questionaire_definition import get_questionaire_definition
 
 from questionaire_mailing.models import TriggeredMailTask
 
@@ -16,30 +19,75 @@ class QuestionPageForm(forms.Form):
     The Form presenting all questions on a page
     """
 
-    def __init__(self, *args, page=None, inquiry=None, **kwargs):
+    def __init__(self, *args, page=None, inquiry=None, answers=None, external_sources=None, **kwargs):
+        """
+        :param page: The page whose questions are displayed
+        :param inquiry: The inquiry the questions are answered for
+        :param answers: A prefetched dictionary of the InquiryQuestionAnswers on the page keyed by question id
+        :param external_sources: A prefetched dictionary of the ExternalQuestionSources on the page keyed by question id
+        """
         super(QuestionPageForm, self).__init__(*args, **kwargs)
         self.page = page
-        self.questions = Question.objects.filter(pageentryquestion__page=page)
+        self.inquiry = inquiry
+        self.questions = []
+        self.answers = answers
+
+        page_definition = None
+        if page is not None:
+            page_definition = get_questionaire_definition().get_page(page.id)
+        if page_definition is None:
+            return
+
+        # Retrieve all answers and external sources of the page at once
+        if self.answers is None and inquiry is not None:
+            self.answers = self.get_answers_for_page(inquiry, page_definition.question_ids)
+        if external_sources is None:
+            external_sources = self.get_external_sources_for_page(page_definition.question_ids)
 
         # Get all page entries and transform them to a field
-        for entry in PageEntry.objects.filter(page=page).order_by('position'):
-            field = QuestionFieldFactory.get_field_by_entrymodel(entry, inquiry=inquiry)
+        for entry in page_definition.entries:
+            field = QuestionFieldFactory.get_field_by_entry_definition(entry,
+                                                                       inquiry=inquiry,
+                                                                       answers=self.answers,
+                                                                       external_sources=external_sources)
+            if entry.question_id is not None:
+                self.questions.append(field.question)
 
             self.fields[field.name] = field
 
-        self.backward(inquiry)
-
-    def _save_raw(self, question, inquiry):
+    @staticmethod
+    def get_answers_for_page(inquiry, question_ids):
+        """ Returns a dictionary of all InquiryQuestionAnswers of the given questions keyed by question id """
+        return {
+            answer.question_id: answer for answer in
+            InquiryQuestionAnswer.objects.filter(inquiry=inquiry, question_id__in=question_ids)
+        }
+
+    @staticmethod
+    def get_external_sources_for_page(question_ids):
+        """ Returns a dictionary of all ExternalQuestionSources of the given questions keyed by question id """
+        return {
+            source.question_id: source for source in
+            ExternalQuestionSource.objects.filter(question_id__in=question_ids).select_related(
+                'local_table', 'local_attribute')
+        }
+
+    def _uses_prefetched_answers(self, inquiry):
+        return self.answers is not None and self.inquiry is not None and self.inquiry.id == inquiry.id
+
+    def _save_raw(self, question, inquiry, score_changes, answer_obj):
         """ Saves a certain question in a raw format"""
         answer = self.fields[question.name].widget.value_from_datadict(self.data,
                                                                        self.files,
                                                                        self.add_prefix(question.name))
-        question.answer_for_inquiry(inquiry, answer, False)
+        question.answer_for_inquiry(inquiry, answer, False, score_changes=score_changes, answer_obj=answer_obj,
+                                    commit=False)
 
-    def _save_clean(self, question, inquiry):
+    def _save_clean(self, question, inquiry, score_changes, answer_obj):
         """ Saves a certain question with cleaned data"""
         answer = self.cleaned_data[question.name]
-        question.answer_for_inquiry(inquiry, answer, True)
+        question.answer_for_inquiry(inquiry, answer, True, score_changes=score_changes, answer_obj=answer_obj,
+                                    commit=False)
 
     def save(self, inquiry, save_raw=False):
         if not save_raw and not self.is_valid():
@@ -56,44 +104,80 @@ class QuestionPageForm(forms.Form):
         else:
             save_method = self._save_clean
 
-        # Save all questions
-        for question in self.questions:
-            save_method(question, inquiry)
+        # The answers and scores of the page are stored together, so a failure does not leave partial adjustments
+        with transaction.atomic(savepoint=False):
+            if self._uses_prefetched_answers(inquiry):
+                answers = self.answers
+            else:
+                answers = self.get_answers_for_page(inquiry, [question.id for question in self.questions])
+
+            # Save all questions, answers that were already processed adjust the scores with the difference in answer
+            score_changes = ScoreChanges()
+            existing_answers = []
+            new_answers = []
+            for question in self.questions:
+                answer_obj = answers.get(question.id, None)
+                if answer_obj is None:
+                    answer_obj = InquiryQuestionAnswer(inquiry=inquiry, question=question)
+                    new_answers.append(answer_obj)
+                else:
+                    existing_answers.append(answer_obj)
+                save_method(question, inquiry, score_changes, answer_obj)
+
+            InquiryQuestionAnswer.objects.bulk_update(existing_answers, ['answer', 'processed', 'processed_answer'])
+            if new_answers:
+                InquiryQuestionAnswer.objects.bulk_create(new_answers)
+                # Not all databases return the ids of created objects, so retrieve the answers anew
+                answers = self.get_answers_for_page(inquiry, [question.id for question in self.questions])
+            if self._uses_prefetched_answers(inquiry):
+                self.answers = answers
+            score_changes.apply(inquiry)
+            if not score_changes.get_net_changes():
+                # The answers changed without adjusting the scores, the results can still display the answers
+                Inquiry.increment_score_versions([inquiry.id])
 
         # Update the inquiry itself (to adjust the last_visited time
         inquiry.save()
 
+    def _get_page_answers(self, inquiry):
+        """ Returns the InquiryQuestionAnswers of the questions on this page """
+        if self._uses_prefetched_answers(inquiry):
+            return list(self.answers.values())
+        return list(InquiryQuestionAnswer.objects.filter(inquiry=inquiry, question__in=self.questions))
+
     def forward(self, inquiry):
         """
         Process all questions in a forward manner
         :return:
         """
         # For each question in this form
-        # Process the anwers
-
-        # Loop over all questions in this form
-        for question in self.questions:
-            try:
-                inquiry_answer = InquiryQuestionAnswer.objects.get(inquiry=inquiry, question=question)
-                inquiry_answer.forward()
-            except InquiryQuestionAnswer.DoesNotExist:
-                # If the object does not exist yet, which is the case on empty answers
-                continue
+        # Process the anwers that are not yet processed
+        answers = [answer for answer in self._get_page_answers(inquiry)
+                   if not answer.processed and answer.processed_answer_id is not None]
+        self._process_answers(inquiry, answers, revert=False)
 
     def backward(self, inquiry):
         """
         Process all questions in a backwards manner
         :return:
         """
-
-        # Loop over all questions in this form
-        for question in self.questions:
-            try:
-                inquiry_answer = InquiryQuestionAnswer.objects.get(inquiry=inquiry, question=question)
-                inquiry_answer.backward()
-            except InquiryQuestionAnswer.DoesNotExist:
-                # If the object does not exist yet, which is the case on empty answers
-                continue
+        answers = [answer for answer in self._get_page_answers(inquiry) if answer.processed]
+        self._process_answers(inquiry, answers, revert=True)
+
+    @staticmethod
+    def _process_answers(inquiry, answers, revert=False):
+        """ Adjusts the scores for all given answers at once and updates their processed state """
+        score_changes = ScoreChanges()
+        answer_ids = []
+        for inquiry_answer in answers:
+            score_changes.merge(inquiry_answer.get_score_changes(revert=revert))
+            answer_ids.append(inquiry_answer.id)
+            inquiry_answer.processed = not revert
+
+        if answer_ids:
+            with transaction.atomic(savepoint=False):
+                score_changes.apply(inquiry)
+                InquiryQuestionAnswer.objects.filter(id__in=answer_ids).update(processed=not revert)
 
 
 class EmailForm(forms.Form):
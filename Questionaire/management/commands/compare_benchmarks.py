@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Questionaire.benchmarks.runner import load_benchmark_results, compare_benchmark_results
+
+
+class Command(BaseCommand):
+    help = 'Compares two stored benchmark results and reports the views that regressed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline', help='The JSON results to compare against')
+        parser.add_argument('current', help='The new JSON results')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.1,
+            help='The relative increase that is not yet considered a regression',
+        )
+
+    def handle(self, *args, **options):
+        baseline = load_benchmark_results(options['baseline'])
+        current = load_benchmark_results(options['current'])
+
+        regressions = 0
+        for view_name, key, old_value, new_value, is_regression in compare_benchmark_results(
+                baseline, current, tolerance=options['tolerance']):
+            marker = "REGRESSION" if is_regression else ""
+            print(f"{view_name:<22} {key:<14} {old_value:>10} -> {new_value:<10} {marker}")
+            if is_regression:
+                regressions += 1
+
+        if regressions:
+            raise CommandError(f"{regressions} measurements regressed between "
+                               f"{baseline.get('commit')} and {current.get('commit')}")
+        print("No regressions found")
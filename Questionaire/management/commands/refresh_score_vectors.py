@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from Questionaire.processors.score_vectors import refresh_score_vectors
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the compact score vectors of all inquiries, e.g. after enabling SCORE_VECTOR_STORAGE or ' \
+           'adjusting the scoring declarations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='The number of inquiries processed at once',
+        )
+
+    def handle(self, *args, **options):
+        num_refreshed = refresh_score_vectors(chunk_size=options['chunk_size'])
+        print(f"Rebuilt {num_refreshed} score vectors")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from Questionaire.processors.technology_verdicts import refresh_all_verdicts
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored technology verdicts of all inquiries, e.g. after enabling ' \
+           'TECHNOLOGY_VERDICT_STORAGE'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='The number of inquiries processed at once',
+        )
+
+    def handle(self, *args, **options):
+        num_refreshed = refresh_all_verdicts(chunk_size=options['chunk_size'])
+        print(f"Created or adjusted {num_refreshed} verdicts")
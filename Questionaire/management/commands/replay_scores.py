@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from Questionaire.processors.score_events import find_score_drift, repair_score_drift
+
+
+class Command(BaseCommand):
+    help = 'Replays the score events of inquiries to detect (and repair) scores that drifted from their log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'inquiry_ids',
+            nargs='*',
+            type=int,
+            help='The ids of the inquiries to check, defaults to all inquiries',
+        )
+        parser.add_argument(
+            '--repair',
+            action='store_true',
+            help='Store the replayed scores for all drifted scores',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='The number of inquiries processed at once',
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {
+            'inquiry_ids': options['inquiry_ids'] or None,
+            'chunk_size': options['chunk_size'],
+        }
+        if options['repair']:
+            differences = repair_score_drift(**kwargs)
+        else:
+            differences = find_score_drift(**kwargs)
+
+        for difference in differences:
+            print(difference)
+        if options['repair']:
+            print(f"Repaired {len(differences)} scores")
+        else:
+            print(f"Found {len(differences)} drifted scores")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from Questionaire.processors.rescoring import rescore_inquiries
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the scores of all inquiries after the scoring configuration has been adjusted'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'inquiry_ids',
+            nargs='*',
+            type=int,
+            help='The ids of the inquiries to rescore, defaults to all inquiries',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only display the differences, do not store them',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='The number of inquiries processed at once',
+        )
+
+    def handle(self, *args, **options):
+        differences = rescore_inquiries(
+            inquiry_ids=options['inquiry_ids'] or None,
+            dry_run=options['dry_run'],
+            chunk_size=options['chunk_size'],
+        )
+
+        if options['dry_run']:
+            for difference in differences:
+                print(difference)
+            print(f"{len(differences)} scores would be adjusted")
+        else:
+            print(f"Adjusted {len(differences)} scores")
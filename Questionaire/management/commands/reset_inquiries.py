@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Questionaire.models import Inquiry
+from Questionaire.processors.rescoring import chunks
+
+
+class Command(BaseCommand):
+    help = 'Resets inquiries: all scores are removed and the inquiries return to the first page, answers are ' \
+           'maintained'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'inquiry_ids',
+            nargs='*',
+            type=int,
+            help='The ids of the inquiries to reset',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Reset all inquiries',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='The number of inquiries reset in a single transaction',
+        )
+
+    def handle(self, *args, **options):
+        if options['inquiry_ids']:
+            inquiry_ids = sorted(options['inquiry_ids'])
+        elif options['all']:
+            inquiry_ids = list(Inquiry.objects.order_by('id').values_list('id', flat=True))
+        else:
+            raise CommandError("Give the ids of the inquiries to reset, or --all to reset all inquiries")
+
+        # Each chunk is reset in its own short transaction, so locks are not held for the entire population
+        num_reset = 0
+        for inquiry_ids_chunk in chunks(inquiry_ids, options['chunk_size']):
+            Inquiry.reset_inquiries(inquiry_ids_chunk)
+            num_reset += len(inquiry_ids_chunk)
+            print(f"Reset {num_reset}/{len(inquiry_ids)} inquiries")
@@ -0,0 +1,90 @@
+import os
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test.runner import DiscoverRunner
+
+from Questionaire.benchmarks.runner import BenchmarkRunner, save_benchmark_results
+from Questionaire.benchmarks.synthetic import SyntheticQuestionaireConfig, build_synthetic_questionaire
+
+
+class Command(BaseCommand):
+    help = 'Drives synthetic inquirers through a synthetic questionaire in a separate test database and reports ' \
+           'the latency and query count per view'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--inquirers',
+            type=int,
+            default=20,
+            help='The number of synthetic inquirers',
+        )
+        parser.add_argument('--pages', type=int, default=10, help='The number of question pages')
+        parser.add_argument('--questions-per-page', type=int, default=5, help='The number of questions on a page')
+        parser.add_argument('--technologies', type=int, default=20, help='The number of technologies')
+        parser.add_argument('--tech-groups', type=int, default=4, help='The number of tech groups')
+        parser.add_argument('--seed', type=int, default=0, help='The seed of the random generator')
+        parser.add_argument(
+            '--report',
+            action='append',
+            default=[],
+            dest='reports',
+            help='The slug of a report to download at the end, can be given multiple times. The report should be '
+                 'present in the test database, e.g. through a fixture',
+        )
+        parser.add_argument(
+            '--fixture',
+            action='append',
+            default=[],
+            dest='fixtures',
+            help='A fixture to load in the test database before the benchmark',
+        )
+        parser.add_argument(
+            '--output',
+            default=None,
+            help='The file the results are stored in as JSON, defaults to benchmarks/<commit>.json',
+        )
+
+    def handle(self, *args, **options):
+        config = SyntheticQuestionaireConfig(
+            num_pages=options['pages'],
+            questions_per_page=options['questions_per_page'],
+            num_technologies=options['technologies'],
+            num_tech_groups=options['tech_groups'],
+            seed=options['seed'],
+        )
+
+        # Run in a separate database so the synthetic data never mixes with real data
+        test_runner = DiscoverRunner(verbosity=0, interactive=False)
+        test_runner.setup_test_environment()
+        old_config = test_runner.setup_databases()
+        try:
+            if options['fixtures']:
+                call_command('loaddata', *options['fixtures'], verbosity=0)
+            build_synthetic_questionaire(config)
+
+            runner = BenchmarkRunner(
+                num_inquirers=options['inquirers'],
+                report_slugs=options['reports'],
+                seed=options['seed'],
+            )
+            results = runner.run()
+        finally:
+            test_runner.teardown_databases(old_config)
+            test_runner.teardown_test_environment()
+
+        results['config'] = config.as_dict()
+
+        output = options['output']
+        if output is None:
+            os.makedirs('benchmarks', exist_ok=True)
+            output = os.path.join('benchmarks', f"{results['commit'] or 'results'}.json")
+        save_benchmark_results(results, output)
+
+        for view_name, summary in results['views'].items():
+            print(f"{view_name:<22} n={summary['requests']:<5} errors={summary['errors']:<3} "
+                  f"p50={summary['p50_ms']}ms p90={summary['p90_ms']}ms p99={summary['p99_ms']}ms "
+                  f"queries={summary['queries_mean']}")
+        if results['incomplete_inquirers']:
+            print(f"{results['incomplete_inquirers']} inquirers could not complete the questionaire")
+        print(f"Stored results in {output}")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from Questionaire.models import Inquiry
+from Questionaire.processors.rescoring import chunks
+from Questionaire.processors.score_events import prune_score_events, take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Stores snapshots of the scores of inquiries, limiting the number of score events that need to be replayed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-events',
+            type=int,
+            default=50,
+            help='Only snapshot inquiries with at least this many score events since their last snapshot',
+        )
+        parser.add_argument(
+            '--keep-events',
+            action='store_true',
+            help='Keep the score events and snapshots that are covered by the new snapshots',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='The number of inquiries processed at once',
+        )
+
+    def handle(self, *args, **options):
+        inquiry_ids = list(Inquiry.objects.order_by('id').values_list('id', flat=True))
+        num_created = 0
+        num_pruned = 0
+        for chunk in chunks(inquiry_ids, options['chunk_size']):
+            num_created += take_snapshots(chunk, min_events=options['min_events'])
+            if not options['keep_events']:
+                num_pruned += prune_score_events(chunk)
+        print(f"Created {num_created} snapshots")
+        if not options['keep_events']:
+            print(f"Pruned {num_pruned} score events")
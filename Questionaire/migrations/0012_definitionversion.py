@@ -0,0 +1,20 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Questionaire', '0011_auto_20210111_1219'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DefinitionVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Questionaire', '0012_definitionversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreVector',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('layout', models.CharField(max_length=40)),
+                ('values', models.TextField(blank=True, default='')),
+                ('inquiry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='Questionaire.Inquiry')),
+            ],
+        ),
+    ]
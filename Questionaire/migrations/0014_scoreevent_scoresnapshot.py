@@ -0,0 +1,55 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:19
+
+import json
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_baseline_snapshots(apps, schema_editor):
+    """ Stores the current scores of existing inquiries as their first snapshot, as their scores were adjusted
+    before any events were logged """
+    Score = apps.get_model('Questionaire', 'Score')
+    ScoreSnapshot = apps.get_model('Questionaire', 'ScoreSnapshot')
+    db_alias = schema_editor.connection.alias
+
+    values = {}
+    for inquiry_id, declaration_id, score in Score.objects.using(db_alias).order_by('inquiry_id').values_list(
+            'inquiry_id', 'declaration_id', 'score').iterator():
+        values.setdefault(inquiry_id, {})[str(declaration_id)] = str(score)
+
+    ScoreSnapshot.objects.using(db_alias).bulk_create([
+        ScoreSnapshot(inquiry_id=inquiry_id, last_event_id=0, values=json.dumps(inquiry_values))
+        for inquiry_id, inquiry_values in values.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Questionaire', '0013_scorevector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_event_id', models.PositiveIntegerField(default=0)),
+                ('values', models.TextField(default='{}')),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('inquiry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Questionaire.Inquiry')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScoreEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change', models.DecimalField(decimal_places=2, max_digits=7)),
+                ('created_on', models.DateTimeField(auto_now_add=True)),
+                ('declaration', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Questionaire.ScoringDeclaration')),
+                ('inquiry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Questionaire.Inquiry')),
+            ],
+        ),
+        migrations.RunPython(create_baseline_snapshots, migrations.RunPython.noop),
+    ]
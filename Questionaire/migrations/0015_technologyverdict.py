@@ -0,0 +1,31 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Questionaire', '0014_scoreevent_scoresnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TechnologyVerdict',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('verdict', models.SmallIntegerField(choices=[(1, 'Advised'), (0, 'Not advised'), (-1, 'Unknown'), (2, 'Varies')])),
+                ('inquiry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Questionaire.Inquiry')),
+                ('technology', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Questionaire.Technology')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='technologyverdict',
+            index=models.Index(fields=['technology', 'verdict'], name='Questionair_technol_e5a6d9_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='technologyverdict',
+            unique_together={('inquiry', 'technology')},
+        ),
+    ]
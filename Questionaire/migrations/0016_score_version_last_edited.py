@@ -0,0 +1,23 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Questionaire', '0015_technologyverdict'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inquiry',
+            name='score_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='technology',
+            name='last_edited',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
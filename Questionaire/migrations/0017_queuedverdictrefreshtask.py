@@ -0,0 +1,23 @@
+# Generated by Django 2.2.7 on 2026-10-18 13:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queued_tasks', '0004_queuedtask_priority'),
+        ('Questionaire', '0016_score_version_last_edited'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedVerdictRefreshTask',
+            fields=[
+                ('queuedtask_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='queued_tasks.QueuedTask')),
+                ('technology_ids', models.TextField(blank=True, default='')),
+            ],
+            bases=('queued_tasks.queuedtask',),
+        ),
+    ]
@@ -1,14 +1,19 @@
 import ast
-from django.db import models
+from django.db import connection, models, transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 
 from Questionaire.processors.code_translation import inquiry_6encoder
 from Questionaire.processors import question_processors
+from Questionaire.processors.score_processing import ScoreChanges
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors.score_vectors import invalidate_score_vectors
+from Questionaire.processors import technology_verdicts
+from Questionaire.signals import inquiry_completed
 from PageDisplay.models import Page as DisplayPage
 
 __all__ = ['Question', 'Page', 'PageEntry', 'PageEntryText', 'PageEntryQuestion', 'AnswerOption',
-           'Inquiry', 'Inquirer', 'InquiryQuestionAnswer']
+           'Inquiry', 'Inquirer', 'InquiryQuestionAnswer', 'DefinitionVersion']
 
 
 class Question(models.Model):
@@ -59,19 +64,45 @@ class Question(models.Model):
         except InquiryQuestionAnswer.DoesNotExist:
             return False
 
-    def answer_for_inquiry(self, inquiry, answer_value, process=True):
+    def answer_for_inquiry(self, inquiry, answer_value, process=True, score_changes=None, answer_obj=None,
+                           commit=True):
         """
         Creates or updates an answer given to this question
+        If the answer was already processed, the scores are adjusted with the difference between the old and new answer
         :param inquiry: The inquiry the answer is part of
         :param answer_value: The value of the answer
         :param process: Whether the answer option should be processed/ searched
+        :param score_changes: A ScoreChanges object to collect score adjustments in, if not given the adjustments are
+        applied directly
+        :param answer_obj: The (prefetched) InquiryQuestionAnswer of this question, retrieved or created if not given
+        :param commit: Whether the InquiryQuestionAnswer should be saved
         :return: The InquiryQuestionAnswer object updated
         """
-        iqa = InquiryQuestionAnswer.objects.get_or_create(inquiry=inquiry, question=self)[0]
+        if answer_obj is None:
+            iqa = InquiryQuestionAnswer.objects.get_or_create(inquiry=inquiry, question=self)[0]
+        else:
+            iqa = answer_obj
+        if iqa.processed:
+            changes = iqa.get_score_changes(revert=True)
+
         iqa.answer = answer_value
         if process:
             iqa.get_answer_option(update_on_obj=True)
-        iqa.save()
+
+        if iqa.processed:
+            if iqa.processed_answer_id is None:
+                # The answer no longer results in an answer option, so it can no longer be processed
+                iqa.processed = False
+            else:
+                changes.merge(iqa.get_score_changes())
+
+            if score_changes is None:
+                changes.apply(inquiry)
+            else:
+                score_changes.merge(changes)
+
+        if commit:
+            iqa.save()
         return iqa
 
 
@@ -168,27 +199,20 @@ class AnswerOption(models.Model):
     def __str__(self):
         return "{question}: {answer}".format(question=self.question.name, answer=self.answer)
 
+    def get_score_changes(self, revert=False):
+        """ Returns the score adjustments made when this answer option is processed
+        :param revert: Whether the adjustments of the backwards process need to be returned
+        :return: A ScoreChanges object
+        """
+        return ScoreChanges.from_answer_option(self.id, revert=revert)
+
     def forward_for_inquiry(self, inquiry):
         """ Executes a forward processing movement for all adjustments in the inquiry"""
-        # Import the Score class (done here as previously it wasn't processed yet
-        from Questionaire.model_files.tech_scoring_models import Score
-
-        # Loop over all adjustments and adjust them
-        for adjustment in self.answerscoring_set.all():
-            score_obj = Score.objects.get_or_create(declaration=adjustment.declaration, inquiry=inquiry)[0]
-            adjustment.adjust_score(score_obj)
-            score_obj.save()
+        self.get_score_changes().apply(inquiry)
 
     def backward_for_inquiry(self, inquiry):
-        # Import the Score class (done here as previously it wasn't processed yet
-        from Questionaire.model_files.tech_scoring_models import Score
-
-        # Loop over all adjustments and adjust them
-        for adjustment in self.answerscoring_set.all():
-            # Revert all the scores
-            score_obj = Score.objects.get_or_create(declaration=adjustment.declaration, inquiry=inquiry)[0]
-            adjustment.adjust_score(score_obj, revert=True)
-            score_obj.save()
+        """ Executes a backward processing movement for all adjustments in the inquiry"""
+        self.get_score_changes(revert=True).apply(inquiry)
 
 
 class Inquiry(models.Model):
@@ -200,6 +224,16 @@ class Inquiry(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     last_visited = models.DateTimeField(auto_now=True)
     inquirer = models.ForeignKey('Inquirer', on_delete=models.CASCADE)
+    # Incremented whenever the answers or scores change, used to invalidate the cached results of the inquiry
+    score_version = models.PositiveIntegerField(default=0)
+
+    def save(self, *args, **kwargs):
+        # The score version is only adjusted through increment_score_versions, so saving an outdated instance does not
+        # revert the version
+        if not self._state.adding and kwargs.get('update_fields', None) is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'score_version']
+        super(Inquiry, self).save(*args, **kwargs)
 
     def set_current_page(self, page):
         self.current_page = page
@@ -222,22 +256,60 @@ class Inquiry(models.Model):
         self.completed_on = timezone.now()
         self.current_page = None
         self.save()
+        inquiry_completed.send(sender=Inquiry, inquiry=self)
 
     def reset(self):
         """ Resets the inquiry data, it maintains all answers, but removes all scores """
-        # Remove all score objects
-        self.score_set.all().delete()
+        Inquiry.reset_inquiries([self.id])
 
-        # Clear all processed states
-        for answer in self.inquiryquestionanswer_set.all():
-            answer.processed = False
-            answer.processed_answer = None
-            answer.save()
-
-        # Adjust own state
+        # Adjust own state to the reset state in the database
         self.is_complete = False
         self.current_page = Page.objects.order_by('position').first()
-        self.save()
+
+    @staticmethod
+    def reset_inquiries(inquiry_ids):
+        """ Resets the given inquiries at once, maintaining all answers, but removing all scores
+
+        Each table is adjusted with a single statement within one transaction.
+        :param inquiry_ids: The ids of the inquiries (or a queryset of ids)
+        """
+        # Import here to avoid circular imports
+        from Questionaire.models import Score, ScoreEvent, ScoreSnapshot
+
+        with transaction.atomic():
+            # Remove all score objects and their history
+            # Score has delete signal receivers, so Score.objects.delete() would load and delete each score
+            # separately. They are removed in a single statement instead, the score vectors and verdicts are
+            # refreshed below
+            scores_sql, params = Score.objects.filter(inquiry_id__in=inquiry_ids).values('id').query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(Score._meta.db_table)} "
+                               f"WHERE {connection.ops.quote_name('id')} IN ({scores_sql})", params)
+            ScoreEvent.objects.filter(inquiry_id__in=inquiry_ids).delete()
+            ScoreSnapshot.objects.filter(inquiry_id__in=inquiry_ids).delete()
+            invalidate_score_vectors(inquiry_ids)
+
+            # Clear all processed states
+            InquiryQuestionAnswer.objects.filter(inquiry_id__in=inquiry_ids).update(
+                processed=False,
+                processed_answer=None,
+            )
+
+            Inquiry.objects.filter(id__in=inquiry_ids).update(
+                is_complete=False,
+                current_page=Page.objects.order_by('position').first(),
+                last_visited=timezone.now(),
+                score_version=models.F('score_version') + 1,
+            )
+
+            if technology_verdicts.is_enabled():
+                # All scores returned to their start values
+                technology_verdicts.refresh_all_verdicts(inquiry_ids=inquiry_ids)
+
+    @staticmethod
+    def increment_score_versions(inquiry_ids):
+        """ Marks the results of the given inquiries as changed, invalidating their cached results """
+        Inquiry.objects.filter(id__in=inquiry_ids).update(score_version=models.F('score_version') + 1)
 
     @property
     def get_owner(self):
@@ -252,6 +324,8 @@ class Inquirer(models.Model):
     created_on = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
 
+    code_lookup_chunk_size = 500
+
     def get_email(self):
         if self.email_validated:
             return self.email
@@ -264,7 +338,7 @@ class Inquirer(models.Model):
         Get the lettercode for this inquiry object
         :return: Returns the lettercode for the given inquiry object
         """
-        inquiry_6encoder.get_code_from_id(model.id)
+        return inquiry_6encoder.get_code_from_id(model.id)
 
     def get_inquiry_code(self):
         return inquiry_6encoder.get_code_from_id(self.id)
@@ -282,6 +356,24 @@ class Inquirer(models.Model):
         # Return the result
         return cls.objects.get(id=id_value)
 
+    @classmethod
+    def get_inquiry_models_from_codes(cls, codes):
+        """
+        Retrieves the inquiry models of many letter-codes at once, with a query per code_lookup_chunk_size codes
+        :param codes: An iterable of 6-letter codes
+        :return: A dictionary of inquirer models keyed by their code, codes without inquirer are left out
+        """
+        codes = list(codes)
+        ids_to_codes = dict(zip(inquiry_6encoder.decode_many(codes), codes))
+        ids = list(ids_to_codes.keys())
+
+        inquirers = {}
+        # Query in chunks to stay within the number of query parameters the database allows
+        for i in range(0, len(ids), cls.code_lookup_chunk_size):
+            for inquirer in cls.objects.filter(id__in=ids[i:i + cls.code_lookup_chunk_size]):
+                inquirers[ids_to_codes[inquirer.id]] = inquirer
+        return inquirers
+
 
 class InquiryQuestionAnswer(models.Model):
     """ Contains the answer for a single question in the enquiry """
@@ -314,12 +406,25 @@ class InquiryQuestionAnswer(models.Model):
                 return "not given"
 
             try:
-                return AnswerOption.objects.get(question=self.question, value=self.answer).answer
+                answer_option = get_questionaire_definition().get_question(self.question_id).get_option_by_value(
+                    int(self.answer))
             except ValueError:
                 return f"! {self.answer}"
+            if answer_option is None:
+                raise AnswerOption.DoesNotExist(f"{self.question} has no answer option with value {self.answer}")
+            return answer_option.answer
 
         return self.answer
 
+    def get_score_changes(self, revert=False):
+        """ Returns the score adjustments of the processed answer
+        :param revert: Whether the adjustments of the backwards process need to be returned
+        :return: A ScoreChanges object
+        """
+        if self.processed_answer_id is None:
+            return ScoreChanges()
+        return ScoreChanges.from_answer_option(self.processed_answer_id, revert=revert)
+
     def forward(self):
         """
         Computes the processed answer and adjust the scoring accordingly
@@ -357,3 +462,11 @@ class InquiryQuestionAnswer(models.Model):
             self.processed_answer = answer_option
         return answer_option
 
+
+class DefinitionVersion(models.Model):
+    """ Tracks the version of the questionaire definition, used to invalidate compiled definitions in all processes
+    See Questionaire.processors.questionaire_definition """
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return "Definition version {0}".format(self.version)
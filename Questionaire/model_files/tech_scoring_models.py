@@ -1,5 +1,5 @@
 from django.db import models
-from django.db.models import Count, F
+from django.db.models import F
 from django.urls import reverse
 from django.utils.text import slugify
 
@@ -7,10 +7,14 @@ from decimal import *
 
 from PageDisplay.models import Page as InfoPage
 from Questionaire.model_files.base_models import Inquiry, AnswerOption, InquiryQuestionAnswer, Page
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
+from Questionaire.processors.technology_verdicts import VerdictRefreshProcessor
+from queued_tasks.models import QueuedTask
 
 
-__all__ = ['ScoringDeclaration', 'Technology', 'TechGroup', 'TechScoreLink', 'Score', 'AnswerScoring',
-           'PageRequirement', 'AnswerScoringNote']
+__all__ = ['ScoringDeclaration', 'Technology', 'TechGroup', 'TechScoreLink', 'Score', 'ScoreVector', 'ScoreEvent',
+           'ScoreSnapshot', 'TechnologyVerdict', 'QueuedVerdictRefreshTask', 'AnswerScoring', 'PageRequirement',
+           'AnswerScoringNote']
 
 
 class ScoringDeclaration(models.Model):
@@ -38,6 +42,7 @@ class Technology(models.Model):
     display_in_step_2_list = models.BooleanField(default=False)
     display_in_step_3_list = models.BooleanField(default=False)
     display_order = models.IntegerField(default=499)
+    last_edited = models.DateTimeField(auto_now=True)
 
     TECH_SUCCESS = 1
     TECH_FAIL = 0
@@ -59,27 +64,7 @@ class Technology(models.Model):
         :param inquiry: the inquiry model
         :return: 0 is not met, 1 if met, 0.5 if unsure
         """
-        if inquiry is None:
-            return self.TECH_UNKNOWN
-
-        all_fail = True
-        all_pass = True
-        # Check for all sub_techs the states and mark trends
-        for scorelink in self.techscorelink_set.all():
-            score = scorelink.get_score(inquiry=inquiry)
-            if score != self.TECH_SUCCESS:
-                all_pass = False
-            if score != self.TECH_FAIL:
-                all_fail = False
-
-        # Analyse the trends and conclude overall progress
-        if all_pass:
-            return self.TECH_SUCCESS
-        if all_fail:
-            return self.TECH_FAIL
-
-        # Scores vary too much, result is unknown
-        return self.TECH_UNKNOWN
+        return TechScoreResolver(inquiry).get_technology_score(self)
 
     def get_absolute_url(self):
         if self.information_page:
@@ -104,34 +89,7 @@ class TechGroup(Technology):
         :param inquiry: the inquiry model
         :return: 0 is not met, 1 if met, 0.5 if unsure
         """
-
-        if self.sub_technologies.count() == 0:
-            return super(TechGroup, self).get_score(inquiry=inquiry)
-
-        all_pass = True
-        all_fail = True
-        computed = 0.0
-
-        # Check for all sub_techs the states and mark trends
-        for sub_tech in self.sub_technologies.all():
-            score = sub_tech.get_score(inquiry=inquiry)
-            if score != self.TECH_SUCCESS:
-                all_pass = False
-            if score != self.TECH_FAIL:
-                all_fail = False
-            if score != self.TECH_UNKNOWN:
-                computed = computed + 1
-
-        # Analyse the trends and conclude overall progress
-        if computed <= self.sub_technologies.count() / 2:
-            # Too few results to analyse overall trend
-            return self.TECH_UNKNOWN
-        if all_pass:
-            return self.TECH_SUCCESS
-        if all_fail:
-            return self.TECH_FAIL
-        # Scores vary
-        return self.TECH_VARIES
+        return TechScoreResolver(inquiry).get_tech_group_score(self)
 
 
 class TechScoreLink(models.Model):
@@ -148,10 +106,17 @@ class TechScoreLink(models.Model):
         :return: Returns Technology SUCCES, FAIL of UNKNOWN objecten
         """
         score_obj = Score.objects.get_or_create(inquiry=inquiry, declaration=self.score_declaration)[0]
+        return self.get_score_for_value(score_obj.score)
 
-        if score_obj.score >= self.score_threshold_approve:
+    def get_score_for_value(self, score_value):
+        """
+        Returns the result for a given score value of the linked declaration
+        :param score_value: The value of the score
+        :return: Returns Technology SUCCES, FAIL of UNKNOWN objecten
+        """
+        if score_value >= self.score_threshold_approve:
             return Technology.TECH_SUCCESS
-        if score_obj.score <= self.score_threshold_deny:
+        if score_value <= self.score_threshold_deny:
             return Technology.TECH_FAIL
         return Technology.TECH_UNKNOWN
 
@@ -176,6 +141,103 @@ class Score(models.Model):
         return "{scorename}: {inquiry} - {score}".format(scorename=self.declaration.name, inquiry=self.inquiry.id, score=self.score)
 
 
+class ScoreVector(models.Model):
+    """ A compact copy of all scores of an inquiry, used when settings.SCORE_VECTOR_STORAGE is enabled
+
+    The values are stored in the declaration order of the questionaire definition, the layout identifies that order.
+    Score objects remain the source of the scores, see Questionaire.processors.score_vectors """
+    inquiry = models.OneToOneField(Inquiry, on_delete=models.CASCADE)
+    layout = models.CharField(max_length=40)
+    values = models.TextField(blank=True, default="")
+
+    def __str__(self):
+        return "Scores of {inquiry}".format(inquiry=self.inquiry_id)
+
+
+class ScoreEvent(models.Model):
+    """ An adjustment of a score, the events of an inquiry form an append-only log of its score changes
+    See Questionaire.processors.score_events """
+    inquiry = models.ForeignKey(Inquiry, on_delete=models.CASCADE)
+    declaration = models.ForeignKey(ScoringDeclaration, on_delete=models.CASCADE)
+    change = models.DecimalField(decimal_places=2, max_digits=7)
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "{inquiry} - {declaration}: {change}".format(
+            inquiry=self.inquiry_id, declaration=self.declaration_id, change=self.change)
+
+
+class ScoreSnapshot(models.Model):
+    """ The scores of an inquiry at the moment the event with id last_event_id was the last logged event """
+    inquiry = models.ForeignKey(Inquiry, on_delete=models.CASCADE)
+    last_event_id = models.PositiveIntegerField(default=0)
+    values = models.TextField(default="{}")
+    created_on = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "Snapshot {inquiry} at event {event}".format(inquiry=self.inquiry_id, event=self.last_event_id)
+
+
+class TechnologyVerdict(models.Model):
+    """ The result of a technology for an inquiry, used when settings.TECHNOLOGY_VERDICT_STORAGE is enabled
+
+    The verdicts are kept up to date with the scores and the TechScoreLinks, so inquiries can be selected on the
+    result of a technology in a single query. See Questionaire.processors.technology_verdicts """
+    inquiry = models.ForeignKey(Inquiry, on_delete=models.CASCADE)
+    technology = models.ForeignKey(Technology, on_delete=models.CASCADE)
+    VERDICT_OPTIONS = (
+        (Technology.TECH_SUCCESS, 'Advised'),
+        (Technology.TECH_FAIL, 'Not advised'),
+        (Technology.TECH_UNKNOWN, 'Unknown'),
+        (Technology.TECH_VARIES, 'Varies'),
+    )
+    verdict = models.SmallIntegerField(choices=VERDICT_OPTIONS)
+
+    class Meta:
+        unique_together = ('inquiry', 'technology')
+        indexes = [
+            models.Index(fields=['technology', 'verdict']),
+        ]
+
+    def __str__(self):
+        return "{inquiry} - {technology}: {verdict}".format(
+            inquiry=self.inquiry_id, technology=self.technology_id, verdict=self.get_verdict_display())
+
+    @classmethod
+    def get_inquiries(cls, technology, verdict=Technology.TECH_SUCCESS):
+        """ Returns a queryset of the inquiries with the given result for the given technology """
+        return Inquiry.objects.filter(technologyverdict__technology=technology, technologyverdict__verdict=verdict)
+
+
+class QueuedVerdictRefreshTask(QueuedTask):
+    """ Recomputes the verdicts of technologies for all inquiries in the task queue, used when the scoring of the
+    technologies changes """
+    technology_ids = models.TextField(default="", blank=True)  # Comma separated
+
+    processor = VerdictRefreshProcessor
+
+    def __str__(self):
+        return f"Refresh verdicts of technologies {self.technology_ids}"
+
+    def get_technology_ids(self):
+        return {int(technology_id) for technology_id in self.technology_ids.split(',') if technology_id}
+
+    @classmethod
+    def queue(cls, technology_ids):
+        """ Queues the recomputation of the given technologies, technologies are added to a task that is still queued
+        :return: The task that recomputes the verdicts
+        """
+        technology_ids = set(technology_ids)
+        task = cls.objects.filter(state=cls.QUEUED).order_by('id').last()
+        if task is None:
+            task = cls()
+        else:
+            technology_ids.update(task.get_technology_ids())
+        task.technology_ids = ",".join(str(technology_id) for technology_id in sorted(technology_ids))
+        task.save()
+        return task
+
+
 class AnswerScoring(models.Model):
     """ Contains information on scores to be altered for a selected answer """
     answer_option = models.ForeignKey(AnswerOption, on_delete=models.CASCADE)
@@ -209,6 +271,18 @@ class AnswerScoring(models.Model):
         else:
             score_obj.score = F('score') + self.score_change_value
 
+    def get_score_change(self, revert=False):
+        """ Returns the value the score changes with when the answer option is processed
+
+        Note: adjust_score overwrites the answer value adjustment with the score_change_value adjustment, so
+        take_answer_value does not alter the change. This is maintained to keep existing scores consistent.
+        :param revert: If the process needs to be reverted (i.e. backwards process is triggered)
+        :return: The change in score as a Decimal
+        """
+        if revert:
+            return -self.score_change_value
+        return self.score_change_value
+
     def __str__(self):
         return "{0}:{1} - {2}".format(self.answer_option.question.name, self.answer_option.answer, self.declaration.name)
 
@@ -255,34 +329,60 @@ class AnswerScoringNote(models.Model):
     def __str__(self):
         return "{tech}: {answer}".format(tech=self.technology, answer=self.scoring.answer_option)
 
-    def get_prepped_text(self, inquiry=None):
+    def get_prepped_text(self, inquiry=None, values=None):
         from Questionaire.processors.replace_text_from_database import format_from_database
         # Format the text to include answers from database objects entries
-        return format_from_database(self.text, inquiry=inquiry)
+        return format_from_database(self.text, inquiry=inquiry, values=values)
 
     @classmethod
     def get_all_notes(cls, technology, inquiry):
-        """ Returns all notes that should be displayed for a certain technology with a certain inquiry """
-        inq_question_answ = InquiryQuestionAnswer.objects.filter(inquiry=inquiry, processed=True)
+        """ Returns a queryset of all notes that should be displayed for a certain technology with a certain inquiry
+        Use get_notes_per_technology to retrieve the notes of several technologies at once """
+        return cls.objects.filter(id__in=[
+            note.id for note in cls.get_notes_per_technology(inquiry).get(technology.id, [])
+        ]).order_by('id')
+
+    @classmethod
+    def get_notes_per_technology(cls, inquiry):
+        """ Returns all notes that should be displayed for the given inquiry in a dictionary keyed by technology id
+
+        A note is displayed when its answer option is selected, none of its exclude_on answers is selected and all of
+        its include_on answers are selected. The notes are computed in a fixed number of queries.
+        :param inquiry: The inquiry
+        :return: A dictionary with a list of AnswerScoringNotes (ordered by id) for each technology id
+        """
         # Select all processed answer options for the given inquiry
-        selected_answers = AnswerOption.objects.filter(inquiryquestionanswer__in=inq_question_answ)
-
-        answer_notes = cls.objects.filter(technology=technology, scoring__answer_option__in=selected_answers)
-        # Remove notes for the selected answers
-        answer_notes = answer_notes.exclude(exclude_on__in=selected_answers)
-
-        # Get all items in the queryset with include_on restrictions
-        incomplete_entries = []
-        for answerNote in answer_notes.annotate(
-                num_includes=Count('include_on')).filter(num_includes__gt=0):
-            # Loop over all include items and check if it is in there
-            for includer in answerNote.include_on.all():
-                if includer not in selected_answers:
-                    incomplete_entries.append(answerNote.id)
-                    break
-        # Remove all notes that are not met
-        answer_notes = answer_notes.exclude(id__in=incomplete_entries)
-
-        return answer_notes
+        selected_answers = set(InquiryQuestionAnswer.objects.filter(
+            inquiry=inquiry,
+            processed=True,
+            processed_answer__isnull=False,
+        ).values_list('processed_answer_id', flat=True))
+        if not selected_answers:
+            return {}
+
+        answer_notes = list(cls.objects.filter(scoring__answer_option_id__in=selected_answers).order_by('id'))
+        note_ids = [answer_note.id for answer_note in answer_notes]
+
+        # Retrieve the restrictions of all notes at once
+        excludes = {}
+        for note_id, answer_option_id in cls.exclude_on.through.objects.filter(
+                answerscoringnote_id__in=note_ids).values_list('answerscoringnote_id', 'answeroption_id'):
+            excludes.setdefault(note_id, set()).add(answer_option_id)
+        includes = {}
+        for note_id, answer_option_id in cls.include_on.through.objects.filter(
+                answerscoringnote_id__in=note_ids).values_list('answerscoringnote_id', 'answeroption_id'):
+            includes.setdefault(note_id, set()).add(answer_option_id)
+
+        notes_per_technology = {}
+        for answer_note in answer_notes:
+            # Remove notes for the selected answers
+            if not excludes.get(answer_note.id, set()).isdisjoint(selected_answers):
+                continue
+            # Remove all notes whose include requirements are not met
+            if not includes.get(answer_note.id, set()).issubset(selected_answers):
+                continue
+            notes_per_technology.setdefault(answer_note.technology_id, []).append(answer_note)
+
+        return notes_per_technology
 
 
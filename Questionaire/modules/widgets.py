@@ -4,6 +4,7 @@ from PageDisplay.module_widgets import BaseModuleWidget
 
 from Questionaire.models import Inquirer
 from Questionaire.fields import QuestionFieldFactory
+from Questionaire.processors.result_fragments import get_or_render_fragment
 from Questionaire.utils import get_inquiry_from_request
 
 
@@ -55,3 +56,19 @@ class TechScoreWidget(BaseModuleWidget):
         context['inquiry'] = inquiry or get_inquiry_from_request(request)
 
         return context
+
+    def render_template(self, context, request=None):
+        # The rendered scores and notes only change with the inquiry results, the technology or the module settings
+        widget_context = context['widget']
+        module = self.model
+        return get_or_render_fragment(
+            lambda: super(TechScoreWidget, self).render_template(context, request),
+            "tech_score_module",
+            widget_context['inquiry'],
+            widget_context['technology'],
+            self.template_name,
+            module.id,
+            module.display_description,
+            module.display_notes,
+            module.display_sub_technologies,
+        )
@@ -7,6 +7,22 @@ class CodeTranslationError(ValueError):
     pass
 
 
+def egcd(a, b):
+    """
+    Extended Euclidean Algorithm
+    :param a: Int number 1
+    :param b: Int number 2
+    :return: the greatest common division (gcd) and the x and y values according to ax +by = gcd
+    """
+    x,y, u,v = 0,1, 1,0
+    while a != 0:
+        q, r = b//a, b%a
+        m, n = x-u*q, y-v*q
+        b,a, x,y, u,v = a,r, u,v, m,n
+    gcd = b
+    return gcd, x, y
+
+
 class IdEncoder:
     """ This class handles all code translations """
 
@@ -23,52 +39,27 @@ class IdEncoder:
         self._steps = steps or self._steps
 
         # Initate some common values
-        self._max_combos = (len(self._allowed_chars) ** self._length)
-
-    @property
-    def _reverser(self):
-        """ Computes the value the reversed value needs to be multiplied with in order to get the original id"""
-        def egcd(a, b):
-            """
-            Extended Euclidean Algorithm
-            :param a: Int number 1
-            :param b: Int number 2
-            :return: the greatest common division (gcd) and the x and y values according to ax +by = gcd
-            """
-            x,y, u,v = 0,1, 1,0
-            while a != 0:
-                q, r = b//a, b%a
-                m, n = x-u*q, y-v*q
-                b,a, x,y, u,v = a,r, u,v, m,n
-            gcd = b
-            return gcd, x, y
-
-        gcd, x, y = egcd(self._steps, self._max_combos)
-        return x
+        self._base = len(self._allowed_chars)
+        self._max_combos = (self._base ** self._length)
+        self._char_positions = {char: pos for pos, char in enumerate(self._allowed_chars)}
+        # The value the reversed value needs to be multiplied with in order to get the original id
+        gcd, self._reverser, y = egcd(self._steps, self._max_combos)
 
     def get_code_from_id(self, id_value):
         """
         Get the lettercode for this inquiry object
         :return: Returns the lettercode for the given inquiry object
         """
-        # Check if
-
         # New value is the key multiplied by the steps mod the total number of possibilities
         id_value = (id_value * self._steps) % self._max_combos
-        string = ''
+        chars = []
 
-        # Translate the reformed number to its letterform
-        for i in range(self._length - 1, 0 - 1, -1):
-            base = len(self._allowed_chars) ** i
+        # Translate the reformed number to its letterform, starting at the last character
+        for i in range(self._length):
+            id_value, char_pos = divmod(id_value, self._base)
+            chars.append(self._allowed_chars[char_pos])
 
-            # Compute the position of the character (devide by base rounded down)
-            char_pos = int(id_value / base)
-            # Add the new character to the string
-            string += self._allowed_chars[char_pos]
-            # Remove the processed value from the string
-            id_value -= (base * char_pos)
-
-        return string
+        return ''.join(reversed(chars))
 
     def get_id_from_code(self, code):
         """
@@ -76,39 +67,27 @@ class IdEncoder:
         :param code: The 6-letter code
         :return: The id-value
         """
-
-        def egcd(a, b):
-            """
-            Extended Euclidean Algorithm
-            :param a: Int number 1
-            :param b: Int number 2
-            :return: the greatest common division (gcd) and the x and y values according to ax +by = gcd
-            """
-            x,y, u,v = 0,1, 1,0
-            while a != 0:
-                q, r = b//a, b%a
-                m, n = x-u*q, y-v*q
-                b,a, x,y, u,v = a,r, u,v, m,n
-            gcd = b
-            return gcd, x, y
-
-        # Define base variables
-        value = 0
+        if len(code) != self._length:
+            raise ValueError(f"Code should consist of {self._length} characters")
 
         # Translate the code to the reformed number
-        for i in range(0, len(code)):
-            char_pos = self._allowed_chars.find(code[i])
-
-            if char_pos == -1:
+        value = 0
+        for char in code:
+            char_pos = self._char_positions.get(char, None)
+            if char_pos is None:
                 raise ValueError("Character was not the possible characters")
-            else:
-                value += char_pos * (len(self._allowed_chars) ** (self._length - i - 1))
+            value = value * self._base + char_pos
 
         # Recompute the reformed number to its original number
-        id = (value * self._reverser) % self._max_combos
+        return (value * self._reverser) % self._max_combos
+
+    def encode_many(self, id_values):
+        """ Returns the lettercodes of all given ids, in the same order """
+        return [self.get_code_from_id(id_value) for id_value in id_values]
 
-        # Return the result
-        return id
+    def decode_many(self, codes):
+        """ Returns the ids of all given lettercodes, in the same order. Raises ValueError for invalid codes """
+        return [self.get_id_from_code(code) for code in codes]
 
     def check_reverse(self, ids=None):
         """ Checks whether the forward and backward functionality return the same results """
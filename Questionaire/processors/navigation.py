@@ -0,0 +1,103 @@
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors.score_vectors import get_inquiry_scores
+
+""" This file contains code that determines which pages of the questionaire are displayed for an inquiry """
+
+__all__ = ['NavigationPlanner']
+
+
+class NavigationPlanner:
+    """ Evaluates the validity of all pages for a single inquiry in one batch
+
+    The scores and the set of processed questions of the inquiry are retrieved once, after which the validity of each
+    page (see Page.is_valid_for_inquiry) is computed in memory. As the validity depends on the scores, a planner
+    should be recreated after answers have been processed.
+
+    :param inquiry: The inquiry the pages need to be evaluated for
+    """
+
+    def __init__(self, inquiry):
+        self.inquiry = inquiry
+        self.definition = get_questionaire_definition()
+        self._scores = None
+        self._answered_question_ids = None
+        self._valid_pages = None
+
+    def _load(self):
+        """ Retrieves the scores and processed questions of the inquiry """
+        # Import here to avoid circular imports
+        from Questionaire.models import InquiryQuestionAnswer
+
+        self._scores = get_inquiry_scores(self.inquiry)
+        self._answered_question_ids = set(InquiryQuestionAnswer.objects.filter(
+            inquiry=self.inquiry,
+            processed=True,
+        ).values_list('question_id', flat=True))
+
+    def get_score_value(self, declaration_id):
+        """ Returns the score of the given declaration, defaults to the start value if it is not yet tracked """
+        if self._scores is None:
+            self._load()
+        try:
+            return self._scores[declaration_id]
+        except KeyError:
+            return self.definition.get_start_value(declaration_id)
+
+    def is_page_valid(self, page_definition):
+        """ Checks if the page should be displayed and computed for the inquiry
+        :param page_definition: The PageDefinition of the page
+        :return: Boolean if the page is a valid page to process
+        """
+        if self._scores is None:
+            self._load()
+
+        # Check if the requirements are met
+        for requirement in page_definition.requirements:
+            if not requirement.is_met_for_score(self.get_score_value(requirement.declaration_id)):
+                return False
+        # Check if the required questions are answered
+        for question_id in page_definition.include_on:
+            if question_id not in self._answered_question_ids:
+                return False
+        # Check if the forbidden questions are not answered
+        for question_id in page_definition.exclude_on:
+            if question_id in self._answered_question_ids:
+                return False
+
+        return True
+
+    def get_valid_pages(self):
+        """ Returns the PageDefinitions of all pages valid for the inquiry, ordered by position """
+        if self._valid_pages is None:
+            self._valid_pages = [page for page in self.definition.pages if self.is_page_valid(page)]
+        return self._valid_pages
+
+    def get_next_page(self, position, inclusive=False):
+        """ Returns the first valid page after the given position
+        :param position: The position of the current page
+        :param inclusive: Whether a valid page at the given position itself can be returned
+        :return: The PageDefinition, None if there is no valid page
+        """
+        for page in self.get_valid_pages():
+            if page.position > position or (inclusive and page.position == position):
+                return page
+        return None
+
+    def get_previous_page(self, position):
+        """ Returns the last valid page before the given position, None if there is no valid page """
+        previous_page = None
+        for page in self.get_valid_pages():
+            if page.position >= position:
+                break
+            previous_page = page
+        return previous_page
+
+    def get_progress(self, position):
+        """ Returns the number of valid pages before the given position and the total number of valid pages
+        (including the page at the given position) """
+        valid_pages = self.get_valid_pages()
+        preceding = len([page for page in valid_pages if page.position < position])
+        total = len(valid_pages)
+        if not any(page.position == position for page in valid_pages):
+            total += 1
+        return preceding, total
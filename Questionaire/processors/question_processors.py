@@ -1,19 +1,33 @@
+from decimal import Decimal, InvalidOperation
 
-from django.db.models import IntegerField as IntegerDBField
-from django.db.models import DecimalField as DecimalDBField
-from django.db.models.functions import Cast
-from django.db.models import ObjectDoesNotExist
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
 
-""" This file contains code that allows the question to find its related answer """
+""" This file contains code that allows the question to find its related answer
 
-__all__ = ['get_answer_option_through_question', 'get_answer_option_from_answer']
+Answer options are resolved in memory through the lookup indices of the compiled questionaire definition, so no
+queries are made. The question specific methods receive the QuestionDefinition and return AnswerOptionDefinitions.
+"""
+
+__all__ = ['get_answer_option_through_question', 'get_answer_option_from_answer', 'get_answer_option_definition']
 
 
 def get_answer_option_from_answer(answer_obj):
-    return get_answer_option_through_question(answer_obj.question, answer_obj.answer)
+    # Use the question definition to prevent querying the question of the answer
+    question = get_questionaire_definition().get_question(answer_obj.question_id)
+    return _as_model(get_answer_option_definition(question, answer_obj.answer))
 
 
 def get_answer_option_through_question(question, answer_value):
+    question_definition = get_questionaire_definition().get_question(question.id)
+    return _as_model(get_answer_option_definition(question_definition, answer_value))
+
+
+def get_answer_option_definition(question, answer_value):
+    """ Returns the AnswerOptionDefinition selected by the given answer
+    :param question: The QuestionDefinition of the question
+    :param answer_value: The given answer
+    :return: The AnswerOptionDefinition or None
+    """
     # Import here to avoid circular imports
     from Questionaire.models import Question
 
@@ -39,6 +53,20 @@ def get_answer_option_through_question(question, answer_value):
         return get_best_from_multi_question(question, answer_value)
 
 
+def _as_model(option_definition):
+    """ Returns the AnswerOption model instance of the given definition, or None """
+    if option_definition is None:
+        return None
+    return option_definition.get_model()
+
+
+def _to_decimal(answer_value):
+    try:
+        return Decimal(str(answer_value))
+    except InvalidOperation:
+        raise ValueError(f"'{answer_value}' is not a numeric value")
+
+
 def get_open_answer_option(question, answer_value):
     if answer_value is None:
         return None
@@ -46,44 +74,39 @@ def get_open_answer_option(question, answer_value):
     if answer_value == "":
         return None
 
-    not_none_answer = question.answeroption_set.filter(answer="NotNone")
-
-    if not_none_answer.exists():
-        return not_none_answer.get()
-
-    return None
+    return question.get_option_by_answer("NotNone")
 
 
 def get_int_answer_option(question, answer_value):
     if answer_value is None:
         return None
 
-    # Get all answer options
-    options = question.answeroption_set.all()
     # Select the answer that closest approximates, but not exceeds the inserted value
-    options = options.annotate(answer_int=Cast('answer', IntegerDBField()))
-    options = options.filter(answer_int__lte=answer_value)
-    return options.order_by('answer_int').last()
+    answer_value = int(_to_decimal(answer_value))
+    return question.get_option_below_threshold(answer_value)
 
 
 def get_double_answer_option(question, answer_value):
     if answer_value is None:
         return None
 
-    # Get all answer options
-    options = question.answeroption_set.all()
     # Select the answer that closest approximates, but not exceeds the inserted value
-    options = options.annotate(answer_int=Cast('answer', DecimalDBField()))
-    options = options.filter(answer_int__lte=answer_value)
-    return options.order_by('answer_int').last()
+    answer_value = _to_decimal(answer_value)
+    return question.get_option_below_threshold(answer_value)
 
 
 def get_choice_answer_option(question, answer_value):
+    # Import here to avoid circular imports
+    from Questionaire.models import AnswerOption
+
     # If no answer is given, return nothing, else, return the selected answer
     if answer_value is None or answer_value == '':
         return None
     else:
-        return question.answeroption_set.get(value=int(answer_value))
+        option = question.get_option_by_value(int(answer_value))
+        if option is None:
+            raise AnswerOption.DoesNotExist(f"Question {question.name} has no answer option with value {answer_value}")
+        return option
 
 
 def get_yesno_answer_option(question, answer_value):
@@ -92,14 +115,12 @@ def get_yesno_answer_option(question, answer_value):
     else:
         if answer_value == "True":
             # Agreeing should result in True
-            return question.answeroption_set.filter(answer="True").first()
+            return question.get_option_by_answer("True")
         else:
-            return question.answeroption_set.filter(answer="False").first()
+            return question.get_option_by_answer("False")
 
 
 def get_best_from_multi_question(question, answer_value):
-    # from Questionaire.models import Question
-
     if answer_value is None or answer_value == []:
         return None
     else:
@@ -108,13 +129,11 @@ def get_best_from_multi_question(question, answer_value):
         if priority_list:
             for prio_value in priority_list.split(','):
                 if prio_value in answer_value:
-                    try:
-                        return question.answeroption_set.get(value=prio_value)
-                    except ObjectDoesNotExist:
-                        pass
+                    option = question.get_option_by_value(int(prio_value))
+                    if option is not None:
+                        return option
 
         # There is no order, or the answer was not in the priority list
         # so the standard order of the questions is what drives the answer
         option_nr = int(answer_value[0]) - 1
-        return question.answeroption_set.order_by("value")[option_nr]
-
+        return question.answer_options[option_nr]
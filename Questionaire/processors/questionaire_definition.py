@@ -0,0 +1,435 @@
+import ast
+import bisect
+import hashlib
+import threading
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import F
+
+""" This file contains a compiled, read-only representation of the questionaire definition
+
+The definition of the questionaire (pages, questions, answer options, scorings and technology thresholds) rarely
+changes, so it is constructed once per process and reused until any of the source models is adjusted. Adjustments
+increment a version counter in the database so other processes know to rebuild their definition.
+"""
+
+__all__ = ['QuestionaireDefinition', 'get_questionaire_definition', 'invalidate_questionaire_definition']
+
+
+class PageDefinition:
+    """ The definition of a Page """
+    __slots__ = ('id', 'name', 'position', 'display_page_id', 'auto_process', 'include_on', 'exclude_on',
+                 'requirements', 'entries', 'question_ids')
+
+    def __init__(self, id, name, position, display_page_id, auto_process):
+        self.id = id
+        self.name = name
+        self.position = position
+        self.display_page_id = display_page_id
+        self.auto_process = auto_process
+        self.include_on = []
+        self.exclude_on = []
+        self.requirements = []
+        self.entries = []
+        self.question_ids = []
+
+    def get_model(self):
+        """ Returns a Page model instance for this definition without querying the database """
+        from Questionaire.models import Page
+        return Page(id=self.id, name=self.name, position=self.position, display_page_id=self.display_page_id,
+                    auto_process=self.auto_process)
+
+
+class PageEntryDefinition:
+    """ The definition of a PageEntry, contains either a text or a question """
+    __slots__ = ('id', 'position', 'entry_type', 'text', 'question_id', 'required')
+
+    def __init__(self, id, position, entry_type, text=None, question_id=None, required=False):
+        self.id = id
+        self.position = position
+        self.entry_type = entry_type
+        self.text = text
+        self.question_id = question_id
+        self.required = required
+
+
+class PageRequirementDefinition:
+    """ The definition of a PageRequirement """
+    __slots__ = ('id', 'declaration_id', 'threshold', 'comparison')
+
+    def __init__(self, id, declaration_id, threshold, comparison):
+        self.id = id
+        self.declaration_id = declaration_id
+        self.threshold = threshold
+        self.comparison = comparison
+
+    def is_met_for_score(self, score_value):
+        """ Returns whether the given score value meets the requirement, see PageRequirement.is_met_for_inquiry """
+        if self.comparison == 0:
+            return score_value > self.threshold
+        elif self.comparison == 1:
+            return score_value >= self.threshold
+        elif self.comparison == 2:
+            return score_value == self.threshold
+        elif self.comparison == 3:
+            return score_value <= self.threshold
+        elif self.comparison == 4:
+            return score_value < self.threshold
+        else:
+            raise RuntimeError("Comparison options resulted in unset option")
+
+
+class QuestionDefinition:
+    """ The definition of a Question and its answer options """
+    __slots__ = ('id', 'name', 'description', 'question_text', 'help_text', 'question_type', 'options',
+                 'answer_options', 'options_by_value', 'threshold_values', 'threshold_options', '_options_dict')
+
+    def __init__(self, id, name, description, question_text, help_text, question_type, options):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.question_text = question_text
+        self.help_text = help_text
+        self.question_type = question_type
+        self.options = options
+        self.answer_options = []
+        self.options_by_value = {}
+        self.threshold_values = []
+        self.threshold_options = []
+        self._options_dict = None
+
+    @property
+    def options_dict(self):
+        """ Returns a dictionary of all defined options for this question"""
+        if self._options_dict is None:
+            self._options_dict = ast.literal_eval(self.options)
+        return self._options_dict
+
+    def get_model(self):
+        """ Returns a Question model instance for this definition without querying the database """
+        from Questionaire.models import Question
+        return Question(id=self.id, name=self.name, description=self.description, question_text=self.question_text,
+                        help_text=self.help_text, question_type=self.question_type, options=self.options)
+
+    def compile_indices(self):
+        """ Constructs the lookup indices of the answer options, called once all answer options are added """
+        from Questionaire.models import Question
+
+        self.options_by_value = {}
+        for answer_option in self.answer_options:
+            # Answer options are ordered on value, so the first option with a given value takes precedence
+            self.options_by_value.setdefault(answer_option.value, answer_option)
+
+        # Numeric questions select their option on the answer field, sort them on the numeric threshold
+        thresholds = []
+        for answer_option in self.answer_options:
+            try:
+                threshold = Decimal(answer_option.answer)
+            except (InvalidOperation, TypeError):
+                continue
+            if self.question_type == Question.TYPE_INT:
+                threshold = int(threshold)
+            thresholds.append((threshold, answer_option))
+        thresholds.sort(key=lambda item: item[0])
+        self.threshold_values = [threshold for threshold, answer_option in thresholds]
+        self.threshold_options = [answer_option for threshold, answer_option in thresholds]
+
+    def get_option_by_value(self, value):
+        """ Returns the AnswerOptionDefinition with the given value, None if it does not exist """
+        return self.options_by_value.get(value, None)
+
+    def get_option_by_answer(self, answer):
+        """ Returns the first AnswerOptionDefinition with the given answer, None if it does not exist """
+        for answer_option in self.answer_options:
+            if answer_option.answer == answer:
+                return answer_option
+        return None
+
+    def get_option_below_threshold(self, value):
+        """ Returns the AnswerOptionDefinition that closest approximates, but not exceeds the given value
+        :param value: The numeric value, must be comparable with Decimal
+        :return: The AnswerOptionDefinition, None if all options exceed the value
+        """
+        index = bisect.bisect_right(self.threshold_values, value)
+        if index == 0:
+            return None
+        return self.threshold_options[index - 1]
+
+
+class AnswerOptionDefinition:
+    """ The definition of an AnswerOption and the scorings it triggers """
+    __slots__ = ('id', 'question_id', 'answer', 'context_code', 'value', 'image', 'scorings')
+
+    def __init__(self, id, question_id, answer, context_code, value, image):
+        self.id = id
+        self.question_id = question_id
+        self.answer = answer
+        self.context_code = context_code
+        self.value = value
+        self.image = image
+        self.scorings = []
+
+    def get_model(self):
+        """ Returns an AnswerOption model instance for this definition without querying the database """
+        from Questionaire.models import AnswerOption
+        return AnswerOption(id=self.id, question_id=self.question_id, answer=self.answer,
+                            context_code=self.context_code, value=self.value, image=self.image)
+
+
+class AnswerScoringDefinition:
+    """ The definition of an AnswerScoring """
+    __slots__ = ('id', 'declaration_id', 'score_change_value', 'take_answer_value')
+
+    def __init__(self, id, declaration_id, score_change_value, take_answer_value):
+        self.id = id
+        self.declaration_id = declaration_id
+        self.score_change_value = score_change_value
+        self.take_answer_value = take_answer_value
+
+    def get_score_change(self, revert=False):
+        """ Returns the value the score changes with, see AnswerScoring.get_score_change """
+        if revert:
+            return -self.score_change_value
+        return self.score_change_value
+
+
+class TechScoreLinkDefinition:
+    """ The definition of a TechScoreLink """
+    __slots__ = ('id', 'technology_id', 'declaration_id', 'score_threshold_approve', 'score_threshold_deny')
+
+    def __init__(self, id, technology_id, declaration_id, score_threshold_approve, score_threshold_deny):
+        self.id = id
+        self.technology_id = technology_id
+        self.declaration_id = declaration_id
+        self.score_threshold_approve = score_threshold_approve
+        self.score_threshold_deny = score_threshold_deny
+
+    def get_score_for_value(self, score_value):
+        """ Returns the result for a given score value, see TechScoreLink.get_score_for_value """
+        from Questionaire.models import Technology
+
+        if score_value >= self.score_threshold_approve:
+            return Technology.TECH_SUCCESS
+        if score_value <= self.score_threshold_deny:
+            return Technology.TECH_FAIL
+        return Technology.TECH_UNKNOWN
+
+
+class QuestionaireDefinition:
+    """ A read-only compiled representation of the entire questionaire definition
+
+    :param version: The version of the definition in the database at the moment of construction
+    """
+
+    def __init__(self, version=0):
+        self.version = version
+        self.pages = []
+        self.page_positions = []
+        self.pages_by_id = {}
+        self.questions_by_id = {}
+        self.questions_by_name = {}
+        self.answer_options_by_id = {}
+        self.declaration_start_values = {}
+        self.declaration_ids = []
+        self.declaration_layout = ""
+        self.technology_ids = []
+        self.tech_score_links = {}
+        self.sub_technologies = {}
+        self._step_1_technologies = None
+
+    @classmethod
+    def build(cls, version=0):
+        """ Constructs the definition from the database """
+        from Questionaire.models import Page, PageEntry, PageRequirement, Question, AnswerOption, AnswerScoring, \
+            ScoringDeclaration, Technology, TechScoreLink, TechGroup
+
+        definition = cls(version=version)
+
+        for values in Page.objects.order_by('position').values(
+                'id', 'name', 'position', 'display_page_id', 'auto_process'):
+            page = PageDefinition(**values)
+            definition.pages.append(page)
+            definition.pages_by_id[page.id] = page
+        definition.page_positions = [page.position for page in definition.pages]
+
+        for page_id, question_id in Page.include_on.through.objects.values_list('page_id', 'question_id'):
+            definition.pages_by_id[page_id].include_on.append(question_id)
+        for page_id, question_id in Page.exclude_on.through.objects.values_list('page_id', 'question_id'):
+            definition.pages_by_id[page_id].exclude_on.append(question_id)
+
+        for values in PageRequirement.objects.values('id', 'page_id', 'score_declaration_id', 'threshold',
+                                                     'comparison'):
+            definition.pages_by_id[values['page_id']].requirements.append(PageRequirementDefinition(
+                id=values['id'],
+                declaration_id=values['score_declaration_id'],
+                threshold=values['threshold'],
+                comparison=values['comparison'],
+            ))
+
+        for values in PageEntry.objects.order_by('position').values(
+                'id', 'page_id', 'position', 'entry_type', 'pageentrytext__text',
+                'pageentryquestion__question_id', 'pageentryquestion__required'):
+            entry = PageEntryDefinition(
+                id=values['id'],
+                position=values['position'],
+                entry_type=values['entry_type'],
+                text=values['pageentrytext__text'],
+                question_id=values['pageentryquestion__question_id'],
+                required=values['pageentryquestion__required'] or False,
+            )
+            page = definition.pages_by_id[values['page_id']]
+            page.entries.append(entry)
+            if entry.question_id is not None:
+                page.question_ids.append(entry.question_id)
+
+        for values in Question.objects.values('id', 'name', 'description', 'question_text', 'help_text',
+                                              'question_type', 'options'):
+            question = QuestionDefinition(**values)
+            definition.questions_by_id[question.id] = question
+            definition.questions_by_name[question.name] = question
+
+        for values in AnswerOption.objects.order_by('value', 'id').values(
+                'id', 'question_id', 'answer', 'context_code', 'value', 'image'):
+            answer_option = AnswerOptionDefinition(**values)
+            definition.answer_options_by_id[answer_option.id] = answer_option
+            definition.questions_by_id[answer_option.question_id].answer_options.append(answer_option)
+
+        for question in definition.questions_by_id.values():
+            question.compile_indices()
+
+        for values in AnswerScoring.objects.order_by('id').values(
+                'id', 'answer_option_id', 'declaration_id', 'score_change_value', 'take_answer_value'):
+            answer_option = definition.answer_options_by_id[values.pop('answer_option_id')]
+            answer_option.scorings.append(AnswerScoringDefinition(**values))
+
+        definition.declaration_start_values = dict(
+            ScoringDeclaration.objects.values_list('id', 'score_start_value'))
+        # The fixed order of declarations, used to store the scores of an inquiry as an array
+        definition.declaration_ids = sorted(definition.declaration_start_values.keys())
+        definition.declaration_layout = hashlib.sha1(
+            ",".join(str(declaration_id) for declaration_id in definition.declaration_ids).encode()).hexdigest()
+
+        for values in TechScoreLink.objects.order_by('id').values(
+                'id', 'technology_id', 'score_declaration_id', 'score_threshold_approve', 'score_threshold_deny'):
+            values['declaration_id'] = values.pop('score_declaration_id')
+            link = TechScoreLinkDefinition(**values)
+            definition.tech_score_links.setdefault(link.technology_id, []).append(link)
+
+        definition.technology_ids = list(Technology.objects.values_list('id', flat=True))
+
+        through_model = TechGroup.sub_technologies.through
+        for techgroup_id, technology_id in through_model.objects.values_list('techgroup_id', 'technology_id'):
+            definition.sub_technologies.setdefault(techgroup_id, []).append(technology_id)
+
+        return definition
+
+    def get_page(self, page_id):
+        """ Returns the PageDefinition with the given id, None if it does not exist """
+        return self.pages_by_id.get(page_id, None)
+
+    def has_page_after(self, position):
+        """ Returns whether any page, valid or not, is positioned after the given position """
+        return bisect.bisect_right(self.page_positions, position) < len(self.page_positions)
+
+    def get_step_1_technologies(self):
+        """ Returns the Technology models displayed in the step 1 list
+        Their values are retrieved once per definition, but new instances are created on each call so instances are
+        not shared between requests. Related objects other than the tech group are retrieved when they are used.
+        """
+        from Questionaire.models import Technology, TechGroup
+
+        if self._step_1_technologies is None:
+            self._step_1_technologies = list(Technology.objects.filter(display_in_step_1_list=True).values(
+                *[field.attname for field in Technology._meta.concrete_fields], 'techgroup'))
+
+        technologies = []
+        for values in self._step_1_technologies:
+            values = dict(values)
+            techgroup_id = values.pop('techgroup')
+            technology = Technology(**values)
+            technology._state.adding = False
+            tech_group = None
+            if techgroup_id is not None:
+                tech_group = TechGroup(technology_ptr_id=techgroup_id, **values)
+                tech_group._state.adding = False
+            # Store the tech group as select_related would, so it is known without a query
+            Technology.techgroup.related.set_cached_value(technology, tech_group)
+            technologies.append(technology)
+        return technologies
+
+    def get_question(self, question_id):
+        """ Returns the QuestionDefinition with the given id """
+        return self.questions_by_id[question_id]
+
+    def get_answer_options(self, question_id):
+        """ Returns the AnswerOptionDefinitions of the given question, ordered by value """
+        return self.questions_by_id[question_id].answer_options
+
+    def get_scorings(self, answer_option_id):
+        """ Returns the AnswerScoringDefinitions triggered by the given answer option """
+        try:
+            return self.answer_options_by_id[answer_option_id].scorings
+        except KeyError:
+            return []
+
+    def get_start_value(self, declaration_id):
+        """ Returns the start value of the given ScoringDeclaration """
+        return self.declaration_start_values[declaration_id]
+
+
+class _DefinitionCache(threading.local):
+    """ Tracks per thread whether the definition version has been verified during the current request """
+    in_request = False
+    verified = False
+
+
+_definition = None
+_definition_cache = _DefinitionCache()
+
+
+def _get_database_version():
+    from Questionaire.models import DefinitionVersion
+    version = DefinitionVersion.objects.values_list('version', flat=True).first()
+    return version or 0
+
+
+def get_questionaire_definition():
+    """ Returns the compiled questionaire definition, rebuilds it when it is outdated
+    The version in the database is checked once per request, or on each call outside of requests.
+    """
+    global _definition
+
+    definition = _definition
+    if definition is not None and _definition_cache.in_request and _definition_cache.verified:
+        return definition
+
+    version = _get_database_version()
+    if definition is None or definition.version != version:
+        definition = QuestionaireDefinition.build(version=version)
+        _definition = definition
+
+    if _definition_cache.in_request:
+        _definition_cache.verified = True
+    return definition
+
+
+def invalidate_questionaire_definition(**kwargs):
+    """ Marks the questionaire definition as changed for this and all other processes
+    Connected to the signals of all models that make up the definition """
+    global _definition
+    from Questionaire.models import DefinitionVersion
+
+    _definition = None
+    if DefinitionVersion.objects.filter(id=1).update(version=F('version') + 1) == 0:
+        DefinitionVersion.objects.create(id=1, version=1)
+
+
+def start_request(**kwargs):
+    """ Ensures the definition version is verified once in the new request """
+    _definition_cache.in_request = True
+    _definition_cache.verified = False
+
+
+def finish_request(**kwargs):
+    _definition_cache.in_request = False
+    _definition_cache.verified = False
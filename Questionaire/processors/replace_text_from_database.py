@@ -1,68 +1,184 @@
 import re
+from functools import lru_cache
 
 from Questionaire.models import InquiryQuestionAnswer, Score
 
 # Assert that InquiryQuestionAnswer has the attribute get_readable_answer because dependency
 assert hasattr(InquiryQuestionAnswer, 'get_readable_answer')
 
+__all__ = ['format_from_database', 'compile_text', 'CompiledText', 'InquiryTextValues']
 
-def format_from_database(text, inquiry=None):
-    """ Formats the given text with information from the database
 
-    :param text: The text that needs to be formatted.
-    :param inquiry: The inquiry that it needs to apply on
-    :return:
-    """
-    # Analyse the code source to determine where the source needs to be obtained
-    # Find all text within brackets
-    keys = re.findall("(?<!/)\{(.*?)(?<!/)\}", text)
-    # Because of regex containing possible {} the regex tries to avoid /{ and /} markers in the query
+# Find all text within brackets
+# Because of regex containing possible {} the regex tries to avoid /{ and /} markers in the query
+KEY_REGEX = re.compile(r"(?<!/)\{(.*?)(?<!/)\}")
+
+
+class QuestionKey:
+    """ A {q_...} key in a text, refers to the answer of a question """
+    __slots__ = ('key', 'question_name', 'retrieve_code', 'regex')
+
+    def __init__(self, key, question_name, retrieve_code=False, regex=None):
+        self.key = key
+        self.question_name = question_name
+        self.retrieve_code = retrieve_code
+        self.regex = regex
+
+    def get_value(self, iqa_obj):
+        """ Returns the text to be inserted for the given InquiryQuestionAnswer (or None if there is no answer) """
+        if iqa_obj is None or not iqa_obj.answer:
+            return ""
+
+        result = iqa_obj.get_readable_answer(with_answer_code=self.retrieve_code)
+        if self.regex:
+            result = self.regex.search(result)
+            if result:
+                result = result.group()
+            else:
+                result = ""
+        return result
+
 
-    format_dict = {}
+class CompiledText:
+    """ A text parsed for its database keys
 
-    for key in keys:
-        if key is None:
-            continue
+    Contains the text in a format-ready state as well as the question names and ScoringDeclaration names it requires
 
-        try:
+    :param text: The text that needs to be formatted
+    """
+
+    def __init__(self, text):
+        self.question_keys = []
+        self.score_keys = {}
+
+        for key in KEY_REGEX.findall(text):
             if key.startswith('q_'):
                 q_name = key[2:]
-                retrieve_code = False
-                regex = None
 
                 if key.endswith('__code'):
                     # Check if the code is requested
-                    q_name = q_name[:-6]
-                    retrieve_code = True
+                    self.question_keys.append(QuestionKey(key, q_name[:-6], retrieve_code=True))
                 elif '__regex=' in key:
                     [q_name, regex] = q_name.split('__regex=', 1)
                     short_question_name = q_name+'__regex'
                     text = text.replace(key, short_question_name)
-                    key = short_question_name
 
                     # Regex could contain '/{' and '/}' chars, those need to be replaced
                     regex = regex.replace('/{', '{')
                     regex = regex.replace('/}', '}')
-
-                iqa_obj = InquiryQuestionAnswer.objects.get(question__name=q_name, inquiry=inquiry)
-                if len(iqa_obj.answer) > 0:
-                    result = iqa_obj.get_readable_answer(with_answer_code=retrieve_code)
-                    if regex:
-                        result = re.search(regex, result)
-                        if result:
-                            result = result.group()
-                        else:
-                            result = ""
-                    format_dict[key] = result
+                    self.question_keys.append(QuestionKey(short_question_name, q_name, regex=re.compile(regex)))
                 else:
-                    format_dict[key] = ""
+                    self.question_keys.append(QuestionKey(key, q_name))
             elif key.startswith('v_'):
-                score_obj = Score.objects.get(declaration__name=key[2:], inquiry=inquiry)
-                format_dict[key] = score_obj.score
+                self.score_keys[key] = key[2:]
+
+        self.text = text
+
+    @property
+    def question_names(self):
+        """ The names of all questions whose answers are used in the text """
+        return {question_key.question_name for question_key in self.question_keys}
+
+    @property
+    def declaration_names(self):
+        """ The names of all ScoringDeclarations whose scores are used in the text """
+        return set(self.score_keys.values())
+
+    def render(self, inquiry=None, values=None):
+        """ Formats the text with information from the database
+        :param inquiry: The inquiry that it needs to apply on
+        :param values: An InquiryTextValues object containing the prefetched values of the inquiry. If not given, the
+        required values are retrieved for this text only
+        :return: The formatted text
+        """
+        if values is None:
+            values = InquiryTextValues(inquiry,
+                                       question_names=self.question_names,
+                                       declaration_names=self.declaration_names)
+
+        format_dict = {}
+        for question_key in self.question_keys:
+            format_dict[question_key.key] = question_key.get_value(values.get_answer(question_key.question_name))
+        for key, declaration_name in self.score_keys.items():
+            format_dict[key] = values.get_score(declaration_name)
+
+        return self.text.format(**format_dict)
 
-        except InquiryQuestionAnswer.DoesNotExist:
-            format_dict[key] = ""
-        except Score.DoesNotExist:
-            format_dict[key] = ""
 
-    return text.format(**format_dict)
+@lru_cache(maxsize=1024)
+def compile_text(text):
+    """ Returns the CompiledText of the given text, texts are parsed only once """
+    return CompiledText(text)
+
+
+class InquiryTextValues:
+    """ The answers and scores of an inquiry used to format texts, retrieved in batch
+
+    :param inquiry: The inquiry whose values are retrieved
+    :param question_names: The names of the questions whose answers are required, all if None
+    :param declaration_names: The names of the ScoringDeclarations whose scores are required, all if None
+    """
+
+    def __init__(self, inquiry, question_names=None, declaration_names=None):
+        self.inquiry = inquiry
+        self._question_names = question_names
+        self._declaration_names = declaration_names
+        self._answers = None
+        self._scores = None
+
+    @classmethod
+    def for_inquiry(cls, inquiry):
+        """ Returns the values of all questions and scores stored on the inquiry instance. Creates it if none is
+        present yet. Used where no values object can be handed down, e.g. in template filters """
+        if inquiry is None:
+            return cls(inquiry)
+        values = getattr(inquiry, '_text_values', None)
+        if values is None:
+            values = cls(inquiry)
+            inquiry._text_values = values
+        return values
+
+    def _load_answers(self):
+        self._answers = {}
+        if self.inquiry is None or self._question_names == set():
+            return
+
+        answers = InquiryQuestionAnswer.objects.filter(inquiry=self.inquiry)
+        if self._question_names is not None:
+            answers = answers.filter(question__name__in=self._question_names)
+        for iqa_obj in answers.select_related('question', 'processed_answer').order_by('-id'):
+            # Order descending so the first created answer takes precedence
+            self._answers[iqa_obj.question.name] = iqa_obj
+
+    def _load_scores(self):
+        self._scores = {}
+        if self.inquiry is None or self._declaration_names == set():
+            return
+
+        scores = Score.objects.filter(inquiry=self.inquiry)
+        if self._declaration_names is not None:
+            scores = scores.filter(declaration__name__in=self._declaration_names)
+        self._scores = dict(scores.values_list('declaration__name', 'score'))
+
+    def get_answer(self, question_name):
+        """ Returns the InquiryQuestionAnswer of the question with the given name, None if there is none """
+        if self._answers is None:
+            self._load_answers()
+        return self._answers.get(question_name, None)
+
+    def get_score(self, declaration_name):
+        """ Returns the score of the ScoringDeclaration with the given name, an empty string if it is not tracked """
+        if self._scores is None:
+            self._load_scores()
+        return self._scores.get(declaration_name, "")
+
+
+def format_from_database(text, inquiry=None, values=None):
+    """ Formats the given text with information from the database
+
+    :param text: The text that needs to be formatted.
+    :param inquiry: The inquiry that it needs to apply on
+    :param values: An InquiryTextValues object with prefetched values, use this when formatting multiple texts
+    :return:
+    """
+    return compile_text(text).render(inquiry=inquiry, values=values)
@@ -0,0 +1,194 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors.score_vectors import invalidate_score_vectors
+from Questionaire.processors.score_events import take_snapshots
+from Questionaire.processors import technology_verdicts
+
+""" This file contains code that recomputes the scores of inquiries from their processed answers
+
+After the scoring configuration (e.g. AnswerScoring.score_change_value or ScoringDeclaration.score_start_value) has
+been adjusted, the stored scores no longer match. The score of each declaration is the start value plus the sum of the
+adjustments of all processed answers, so the scores can be recomputed without the inquirer redoing the questionaire.
+"""
+
+__all__ = ['ScoreDifference', 'get_option_adjustments', 'compute_scores', 'rescore_inquiries',
+           'get_score_differences', 'store_score_differences']
+
+
+class ScoreDifference:
+    """ A difference between a stored score and its recomputed value. old_value is None for untracked scores """
+    __slots__ = ('inquiry_id', 'declaration_id', 'old_value', 'new_value', 'score_id')
+
+    def __init__(self, inquiry_id, declaration_id, old_value, new_value, score_id=None):
+        self.inquiry_id = inquiry_id
+        self.declaration_id = declaration_id
+        self.old_value = old_value
+        self.new_value = new_value
+        self.score_id = score_id
+
+    def __str__(self):
+        return "Inquiry {inquiry}, declaration {declaration}: {old} -> {new}".format(
+            inquiry=self.inquiry_id, declaration=self.declaration_id, old=self.old_value, new=self.new_value)
+
+
+def get_option_adjustments(definition):
+    """ Returns the net adjustments of each answer option as a sparse options x declarations matrix
+    {answer_option_id: {declaration_id: adjustment}} """
+    adjustments = {}
+    for answer_option_id, answer_option in definition.answer_options_by_id.items():
+        option_adjustments = {}
+        for scoring in answer_option.scorings:
+            option_adjustments[scoring.declaration_id] = \
+                option_adjustments.get(scoring.declaration_id, Decimal(0)) + scoring.get_score_change()
+        if option_adjustments:
+            adjustments[answer_option_id] = option_adjustments
+    return adjustments
+
+
+def compute_scores(inquiry_ids, definition=None, option_adjustments=None):
+    """ Computes the scores of the given inquiries based on their processed answers
+
+    The answers x options incidence of the inquiries is retrieved in a single query and multiplied with the
+    options x declarations adjustments.
+    :param inquiry_ids: The ids of the inquiries
+    :param definition: The QuestionaireDefinition to use, defaults to the current definition
+    :param option_adjustments: Precomputed result of get_option_adjustments for the definition
+    :return: A dictionary {inquiry_id: {declaration_id: score}} for all scores adjusted by a processed answer
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import InquiryQuestionAnswer
+
+    if definition is None:
+        definition = get_questionaire_definition()
+    if option_adjustments is None:
+        option_adjustments = get_option_adjustments(definition)
+
+    scores = {}
+    answers = InquiryQuestionAnswer.objects.filter(
+        inquiry_id__in=inquiry_ids,
+        processed=True,
+        processed_answer__isnull=False,
+    ).values_list('inquiry_id', 'processed_answer_id')
+    for inquiry_id, answer_option_id in answers:
+        adjustments = option_adjustments.get(answer_option_id, None)
+        if adjustments is None:
+            continue
+        inquiry_scores = scores.setdefault(inquiry_id, {})
+        for declaration_id, adjustment in adjustments.items():
+            if declaration_id not in inquiry_scores:
+                inquiry_scores[declaration_id] = definition.get_start_value(declaration_id)
+            inquiry_scores[declaration_id] += adjustment
+    return scores
+
+
+def chunks(items, chunk_size):
+    for i in range(0, len(items), chunk_size):
+        yield items[i:i + chunk_size]
+
+
+def rescore_inquiries(inquiry_ids=None, dry_run=False, chunk_size=1000):
+    """ Recomputes and stores the scores of inquiries
+
+    Stored scores that differ from their recomputed value are updated, scores adjusted by processed answers that are
+    not yet stored are created. Inquiries are processed in chunks, each chunk in its own transaction which locks the
+    Inquiry rows of the chunk, the same rows ScoreChanges.apply locks when it adjusts scores.
+    :param inquiry_ids: The ids of the inquiries that need to be rescored, defaults to all inquiries
+    :param dry_run: Whether the differences should only be computed and not stored
+    :param chunk_size: The number of inquiries processed at once
+    :return: A list of ScoreDifference objects
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import Inquiry
+
+    definition = get_questionaire_definition()
+    option_adjustments = get_option_adjustments(definition)
+
+    if inquiry_ids is None:
+        inquiry_ids = Inquiry.objects.order_by('id').values_list('id', flat=True)
+    inquiry_ids = list(inquiry_ids)
+
+    differences = []
+    for chunk in chunks(inquiry_ids, chunk_size):
+        with transaction.atomic():
+            if not dry_run:
+                # Lock the inquiries before their scores are computed, so score adjustments of answers processed in
+                # the meantime wait until the recomputed scores are stored instead of being overwritten by them
+                list(Inquiry.objects.select_for_update().filter(id__in=chunk).values_list('id', flat=True))
+
+            computed_scores = compute_scores(chunk, definition=definition, option_adjustments=option_adjustments)
+            chunk_differences = get_score_differences(chunk, computed_scores, definition=definition)
+
+            if not dry_run:
+                store_score_differences(chunk_differences)
+                # The event log no longer explains the adjusted scores, so mark the new state as the starting point
+                take_snapshots({difference.inquiry_id for difference in chunk_differences})
+        differences.extend(chunk_differences)
+
+    return differences
+
+
+def get_score_differences(inquiry_ids, computed_scores, definition=None):
+    """ Compares computed scores with the stored scores
+    :param inquiry_ids: The ids of the inquiries to compare
+    :param computed_scores: A dictionary {inquiry_id: {declaration_id: score}}. Stored scores that are not present
+    are compared with the start value of their declaration. This dictionary is emptied in the process.
+    :param definition: The QuestionaireDefinition to use, defaults to the current definition
+    :return: A list of ScoreDifference objects
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import Score
+
+    if definition is None:
+        definition = get_questionaire_definition()
+
+    differences = []
+    stored_scores = Score.objects.filter(inquiry_id__in=inquiry_ids).values_list(
+        'id', 'inquiry_id', 'declaration_id', 'score')
+    for score_id, inquiry_id, declaration_id, score in stored_scores:
+        inquiry_scores = computed_scores.get(inquiry_id, {})
+        if declaration_id in inquiry_scores:
+            new_value = inquiry_scores.pop(declaration_id)
+        else:
+            # The score is not adjusted, so it should be at its start value
+            new_value = definition.get_start_value(declaration_id)
+        if new_value != score:
+            differences.append(ScoreDifference(inquiry_id, declaration_id, score, new_value, score_id=score_id))
+
+    # The remaining computed scores are not stored yet
+    for inquiry_id, inquiry_scores in computed_scores.items():
+        for declaration_id, new_value in inquiry_scores.items():
+            differences.append(ScoreDifference(inquiry_id, declaration_id, None, new_value))
+    computed_scores.clear()
+
+    return differences
+
+
+def store_score_differences(differences):
+    """ Stores the new values of the given differences """
+    # Import here to avoid circular imports
+    from Questionaire.models import Inquiry, Score
+
+    with transaction.atomic():
+        Score.objects.bulk_update(
+            [Score(id=difference.score_id, score=difference.new_value)
+             for difference in differences if difference.score_id is not None],
+            ['score'],
+        )
+        Score.objects.bulk_create(
+            [Score(inquiry_id=difference.inquiry_id,
+                   declaration_id=difference.declaration_id,
+                   score=difference.new_value)
+             for difference in differences if difference.score_id is None],
+        )
+        invalidate_score_vectors({difference.inquiry_id for difference in differences})
+        Inquiry.increment_score_versions({difference.inquiry_id for difference in differences})
+
+    if technology_verdicts.is_enabled():
+        technology_verdicts.refresh_all_verdicts(
+            inquiry_ids={difference.inquiry_id for difference in differences},
+            technology_ids=technology_verdicts.get_technologies_for_declarations(
+                {difference.declaration_id for difference in differences}),
+        )
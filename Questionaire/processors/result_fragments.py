@@ -0,0 +1,103 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from django.utils import timezone, translation
+from django.utils.safestring import mark_safe
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+
+""" This file contains code that caches rendered result fragments of inquiries
+
+The results of an inquiry only change when its answers or scores change, which increments the score version of the
+inquiry. Rendered fragments (e.g. technology result cards) are stored in the cache defined by
+settings.RESULT_FRAGMENT_CACHE under a key combining the inquiry, its score version, the version of the questionaire
+definition and the last edit of the displayed technology. Outdated fragments are never read again and expire from the
+cache on their own.
+"""
+
+__all__ = ['is_enabled', 'get_fragment_cache', 'get_fragment_key', 'get_or_render_fragment']
+
+
+def is_enabled():
+    return settings.RESULT_FRAGMENT_CACHING
+
+
+def get_fragment_cache():
+    return caches[settings.RESULT_FRAGMENT_CACHE]
+
+
+def get_fragment_key(name, inquiry, technology=None, *extra):
+    """ Returns the cache key of a result fragment
+    :param name: The name of the fragment
+    :param inquiry: The inquiry whose results are displayed
+    :param technology: The technology the fragment displays, if any
+    :param extra: Other values the fragment depends on
+    :return: The cache key
+    """
+    # The creation moment is part of the key, as ids of deleted inquiries can be reused
+    parts = [name, inquiry.id, inquiry.created_on.timestamp(), inquiry.score_version,
+             get_questionaire_definition().version, translation.get_language()]
+    if technology is not None:
+        parts.extend([technology.id, technology.last_edited.timestamp()])
+    parts.extend(extra)
+    key_hash = hashlib.md5(":".join(str(part) for part in parts).encode()).hexdigest()
+    return f"result_fragment.{name}.{key_hash}"
+
+
+def get_or_render_fragment(render, name, inquiry, technology=None, *extra):
+    """ Returns the cached fragment, renders and stores it when it is not cached
+    :param render: A function without arguments that renders the fragment
+    :return: The rendered fragment
+    """
+    if not is_enabled() or inquiry is None:
+        return render()
+
+    cache = get_fragment_cache()
+    key = get_fragment_key(name, inquiry, technology, *extra)
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = render()
+        cache.set(key, fragment)
+    return mark_safe(fragment)
+
+
+def _touch_technologies(technology_ids):
+    """ Marks the given technologies as edited, so their cached fragments are no longer used """
+    # Import here to avoid circular imports
+    from Questionaire.models import Technology
+    Technology.objects.filter(id__in=technology_ids).update(last_edited=timezone.now())
+
+
+def touch_technology_on_note_change(instance, **kwargs):
+    """ Invalidates the cached fragments of the technology of a changed AnswerScoringNote. Connected to the
+    AnswerScoringNote signals """
+    if instance.technology_id is not None:
+        _touch_technologies([instance.technology_id])
+
+
+def touch_technology_on_note_requirement_change(instance, action, reverse, pk_set=None, **kwargs):
+    """ Invalidates the cached fragments of the technologies of notes whose include or exclude options changed.
+    Connected to the m2m_changed signals of AnswerScoringNote.include_on and exclude_on """
+    # Import here to avoid circular imports
+    from Questionaire.models import AnswerScoringNote
+
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        touch_technology_on_note_change(instance)
+    elif pk_set is not None:
+        # The instance is the answer option, pk_set contains the notes
+        _touch_technologies(AnswerScoringNote.objects.filter(id__in=pk_set).values_list('technology_id', flat=True))
+    else:
+        # The cleared notes are unknown after the clear, so all notes that might be affected are found before it
+        _touch_technologies(AnswerScoringNote.objects.filter(
+            models.Q(include_on=instance) | models.Q(exclude_on=instance)).values_list('technology_id', flat=True))
+
+
+def increment_score_version_on_change(instance, **kwargs):
+    """ Invalidates the cached results of the inquiry of a changed Score object. Connected to the Score signals """
+    # Import here to avoid circular imports
+    from Questionaire.models import Inquiry
+    Inquiry.increment_score_versions([instance.inquiry_id])
@@ -0,0 +1,178 @@
+import json
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+
+""" This file contains code that maintains and replays the score event log of inquiries
+
+Each application of score adjustments is logged as ScoreEvents (see ScoreChanges.apply). ScoreSnapshots store the
+scores of an inquiry at a certain event, so the scores can be reconstructed from the last snapshot and the events
+logged after it. Comparing the reconstructed scores with the stored scores detects drift, which can then be repaired.
+Events that are covered by the last snapshot of an inquiry can be pruned.
+"""
+
+__all__ = ['take_snapshots', 'prune_score_events', 'replay_scores', 'find_score_drift', 'repair_score_drift']
+
+
+def take_snapshots(inquiry_ids, min_events=0):
+    """ Stores the current scores of the given inquiries as a snapshot
+
+    :param inquiry_ids: The ids of the inquiries
+    :param min_events: The minimum number of events since the last snapshot required for a new snapshot
+    :return: The number of created snapshots
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import Inquiry, Score, ScoreEvent, ScoreSnapshot
+
+    inquiry_ids = list(inquiry_ids)
+    if not inquiry_ids:
+        return 0
+
+    with transaction.atomic():
+        # Score adjustments lock their inquiry as well, so the events and the scores are read in the same state
+        list(Inquiry.objects.select_for_update().filter(id__in=inquiry_ids).values_list('id', flat=True))
+
+        last_events = dict(ScoreEvent.objects.filter(inquiry_id__in=inquiry_ids).values(
+            'inquiry_id').annotate(last_event_id=Max('id')).values_list('inquiry_id', 'last_event_id'))
+
+        if min_events > 0:
+            last_snapshot_events = _get_last_snapshot_events(inquiry_ids)
+            event_counts = {}
+            for inquiry_id, event_id in ScoreEvent.objects.filter(
+                    inquiry_id__in=inquiry_ids).values_list('inquiry_id', 'id'):
+                if event_id > last_snapshot_events.get(inquiry_id, 0):
+                    event_counts[inquiry_id] = event_counts.get(inquiry_id, 0) + 1
+            inquiry_ids = [inquiry_id for inquiry_id in inquiry_ids
+                           if event_counts.get(inquiry_id, 0) >= min_events]
+
+        values = {inquiry_id: {} for inquiry_id in inquiry_ids}
+        for inquiry_id, declaration_id, score in Score.objects.filter(inquiry_id__in=inquiry_ids).values_list(
+                'inquiry_id', 'declaration_id', 'score'):
+            values[inquiry_id][str(declaration_id)] = str(score)
+
+        ScoreSnapshot.objects.bulk_create([
+            ScoreSnapshot(inquiry_id=inquiry_id,
+                          last_event_id=last_events.get(inquiry_id, 0),
+                          values=json.dumps(inquiry_values))
+            for inquiry_id, inquiry_values in values.items()
+        ])
+    return len(values)
+
+
+def prune_score_events(inquiry_ids):
+    """ Removes the events and snapshots that are covered by the last snapshot of the given inquiries
+
+    :param inquiry_ids: The ids of the inquiries
+    :return: The number of removed events
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import ScoreEvent, ScoreSnapshot
+
+    last_snapshots = {}
+    for snapshot_id, inquiry_id, last_event_id in ScoreSnapshot.objects.filter(inquiry_id__in=inquiry_ids).order_by(
+            'id').values_list('id', 'inquiry_id', 'last_event_id'):
+        last_snapshots[inquiry_id] = (snapshot_id, last_event_id)
+    if not last_snapshots:
+        return 0
+
+    with transaction.atomic():
+        ScoreSnapshot.objects.filter(inquiry_id__in=last_snapshots.keys()).exclude(
+            id__in=[snapshot_id for snapshot_id, _ in last_snapshots.values()]).delete()
+
+        # Inquiries whose snapshots cover the same events are pruned together
+        inquiries_by_last_event = {}
+        for inquiry_id, (_, last_event_id) in last_snapshots.items():
+            inquiries_by_last_event.setdefault(last_event_id, []).append(inquiry_id)
+
+        num_deleted = 0
+        for last_event_id, event_inquiry_ids in inquiries_by_last_event.items():
+            num_deleted += ScoreEvent.objects.filter(inquiry_id__in=event_inquiry_ids,
+                                                     id__lte=last_event_id).delete()[0]
+    return num_deleted
+
+
+def _get_last_snapshot_events(inquiry_ids):
+    """ Returns the last_event_id of the most recent snapshot of each inquiry """
+    from Questionaire.models import ScoreSnapshot
+
+    last_snapshot_events = {}
+    for inquiry_id, last_event_id in ScoreSnapshot.objects.filter(inquiry_id__in=inquiry_ids).order_by(
+            'id').values_list('inquiry_id', 'last_event_id'):
+        last_snapshot_events[inquiry_id] = last_event_id
+    return last_snapshot_events
+
+
+def replay_scores(inquiry_ids, definition=None):
+    """ Reconstructs the scores of the given inquiries from their last snapshot and the events logged after it
+    Declarations that are not in the snapshot start from the start value of the declaration
+
+    :param inquiry_ids: The ids of the inquiries
+    :param definition: The QuestionaireDefinition to use, defaults to the current definition
+    :return: A dictionary {inquiry_id: {declaration_id: score}}
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import ScoreEvent, ScoreSnapshot
+
+    if definition is None:
+        definition = get_questionaire_definition()
+    inquiry_ids = list(inquiry_ids)
+
+    scores = {}
+    last_snapshot_events = {}
+    # Later snapshots overwrite earlier ones
+    for inquiry_id, last_event_id, values in ScoreSnapshot.objects.filter(inquiry_id__in=inquiry_ids).order_by(
+            'id').values_list('inquiry_id', 'last_event_id', 'values'):
+        last_snapshot_events[inquiry_id] = last_event_id
+        scores[inquiry_id] = {
+            int(declaration_id): Decimal(value) for declaration_id, value in json.loads(values).items()
+        }
+
+    events = ScoreEvent.objects.filter(inquiry_id__in=inquiry_ids)
+    if last_snapshot_events and len(last_snapshot_events) == len(set(inquiry_ids)):
+        # All inquiries have a snapshot, so older events do not need to be retrieved
+        events = events.filter(id__gt=min(last_snapshot_events.values()))
+
+    for event_id, inquiry_id, declaration_id, change in events.order_by('id').values_list(
+            'id', 'inquiry_id', 'declaration_id', 'change'):
+        if event_id <= last_snapshot_events.get(inquiry_id, 0):
+            continue
+        inquiry_scores = scores.setdefault(inquiry_id, {})
+        if declaration_id not in inquiry_scores:
+            inquiry_scores[declaration_id] = definition.get_start_value(declaration_id)
+        inquiry_scores[declaration_id] += change
+
+    return scores
+
+
+def find_score_drift(inquiry_ids=None, chunk_size=1000):
+    """ Returns the stored scores that differ from their replayed value
+    :param inquiry_ids: The ids of the inquiries to check, defaults to all inquiries
+    :param chunk_size: The number of inquiries processed at once
+    :return: A list of ScoreDifference objects
+    """
+    from Questionaire.models import Inquiry
+    from Questionaire.processors.rescoring import chunks, get_score_differences
+
+    definition = get_questionaire_definition()
+    if inquiry_ids is None:
+        inquiry_ids = Inquiry.objects.order_by('id').values_list('id', flat=True)
+
+    differences = []
+    for chunk in chunks(list(inquiry_ids), chunk_size):
+        differences.extend(get_score_differences(chunk, replay_scores(chunk, definition=definition),
+                                                 definition=definition))
+    return differences
+
+
+def repair_score_drift(inquiry_ids=None, chunk_size=1000):
+    """ Restores the stored scores that differ from their replayed value
+    :return: A list of the repaired ScoreDifference objects
+    """
+    from Questionaire.processors.rescoring import store_score_differences
+
+    differences = find_score_drift(inquiry_ids=inquiry_ids, chunk_size=chunk_size)
+    store_score_differences(differences)
+    return differences
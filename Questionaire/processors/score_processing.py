@@ -0,0 +1,107 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When, F, Value, DecimalField
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors import score_vectors, technology_verdicts
+
+""" This file contains code that aggregates and applies score adjustments on inquiries """
+
+__all__ = ['ScoreChanges']
+
+
+class ScoreChanges(dict):
+    """ A collection of net score adjustments, keyed by the id of the ScoringDeclaration
+
+    Adjustments from multiple answers can be combined, after which they are applied on an inquiry with a single
+    update per adjusted declaration. Adjustments that cancel each other out are not applied at all.
+    """
+
+    @classmethod
+    def from_answer_option(cls, answer_option_id, revert=False):
+        """ Returns the adjustments made when the given answer option is processed
+        :param answer_option_id: The id of the AnswerOption
+        :param revert: Whether the adjustments of the backwards process need to be returned
+        """
+        score_changes = cls()
+        for adjustment in get_questionaire_definition().get_scorings(answer_option_id):
+            score_changes.add(adjustment.declaration_id, adjustment.get_score_change(revert=revert))
+        return score_changes
+
+    def add(self, declaration_id, value):
+        """ Adds a score adjustment for the given declaration """
+        self[declaration_id] = self.get(declaration_id, Decimal(0)) + value
+
+    def merge(self, score_changes):
+        """ Adds all adjustments in the given ScoreChanges object """
+        for declaration_id, value in score_changes.items():
+            self.add(declaration_id, value)
+        return self
+
+    def reverted(self):
+        """ Returns a ScoreChanges object that undoes the adjustments in this object """
+        return ScoreChanges({declaration_id: -value for declaration_id, value in self.items()})
+
+    def get_net_changes(self):
+        """ Returns the adjustments that actually change a score """
+        return {declaration_id: value for declaration_id, value in self.items() if value != 0}
+
+    def apply(self, inquiry):
+        """ Applies the adjustments on the scores of the given inquiry and logs them as ScoreEvents
+        Scores that are not yet tracked are created with the start value of their declaration. All tracked scores are
+        adjusted with a single statement and all changes are made within one transaction.
+        :param inquiry: The inquiry whose scores need to be adjusted
+        """
+        # Import here to avoid circular imports
+        from Questionaire.models import Inquiry, Score, ScoreEvent, TechnologyVerdict
+
+        net_changes = self.get_net_changes()
+        if not net_changes:
+            return
+
+        with transaction.atomic(savepoint=False):
+            # Marking the scores as changed first locks the inquiry, so adjustments of the same inquiry and snapshots
+            # of its scores are serialized
+            Inquiry.increment_score_versions([inquiry.id])
+
+            # Log the adjustments, so the scores can be audited and replayed
+            ScoreEvent.objects.bulk_create([
+                ScoreEvent(inquiry_id=inquiry.id, declaration_id=declaration_id, change=value)
+                for declaration_id, value in net_changes.items()
+            ])
+
+            tracked_declarations = set(Score.objects.filter(
+                inquiry=inquiry,
+                declaration_id__in=net_changes.keys(),
+            ).values_list('declaration_id', flat=True))
+
+            if tracked_declarations:
+                Score.objects.filter(inquiry=inquiry, declaration_id__in=tracked_declarations).update(
+                    score=Case(
+                        *[When(declaration_id=declaration_id,
+                               then=F('score') + Value(net_changes[declaration_id], output_field=DecimalField()))
+                          for declaration_id in tracked_declarations],
+                        default=F('score'),
+                        output_field=DecimalField(),
+                    )
+                )
+
+            untracked_declarations = set(net_changes.keys()) - tracked_declarations
+            if untracked_declarations:
+                definition = get_questionaire_definition()
+                Score.objects.bulk_create([
+                    Score(inquiry=inquiry,
+                          declaration_id=declaration_id,
+                          score=definition.get_start_value(declaration_id) + net_changes[declaration_id])
+                    for declaration_id in untracked_declarations
+                ])
+
+            if score_vectors.is_enabled():
+                score_vectors.refresh_score_vector(inquiry)
+            if technology_verdicts.is_enabled():
+                # Inquiries without any verdicts, e.g. those created before the verdicts were stored, need all of them
+                technology_ids = None
+                if TechnologyVerdict.objects.filter(inquiry_id=inquiry.id).exists():
+                    technology_ids = technology_verdicts.get_technologies_for_declarations(net_changes.keys())
+                technology_verdicts.refresh_verdicts([inquiry.id], technology_ids=technology_ids)
@@ -0,0 +1,133 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+
+""" This file contains code that stores all scores of an inquiry as a single compact array
+
+When settings.SCORE_VECTOR_STORAGE is enabled, a ScoreVector row is kept next to the Score objects of an inquiry. The
+scores are stored in the declaration order of the questionaire definition, so reading all scores of an inquiry costs
+a single row fetch. The Score objects remain the source of the scores; vectors are refreshed after score adjustments
+and discarded when Score objects are changed directly. Reading scores never writes: when the vector is missing or
+outdated (e.g. after a declaration was added) the Score objects are read instead, until the vector is rebuilt by the
+next score adjustment or the refresh_score_vectors command.
+"""
+
+__all__ = ['get_inquiry_scores', 'refresh_score_vector', 'refresh_score_vectors', 'invalidate_score_vectors']
+
+
+def is_enabled():
+    return settings.SCORE_VECTOR_STORAGE
+
+
+def encode_scores(scores, definition):
+    """ Encodes a dictionary of scores to the array format. Untracked scores are stored as an empty value """
+    return ",".join(str(scores[declaration_id]) if declaration_id in scores else ""
+                    for declaration_id in definition.declaration_ids)
+
+
+def decode_scores(values, definition):
+    """ Decodes the array format to a dictionary of scores keyed by declaration id """
+    scores = {}
+    if not values:
+        return scores
+    for declaration_id, value in zip(definition.declaration_ids, values.split(",")):
+        if value:
+            scores[declaration_id] = Decimal(value)
+    return scores
+
+
+def _get_scores_from_rows(inquiry_id):
+    # Import here to avoid circular imports
+    from Questionaire.models import Score
+    return dict(Score.objects.filter(inquiry_id=inquiry_id).values_list('declaration_id', 'score'))
+
+
+def get_inquiry_scores(inquiry):
+    """ Returns all tracked scores of an inquiry
+    :param inquiry: The inquiry (or None)
+    :return: A dictionary of score values keyed by declaration id
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import ScoreVector
+
+    if inquiry is None:
+        return {}
+    if not is_enabled():
+        return _get_scores_from_rows(inquiry.id)
+
+    definition = get_questionaire_definition()
+    vector = ScoreVector.objects.filter(inquiry_id=inquiry.id).values_list('layout', 'values').first()
+    if vector is not None and vector[0] == definition.declaration_layout:
+        return decode_scores(vector[1], definition)
+
+    return _get_scores_from_rows(inquiry.id)
+
+
+def refresh_score_vector(inquiry):
+    """ Reconstructs the vector of the inquiry from its Score objects
+    :return: A dictionary of score values keyed by declaration id
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import ScoreVector
+
+    scores = _get_scores_from_rows(inquiry.id)
+    if is_enabled():
+        definition = get_questionaire_definition()
+        ScoreVector.objects.update_or_create(
+            inquiry_id=inquiry.id,
+            defaults={
+                'layout': definition.declaration_layout,
+                'values': encode_scores(scores, definition),
+            }
+        )
+    return scores
+
+
+def refresh_score_vectors(inquiry_ids=None, chunk_size=500):
+    """ Reconstructs the vectors of many inquiries from their Score objects, in chunks
+    :param inquiry_ids: The ids of the inquiries to refresh, defaults to all inquiries
+    :param chunk_size: The number of inquiries processed at once
+    :return: The number of refreshed vectors
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import Inquiry, Score, ScoreVector
+
+    if not is_enabled():
+        return 0
+
+    definition = get_questionaire_definition()
+    if inquiry_ids is None:
+        inquiry_ids = Inquiry.objects.order_by('id').values_list('id', flat=True)
+    inquiry_ids = list(inquiry_ids)
+    for i in range(0, len(inquiry_ids), chunk_size):
+        chunk = inquiry_ids[i:i + chunk_size]
+        scores = {inquiry_id: {} for inquiry_id in chunk}
+        for inquiry_id, declaration_id, score in Score.objects.filter(inquiry_id__in=chunk).values_list(
+                'inquiry_id', 'declaration_id', 'score'):
+            scores[inquiry_id][declaration_id] = score
+
+        with transaction.atomic():
+            ScoreVector.objects.filter(inquiry_id__in=chunk).delete()
+            ScoreVector.objects.bulk_create([
+                ScoreVector(inquiry_id=inquiry_id, layout=definition.declaration_layout,
+                            values=encode_scores(inquiry_scores, definition))
+                for inquiry_id, inquiry_scores in scores.items()
+            ])
+    return len(inquiry_ids)
+
+
+def invalidate_score_vectors(inquiry_ids):
+    """ Removes the vectors of the given inquiries, they are reconstructed when read """
+    # Import here to avoid circular imports
+    from Questionaire.models import ScoreVector
+
+    if is_enabled():
+        ScoreVector.objects.filter(inquiry_id__in=inquiry_ids).delete()
+
+
+def invalidate_score_vector_on_change(instance, **kwargs):
+    """ Removes the vector of the inquiry of a changed Score object. Connected to the Score signals """
+    invalidate_score_vectors([instance.inquiry_id])
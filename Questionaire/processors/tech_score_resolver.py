@@ -0,0 +1,193 @@
+""" This file contains code that computes the technology results for an inquiry in a single batch """
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors.score_vectors import get_inquiry_scores
+
+__all__ = ['TechScoreResolver']
+
+
+class TechScoreResolver:
+    """ Computes the SUCCESS/FAIL/UNKNOWN/VARIES state of technologies and tech groups for a single inquiry
+
+    All scores are retrieved once and the TechScoreLinks and tech group relations are taken from the
+    questionaire definition, after which the result of each technology is computed in memory. Results are cached on
+    the resolver, so a resolver should not outlive changes in the scores of its inquiry.
+
+    :param inquiry: The inquiry the technology results need to be computed for
+    :param scores: A dictionary {declaration_id: score} to compute the results for instead of the stored scores of
+    an inquiry, e.g. for hypothetical answers
+    :param definition: The QuestionaireDefinition to use, defaults to the current definition
+    """
+
+    def __init__(self, inquiry, scores=None, definition=None):
+        self.inquiry = inquiry
+        self._given_scores = scores
+        self._definition = definition
+        self._scores = None
+        self._links = None
+        self._sub_technologies = None
+        self._start_values = None
+        self._results = {}
+
+    @classmethod
+    def for_inquiry(cls, inquiry):
+        """ Returns the resolver stored on the inquiry instance. Creates one if none is present yet.
+        Used where no resolver can be handed down, e.g. in template filters """
+        resolver = getattr(inquiry, '_tech_score_resolver', None)
+        if resolver is None:
+            resolver = cls(inquiry)
+            inquiry._tech_score_resolver = resolver
+        return resolver
+
+    def _load(self):
+        """ Retrieves all data required to compute the technology results """
+        self._scores = {}
+        definition = self._definition or get_questionaire_definition()
+        self._links = definition.tech_score_links
+        self._sub_technologies = definition.sub_technologies
+        self._start_values = definition.declaration_start_values
+
+        if self._given_scores is not None:
+            self._scores = self._given_scores
+        elif self.inquiry is not None:
+            self._scores = get_inquiry_scores(self.inquiry)
+
+    def _has_scores(self):
+        """ Returns whether there are scores to compute results for """
+        return self.inquiry is not None or self._given_scores is not None
+
+    def _ensure_loaded(self):
+        if self._scores is None:
+            self._load()
+
+    def get_score_value(self, declaration_id):
+        """ Returns the score value of the given declaration, defaults to the start value if it is not yet tracked """
+        self._ensure_loaded()
+        try:
+            return self._scores[declaration_id]
+        except KeyError:
+            return self._start_values[declaration_id]
+
+    def get_link_score(self, score_link):
+        """ Returns the result of a single TechScoreLink (definition) """
+        return score_link.get_score_for_value(self.get_score_value(score_link.declaration_id))
+
+    def get_technology_score(self, technology):
+        """ Returns the result of a technology based on its TechScoreLinks (see Technology.get_score) """
+        return self._get_technology_score(technology.id)
+
+    def _get_technology_score(self, technology_id):
+        # Import here to avoid circular imports
+        from Questionaire.models import Technology
+
+        if not self._has_scores():
+            return Technology.TECH_UNKNOWN
+        self._ensure_loaded()
+
+        key = ('tech', technology_id)
+        if key in self._results:
+            return self._results[key]
+
+        all_fail = True
+        all_pass = True
+        # Check for all sub_techs the states and mark trends
+        for score_link in self._links.get(technology_id, []):
+            score = self.get_link_score(score_link)
+            if score != Technology.TECH_SUCCESS:
+                all_pass = False
+            if score != Technology.TECH_FAIL:
+                all_fail = False
+
+        # Analyse the trends and conclude overall progress
+        if all_pass:
+            result = Technology.TECH_SUCCESS
+        elif all_fail:
+            result = Technology.TECH_FAIL
+        else:
+            # Scores vary too much, result is unknown
+            result = Technology.TECH_UNKNOWN
+
+        self._results[key] = result
+        return result
+
+    def get_tech_group_score(self, tech_group):
+        """ Returns the result of a tech group based on its sub technologies (see TechGroup.get_score) """
+        return self._get_tech_group_score(tech_group.id)
+
+    def _get_tech_group_score(self, tech_group_id):
+        # Import here to avoid circular imports
+        from Questionaire.models import Technology
+
+        if not self._has_scores():
+            return Technology.TECH_UNKNOWN
+        self._ensure_loaded()
+
+        sub_technology_ids = self._sub_technologies.get(tech_group_id, [])
+        if len(sub_technology_ids) == 0:
+            return self._get_technology_score(tech_group_id)
+
+        key = ('group', tech_group_id)
+        if key in self._results:
+            return self._results[key]
+
+        all_pass = True
+        all_fail = True
+        computed = 0.0
+
+        # Check for all sub_techs the states and mark trends
+        for sub_technology_id in sub_technology_ids:
+            score = self._get_technology_score(sub_technology_id)
+            if score != Technology.TECH_SUCCESS:
+                all_pass = False
+            if score != Technology.TECH_FAIL:
+                all_fail = False
+            if score != Technology.TECH_UNKNOWN:
+                computed = computed + 1
+
+        # Analyse the trends and conclude overall progress
+        if computed <= len(sub_technology_ids) / 2:
+            # Too few results to analyse overall trend
+            result = Technology.TECH_UNKNOWN
+        elif all_pass:
+            result = Technology.TECH_SUCCESS
+        elif all_fail:
+            result = Technology.TECH_FAIL
+        else:
+            # Scores vary
+            result = Technology.TECH_VARIES
+
+        self._results[key] = result
+        return result
+
+    def get_score(self, technology):
+        """ Returns the result of the given technology, computed as a tech group when it is a TechGroup instance """
+        # Import here to avoid circular imports
+        from Questionaire.models import TechGroup
+
+        if isinstance(technology, TechGroup):
+            return self.get_tech_group_score(technology)
+        return self.get_technology_score(technology)
+
+    def get_score_by_id(self, technology_id):
+        """ Returns the result of the technology with the given id, computed as a tech group when it has sub
+        technologies """
+        self._ensure_loaded()
+        if technology_id in self._sub_technologies:
+            return self._get_tech_group_score(technology_id)
+        return self._get_technology_score(technology_id)
+
+    def annotate_technologies(self, technologies):
+        """ Computes the result of each technology and stores it in its score attribute
+
+        Technologies that are tech groups are replaced by their TechGroup instance.
+        :param technologies: An iterable of technologies, preferably with select_related('techgroup')
+        :return: A list of the (annotated) technologies in the given order
+        """
+        annotated = []
+        for technology in technologies:
+            if hasattr(technology, 'techgroup'):
+                technology = technology.techgroup
+
+            technology.score = self.get_score(technology)
+            annotated.append(technology)
+        return annotated
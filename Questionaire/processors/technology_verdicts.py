@@ -0,0 +1,204 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete
+
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
+from queued_tasks.processors import TaskProcessor
+
+""" This file contains code that maintains the stored technology results of inquiries
+
+When settings.TECHNOLOGY_VERDICT_STORAGE is enabled, a TechnologyVerdict is kept for each inquiry and technology. All
+verdicts of an inquiry are created when the inquiry is created and are recomputed for the affected technologies
+whenever scores are adjusted. Changes in the TechScoreLinks, start values or tech groups of technologies affect all
+inquiries, so these are recomputed in the task queue. Only verdicts that differ from the stored verdict are written.
+"""
+
+__all__ = ['is_enabled', 'get_technologies_for_declarations', 'refresh_verdicts', 'refresh_all_verdicts',
+           'VerdictRefreshProcessor', 'queue_verdict_refresh']
+
+
+def is_enabled():
+    return settings.TECHNOLOGY_VERDICT_STORAGE
+
+
+def _with_tech_groups(technology_ids, definition):
+    """ Returns the given technology ids extended with the tech groups that contain them """
+    technology_ids = set(technology_ids)
+    for tech_group_id, sub_technology_ids in definition.sub_technologies.items():
+        if technology_ids.intersection(sub_technology_ids):
+            technology_ids.add(tech_group_id)
+    return technology_ids
+
+
+def get_technologies_for_declarations(declaration_ids, definition=None):
+    """ Returns the ids of the technologies whose result depends on the given ScoringDeclarations """
+    definition = definition or get_questionaire_definition()
+    declaration_ids = set(declaration_ids)
+    technology_ids = {technology_id for technology_id, links in definition.tech_score_links.items()
+                      if any(link.declaration_id in declaration_ids for link in links)}
+    return _with_tech_groups(technology_ids, definition)
+
+
+def refresh_verdicts(inquiry_ids, technology_ids=None, definition=None, create_missing=True):
+    """ Recomputes and stores the verdicts of the given inquiries
+
+    :param inquiry_ids: The ids of the inquiries
+    :param technology_ids: The ids of the technologies to recompute, defaults to all technologies
+    :param definition: The QuestionaireDefinition to use, defaults to the current definition
+    :param create_missing: Whether verdicts that are not yet stored should be created
+    :return: The number of created or adjusted verdicts
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import Score, TechnologyVerdict
+
+    definition = definition or get_questionaire_definition()
+    if technology_ids is None:
+        technology_ids = definition.technology_ids
+    else:
+        # Ignore technologies that no longer exist
+        technology_ids = set(technology_ids).intersection(definition.technology_ids)
+
+    inquiry_ids = list(inquiry_ids)
+    if not inquiry_ids or not technology_ids:
+        return 0
+
+    scores = {inquiry_id: {} for inquiry_id in inquiry_ids}
+    for inquiry_id, declaration_id, score in Score.objects.filter(inquiry_id__in=inquiry_ids).values_list(
+            'inquiry_id', 'declaration_id', 'score'):
+        scores[inquiry_id][declaration_id] = score
+
+    stored_verdicts = {}
+    for verdict_id, inquiry_id, technology_id, verdict in TechnologyVerdict.objects.filter(
+            inquiry_id__in=inquiry_ids, technology_id__in=technology_ids).values_list(
+            'id', 'inquiry_id', 'technology_id', 'verdict'):
+        stored_verdicts[(inquiry_id, technology_id)] = (verdict_id, verdict)
+
+    new_verdicts = []
+    # The ids of the stored verdicts that need to be adjusted, keyed by their new verdict
+    adjusted_verdicts = {}
+    for inquiry_id, inquiry_scores in scores.items():
+        resolver = TechScoreResolver(None, scores=inquiry_scores, definition=definition)
+        for technology_id in technology_ids:
+            verdict = resolver.get_score_by_id(technology_id)
+            stored = stored_verdicts.get((inquiry_id, technology_id), None)
+            if stored is None:
+                if not create_missing:
+                    continue
+                new_verdicts.append(TechnologyVerdict(inquiry_id=inquiry_id, technology_id=technology_id,
+                                                      verdict=verdict))
+            elif stored[1] != verdict:
+                adjusted_verdicts.setdefault(verdict, []).append(stored[0])
+
+    with transaction.atomic():
+        TechnologyVerdict.objects.bulk_create(new_verdicts)
+        for verdict, verdict_ids in adjusted_verdicts.items():
+            TechnologyVerdict.objects.filter(id__in=verdict_ids).update(verdict=verdict)
+
+    return len(new_verdicts) + sum(len(verdict_ids) for verdict_ids in adjusted_verdicts.values())
+
+
+def refresh_all_verdicts(technology_ids=None, inquiry_ids=None, chunk_size=500):
+    """ Recomputes and stores the verdicts of many inquiries, in chunks
+    :param technology_ids: The ids of the technologies to recompute, defaults to all technologies
+    :param inquiry_ids: The ids of the inquiries to recompute, defaults to all inquiries
+    :param chunk_size: The number of inquiries processed at once
+    :return: The number of created or adjusted verdicts
+    """
+    # Import here to avoid circular imports
+    from Questionaire.models import Inquiry
+
+    definition = get_questionaire_definition()
+    if inquiry_ids is None:
+        inquiry_ids = Inquiry.objects.order_by('id').values_list('id', flat=True)
+    inquiry_ids = list(inquiry_ids)
+    num_refreshed = 0
+    for i in range(0, len(inquiry_ids), chunk_size):
+        num_refreshed += refresh_verdicts(inquiry_ids[i:i + chunk_size], technology_ids=technology_ids,
+                                          definition=definition)
+    return num_refreshed
+
+
+class VerdictRefreshProcessor(TaskProcessor):
+    """ Recomputes the verdicts of the technologies of a QueuedVerdictRefreshTask for all inquiries, in chunks """
+    update_gap = 1
+    chunk_size = 500
+
+    def get_iterator(self):
+        # Import here to avoid circular imports
+        from Questionaire.models import Inquiry
+
+        self.definition = get_questionaire_definition()
+        self.num_refreshed = 0
+        inquiry_ids = list(Inquiry.objects.order_by('id').values_list('id', flat=True))
+        chunks = [inquiry_ids[i:i + self.chunk_size] for i in range(0, len(inquiry_ids), self.chunk_size)]
+        self.total_entries = len(chunks)
+        return chunks
+
+    def process_iteration(self, inquiry_ids, i):
+        self.num_refreshed += refresh_verdicts(inquiry_ids, technology_ids=self.task.get_technology_ids(),
+                                               definition=self.definition)
+
+    def tear_down(self, i):
+        return f"Refreshed {self.num_refreshed} verdicts"
+
+
+def queue_verdict_refresh(technology_ids):
+    """ Queues the recomputation of the verdicts of the given technologies for all inquiries """
+    # Import here to avoid circular imports
+    from Questionaire.models import QueuedVerdictRefreshTask
+    QueuedVerdictRefreshTask.queue(technology_ids)
+
+
+def refresh_verdicts_on_inquiry_creation(instance, created=False, **kwargs):
+    """ Computes all verdicts of a new inquiry. Connected to the Inquiry signals """
+    if is_enabled() and created:
+        refresh_verdicts([instance.id])
+
+
+def refresh_verdicts_on_score_change(instance, signal, **kwargs):
+    """ Recomputes the verdicts depending on a directly changed Score object. Connected to the Score signals """
+    if is_enabled():
+        # Scores are also deleted when their inquiry is deleted, so no verdicts are created on deletion
+        refresh_verdicts([instance.inquiry_id],
+                         technology_ids=get_technologies_for_declarations([instance.declaration_id]),
+                         create_missing=signal is not post_delete)
+
+
+def refresh_verdicts_on_link_change(instance, **kwargs):
+    """ Queues the recomputation of the verdicts of the technology of a changed TechScoreLink. Connected to the
+    TechScoreLink signals """
+    if is_enabled():
+        definition = get_questionaire_definition()
+        queue_verdict_refresh(_with_tech_groups([instance.technology_id], definition))
+
+
+def refresh_verdicts_on_declaration_change(instance, **kwargs):
+    """ Queues the recomputation of the verdicts depending on a changed start value. Connected to the
+    ScoringDeclaration signals """
+    if is_enabled() and not kwargs.get('created', False):
+        queue_verdict_refresh(get_technologies_for_declarations([instance.id]))
+
+
+def refresh_verdicts_on_technology_change(instance, created=False, **kwargs):
+    """ Queues the computation of the verdicts of a new technology. Connected to the Technology signals """
+    if is_enabled() and created:
+        queue_verdict_refresh([instance.id])
+
+
+def refresh_verdicts_on_tech_group_change(instance, action, reverse, pk_set=None, **kwargs):
+    """ Queues the recomputation of the verdicts of tech groups whose sub technologies changed. Connected to the
+    m2m_changed signal of TechGroup.sub_technologies """
+    if not is_enabled() or action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # The instance is the technology, pk_set contains the tech groups. After a clear, the cleared groups are
+        # unknown, so all groups are recomputed
+        if pk_set is None:
+            # Import here to avoid circular imports
+            from Questionaire.models import TechGroup
+            pk_set = TechGroup.objects.values_list('id', flat=True)
+        tech_group_ids = pk_set
+    else:
+        tech_group_ids = [instance.id]
+    queue_verdict_refresh(tech_group_ids)
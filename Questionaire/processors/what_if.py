@@ -0,0 +1,103 @@
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.processors.question_processors import get_answer_option_definition
+from Questionaire.processors.rescoring import get_option_adjustments
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
+
+""" This file contains code that evaluates hypothetical answers without creating inquiries
+
+The answers are resolved to their answer options, the adjustments of those options are added to the start values of
+the ScoringDeclarations and the technology results are computed from the resulting scores. Everything is taken from
+the questionaire definition, so no queries are made.
+"""
+
+__all__ = ['WhatIfResult', 'WhatIfEvaluator']
+
+
+class WhatIfResult:
+    """ The outcome of a set of hypothetical answers
+
+    :param scores: A dictionary {declaration_id: score} of all ScoringDeclarations
+    :param verdicts: A dictionary {technology_id: state} of all technologies, states as in Technology.TECH_...
+    :param selected_options: A dictionary {question_name: AnswerOptionDefinition} of the answered questions
+    """
+    __slots__ = ('scores', 'verdicts', 'selected_options')
+
+    def __init__(self, scores, verdicts, selected_options):
+        self.scores = scores
+        self.verdicts = verdicts
+        self.selected_options = selected_options
+
+
+class WhatIfEvaluator:
+    """ Computes the scores and technology results for hypothetical answers
+
+    Answers are given as a dictionary {question_name: answer} with answers in the format of the question fields, e.g.
+    "2" for the answer option with value 2, "True" for yes/no questions and a list of values for multiple choice
+    questions. All given answers are processed, regardless of the page requirements of the pages they are on.
+
+    :param definition: The QuestionaireDefinition to use, defaults to the current definition
+    """
+
+    def __init__(self, definition=None):
+        self.definition = definition or get_questionaire_definition()
+        self._option_adjustments = get_option_adjustments(self.definition)
+        # Caches of resolved answer options and of the outcome per combination of selected answer options, answer
+        # sets in a batch often share answers and many answers select the same option
+        self._resolved_options = {}
+        self._outcomes = {}
+
+    def _get_answer_option(self, question_name, answer_value):
+        """ Returns the AnswerOptionDefinition selected by the given answer on the given question """
+        cache_key = (question_name, tuple(answer_value) if isinstance(answer_value, list) else answer_value)
+        try:
+            return self._resolved_options[cache_key]
+        except KeyError:
+            pass
+
+        question = self.definition.questions_by_name.get(question_name, None)
+        if question is None:
+            raise ValueError(f"There is no question with name '{question_name}'")
+
+        answer_option = get_answer_option_definition(question, answer_value)
+        self._resolved_options[cache_key] = answer_option
+        return answer_option
+
+    def evaluate(self, answers):
+        """ Evaluates a single set of hypothetical answers
+        :param answers: A dictionary {question_name: answer}
+        :return: A WhatIfResult
+        """
+        selected_options = {}
+        for question_name, answer_value in answers.items():
+            answer_option = self._get_answer_option(question_name, answer_value)
+            if answer_option is not None:
+                selected_options[question_name] = answer_option
+
+        scores, verdicts = self._get_outcome(frozenset(option.id for option in selected_options.values()))
+        return WhatIfResult(dict(scores), dict(verdicts), selected_options)
+
+    def _get_outcome(self, answer_option_ids):
+        """ Returns the scores and technology results for the given combination of selected answer options """
+        try:
+            return self._outcomes[answer_option_ids]
+        except KeyError:
+            pass
+
+        scores = dict(self.definition.declaration_start_values)
+        for answer_option_id in answer_option_ids:
+            for declaration_id, adjustment in self._option_adjustments.get(answer_option_id, {}).items():
+                scores[declaration_id] += adjustment
+
+        resolver = TechScoreResolver(None, scores=scores, definition=self.definition)
+        verdicts = {technology_id: resolver.get_score_by_id(technology_id)
+                    for technology_id in self.definition.technology_ids}
+
+        self._outcomes[answer_option_ids] = (scores, verdicts)
+        return scores, verdicts
+
+    def evaluate_many(self, answer_sets):
+        """ Evaluates a batch of hypothetical answer sets
+        :param answer_sets: An iterable of dictionaries {question_name: answer}
+        :return: A list of WhatIfResults in the order of the given answer sets
+        """
+        return [self.evaluate(answers) for answers in answer_sets]
@@ -0,0 +1,6 @@
+from django.dispatch import Signal
+
+""" This file contains the signals sent by the questionaire """
+
+# Sent when an inquirer completes the questionaire, after the inquiry has been stored as complete
+inquiry_completed = Signal(providing_args=['inquiry'])
@@ -1,18 +1,19 @@
 from django import template
-from Questionaire.models import Score, AnswerScoringNote, Technology, Inquirer
+from Questionaire.models import Score, AnswerScoringNote, Technology
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
+from Questionaire.processors.replace_text_from_database import InquiryTextValues
+from Questionaire.processors.result_fragments import get_or_render_fragment
+from Questionaire.utils import get_inquirer
 
 register = template.Library()
 
 
 @register.filter
 def get_logged_in_inquirer_code(request):
-    try:
-        inquirer_id = request.session.get('inquirer_id', None)
-        if inquirer_id:
-            inquirer = Inquirer.objects.get(id=inquirer_id)
-            return inquirer.get_inquiry_code()
-    except Inquirer.DoesNotExist:
-        return ''
+    inquirer = get_inquirer(request)
+    if inquirer is not None:
+        return inquirer.get_inquiry_code()
+    return ''
 
 
 @register.filter
@@ -37,7 +38,7 @@ def get_tech_score(technology, inquiry):
     if technology_as_tech_group:
         technology = technology_as_tech_group
 
-    return technology.get_score(inquiry=inquiry)
+    return TechScoreResolver.for_inquiry(inquiry).get_score(technology)
 
 
 @register.filter
@@ -48,9 +49,13 @@ def get_tech_scores(technology, inquiry):
     :param inquiry:
     :return: A queryobject of filtered scores
     """
-    return Score.objects.filter(
+    scores = list(Score.objects.filter(
         inquiry=inquiry,
-        declaration__in=technology.score_declarations.all())
+        declaration__in=technology.score_declarations.all()))
+    for score in scores:
+        # Share the inquiry instance so data stored on it (e.g. the scoring notes) is shared between the scores
+        score.inquiry = inquiry
+    return scores
 
 
 @register.filter
@@ -61,9 +66,13 @@ def get_as_score(score_link, inquiry):
     :param inquiry:
     :return: A queryobject of filtered scores
     """
-    return Score.objects.filter(
+    score = Score.objects.filter(
         inquiry=inquiry,
-        declaration=score_link.score_declaration)[0]
+        declaration=score_link.score_declaration).first()
+    if score is None:
+        # The score is not tracked yet, display it with its start value
+        score = Score(inquiry=inquiry, declaration=score_link.score_declaration)
+    return score
 
 
 @register.filter
@@ -75,12 +84,33 @@ def get_score_notes(score, technology):
     :return: A queryobject of notes
     """
 
-    return AnswerScoringNote.get_all_notes(technology=technology, inquiry=score.inquiry)
+    return get_technology_notes(technology, score.inquiry)
+
+
+def _get_notes_per_technology(inquiry):
+    """ Returns the notes of all technologies for the inquiry, computed once per inquiry instance """
+    notes = getattr(inquiry, '_scoring_notes', None)
+    if notes is None:
+        notes = AnswerScoringNote.get_notes_per_technology(inquiry)
+        inquiry._scoring_notes = notes
+    return notes
+
+
+@register.filter
+def get_technology_notes(technology, inquiry):
+    """
+    Get the notes that should be displayed for the given technology
+    :param technology: The technology
+    :param inquiry: The inquiry
+    :return: A list of notes
+    """
+    return _get_notes_per_technology(inquiry).get(technology.id, [])
 
 
 @register.filter
 def get_prepped_text(note, inquiry):
-    return note.get_prepped_text(inquiry=inquiry)
+    # All answers and scores of the inquiry are retrieved once for all notes in the template
+    return note.get_prepped_text(inquiry=inquiry, values=InquiryTextValues.for_inquiry(inquiry))
 
 
 @register.filter
@@ -114,3 +144,37 @@ def get_subtech_html_id(subtech, technology):
 def create_sub_tech_accordion_name(technolgy):
     """ I wish this was not neccessary, but I can't get a good function with the add filter, it returns None :S """
     return "sub_accordion_{tech_id}".format(tech_id=technolgy.id)
+
+
+class ResultFragmentNode(template.Node):
+    def __init__(self, nodelist, name, inquiry, technology, extra):
+        self.nodelist = nodelist
+        self.name = name
+        self.inquiry = inquiry
+        self.technology = technology
+        self.extra = extra
+
+    def render(self, context):
+        return get_or_render_fragment(
+            lambda: self.nodelist.render(context),
+            self.name.resolve(context),
+            self.inquiry.resolve(context),
+            self.technology.resolve(context) if self.technology else None,
+            *[value.resolve(context) for value in self.extra]
+        )
+
+
+@register.tag
+def result_fragment(parser, token):
+    """
+    Caches the enclosed content for the inquiry until its answers or scores change
+    Usage: {% result_fragment "name" inquiry [technology [other values the content depends on]] %}
+    ... {% endresult_fragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least a name and an inquiry")
+    nodelist = parser.parse(('endresult_fragment',))
+    parser.delete_first_token()
+    values = [parser.compile_filter(bit) for bit in bits[1:]]
+    return ResultFragmentNode(nodelist, values[0], values[1], values[2] if len(values) > 2 else None, values[3:])
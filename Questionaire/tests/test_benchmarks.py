@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from Questionaire.benchmarks.runner import BenchmarkRunner, compare_benchmark_results, percentile
+from Questionaire.benchmarks.synthetic import SyntheticQuestionaireConfig, build_synthetic_questionaire
+from Questionaire.models import Page, Question, Technology, TechGroup, Inquiry
+
+
+class SyntheticQuestionaireTestCase(TestCase):
+    """ This class tests the synthetic questionaire used in benchmarks """
+
+    def test_build(self):
+        config = SyntheticQuestionaireConfig(num_pages=3, questions_per_page=4, num_technologies=5,
+                                             num_tech_groups=2)
+        build_synthetic_questionaire(config)
+
+        self.assertEqual(Page.objects.count(), 3)
+        self.assertEqual(Question.objects.count(), 12)
+        self.assertEqual(Technology.objects.count(), 7)
+        self.assertEqual(TechGroup.objects.count(), 2)
+
+
+class BenchmarkRunnerTestCase(TestCase):
+    """ This class tests driving synthetic inquirers through the questionaire """
+
+    def setUp(self):
+        build_synthetic_questionaire(SyntheticQuestionaireConfig(num_pages=3, questions_per_page=3,
+                                                                 num_technologies=4, num_tech_groups=1))
+
+    def test_run(self):
+        results = BenchmarkRunner(num_inquirers=2).run()
+
+        self.assertEqual(results['incomplete_inquirers'], 0)
+        self.assertEqual(Inquiry.objects.filter(is_complete=True).count(), 2)
+        for view_name in ['new_query', 'start_query', 'run_query:get', 'run_query:post', 'results_display']:
+            self.assertIn(view_name, results['views'])
+            self.assertEqual(results['views'][view_name]['errors'], 0)
+        self.assertEqual(results['views']['results_display']['requests'], 2)
+        self.assertGreater(results['views']['run_query:post']['queries_max'], 0)
+
+    def test_compare(self):
+        baseline = {'views': {'a': {'p50_ms': 10, 'p90_ms': 20, 'queries_mean': 5}}}
+        current = {'views': {'a': {'p50_ms': 10.5, 'p90_ms': 30, 'queries_mean': 5}}}
+
+        regressions = [(view_name, key) for view_name, key, old, new, is_regression
+                       in compare_benchmark_results(baseline, current, tolerance=0.1) if is_regression]
+        self.assertEqual(regressions, [('a', 'p90_ms')])
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.9), 90)
+        self.assertEqual(percentile(values, 1), 100)
+        self.assertIsNone(percentile([], 0.5))
@@ -1,9 +1,12 @@
 import time
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from Questionaire.models import *
 from . import set_up_questionaire, set_up_inquiry, set_up_questionaire_scoring
 from Questionaire.forms import QuestionPageForm
+from Questionaire.processors import questionaire_definition
 
 
 """ For Forms, we should only test that it can do what it should in the general context of the form
@@ -97,6 +100,46 @@ class QuestionFormTestCase(TestCase):
         self.assertEqual(arb_score.score, 0.5)
         # It is assumed that if this works, and the model base works, that the link works correctly
 
+    def test_form_init_does_not_alter_scores(self):
+        """ Displaying a form should not revert the processed answers on the page """
+        form, inquiry, data = self.set_up_form()
+        form.save(inquiry, save_raw=False)
+        form.forward(inquiry)
+
+        arb_score = Score.objects.get(declaration__name="Arb_score", inquiry=inquiry)
+        self.assertEqual(arb_score.score, 3.5)
+
+        # Display the page again
+        QuestionPageForm(page=form.page, inquiry=inquiry)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 3.5)
+        self.assertTrue(InquiryQuestionAnswer.objects.get(inquiry=inquiry, question__name='IntQ1').processed)
+
+    def test_resubmit_processes_difference(self):
+        """ Resubmitting a processed page only adjusts the scores with the difference between the answers """
+        form, inquiry, data = self.set_up_form()
+        form.save(inquiry, save_raw=False)
+        form.forward(inquiry)
+        arb_score = Score.objects.get(declaration__name="Arb_score", inquiry=inquiry)
+
+        # Resubmit with the same answers, nothing should change
+        form, inquiry, data = self.set_up_form(inquiry=inquiry, data=data)
+        form.save(inquiry, save_raw=False)
+        form.forward(inquiry)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 3.5)
+
+        # Resubmit with an answer that does not adjust the score
+        data['IntQ1'] = 12
+        form, inquiry, data = self.set_up_form(inquiry=inquiry, data=data)
+        form.save(inquiry, save_raw=False)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 0.5)
+        form.forward(inquiry)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 0.5)
+        self.assertTrue(InquiryQuestionAnswer.objects.get(inquiry=inquiry, question__name='IntQ1').processed)
+
     def test_form_ignore_saving(self):
         """ Tests whether an ignored question is indeed ignored"""
         data = {
@@ -124,4 +167,35 @@ class QuestionFormTestCase(TestCase):
         """ Asserts that the last visited in the query is saved """
         time_sample = inquiry.last_visited
         inquiry.refresh_from_db()
-        self.assertNotEqual(inquiry.last_visited.timestamp(), time_sample.timestamp())
\ No newline at end of file
+        self.assertNotEqual(inquiry.last_visited.timestamp(), time_sample.timestamp())
+
+    def test_query_count_independent_of_question_count(self):
+        """ Answers and external sources are prefetched, so the number of queries does not grow with the questions """
+        def count_queries(page, inquiry, data):
+            questionaire_definition.get_questionaire_definition()
+            questionaire_definition.start_request()
+            try:
+                with CaptureQueriesContext(connection) as context:
+                    form = QuestionPageForm(data=data, page=page, inquiry=inquiry)
+                    form.save(inquiry)
+                    form.forward(inquiry)
+                    form.backward(inquiry)
+            finally:
+                questionaire_definition.finish_request()
+            return len(context.captured_queries)
+
+        page = Page.objects.order_by('position')[1]
+        inquiry = set_up_inquiry()
+        base_count = count_queries(page, inquiry, {'IntQ1': 402, 'ChoiceQ1': 21})
+
+        # Add more questions to the page
+        data = {'IntQ1': 402, 'ChoiceQ1': 21}
+        for i in range(5):
+            question = Question.objects.create(name=f"ExtraQ{i}", description="Extra question",
+                                               question_text="Extra question", question_type=Question.TYPE_INT)
+            AnswerOption.objects.create(question=question, answer="0", value=1)
+            PageEntryQuestion.objects.create(question=question, page=page, position=20 + i)
+            data[question.name] = 5
+
+        inquiry = set_up_inquiry()
+        self.assertEqual(count_queries(page, inquiry, data), base_count)
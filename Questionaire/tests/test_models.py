@@ -1,7 +1,11 @@
+from unittest import mock
+
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from Questionaire.models import *
+from Questionaire.processors import questionaire_definition, technology_verdicts
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
 from . import set_up_questionaire, set_up_inquiry, set_up_questionaire_scoring
 
 
@@ -202,6 +206,24 @@ class QuestionProcessingTestCase(TestCase):
         answer_obj.get_answer_option(update_on_obj=True)
         self.assertIsNone(answer_obj.processed_answer)
 
+    def test_option_retrieval_without_queries(self):
+        """ Tests that answer options are resolved from the questionaire definition without querying """
+        inquiry = set_up_inquiry()
+        int_answer = InquiryQuestionAnswer(question=Question.objects.get(name="IntQ1"), inquiry=inquiry)
+        choice_answer = InquiryQuestionAnswer(question=Question.objects.get(name="ChoiceQ1"), inquiry=inquiry)
+        int_answer.answer = "180"
+        choice_answer.answer = "21"
+        get_questionaire_definition()
+
+        questionaire_definition.start_request()
+        try:
+            with self.assertNumQueries(1):
+                # The only query verifies the version of the definition
+                self.assertEqual(int_answer.get_answer_option().answer, '150')
+                self.assertEqual(choice_answer.get_answer_option().answer, 'A')
+        finally:
+            questionaire_definition.finish_request()
+
     def test_start_scores(self):
         """ Tests if the processing of forward and backward of an answer option has the expected results on the scores
         Also check Technology processing, but not TechGroup processing
@@ -306,6 +328,87 @@ class QuestionProcessingTestCase(TestCase):
         self.assertEqual(iqa_returned.answer, 173)
         self.assertIsNotNone(iqa_returned.processed_answer)
 
+    def test_question_reanswering_processed(self):
+        """ Changing a processed answer adjusts the scores with the difference between both answers """
+        question = Question.objects.get(name="IntQ1")
+        inquiry = set_up_inquiry()
+
+        iqa = question.answer_for_inquiry(inquiry, 400, process=True)
+        iqa.forward()
+        arb_score = Score.objects.get(declaration__name="Arb_score", inquiry=inquiry)
+        self.assertEqual(arb_score.score, 3.5)
+
+        # Change to an answer without scoring
+        iqa = question.answer_for_inquiry(inquiry, 60, process=True)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 0.5)
+        self.assertTrue(iqa.processed)
+
+        # Change back
+        iqa = question.answer_for_inquiry(inquiry, 500, process=True)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 3.5)
+
+        # An answer without answer option can not be processed
+        iqa = question.answer_for_inquiry(inquiry, 1, process=True)
+        arb_score.refresh_from_db()
+        self.assertEqual(arb_score.score, 0.5)
+        self.assertFalse(iqa.processed)
+
+
+class InquiryResetTestCase(TestCase):
+    """ This class tests resetting inquiries """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+
+    def set_up_answered_inquiry(self):
+        inquiry = set_up_inquiry()
+        Question.objects.get(name="IntQ1").answer_for_inquiry(inquiry, 400).forward()
+        Question.objects.get(name="DoubleQ1").answer_for_inquiry(inquiry, 0.5).forward()
+        inquiry.complete()
+        return inquiry
+
+    def assertInquiryReset(self, inquiry):
+        inquiry.refresh_from_db()
+        self.assertFalse(inquiry.is_complete)
+        self.assertEqual(inquiry.current_page, Page.objects.order_by('position').first())
+        self.assertFalse(inquiry.score_set.exists())
+        self.assertFalse(inquiry.scoreevent_set.exists())
+        self.assertFalse(inquiry.inquiryquestionanswer_set.filter(processed=True).exists())
+        self.assertFalse(inquiry.inquiryquestionanswer_set.filter(processed_answer__isnull=False).exists())
+        # Answers are maintained
+        self.assertEqual(inquiry.inquiryquestionanswer_set.count(), 2)
+
+    def test_reset(self):
+        inquiry = self.set_up_answered_inquiry()
+        inquiry.reset()
+        self.assertFalse(inquiry.is_complete)
+        self.assertInquiryReset(inquiry)
+
+    def test_bulk_reset(self):
+        inquiries = [self.set_up_answered_inquiry() for i in range(3)]
+        untouched_inquiry = self.set_up_answered_inquiry()
+
+        # The number of queries does not depend on the number of inquiries or answers
+        with self.assertNumQueries(8):
+            Inquiry.reset_inquiries([inquiry.id for inquiry in inquiries])
+
+        for inquiry in inquiries:
+            self.assertInquiryReset(inquiry)
+        self.assertTrue(untouched_inquiry.score_set.exists())
+        self.assertTrue(untouched_inquiry.inquiryquestionanswer_set.filter(processed=True).exists())
+
+    @override_settings(TECHNOLOGY_VERDICT_STORAGE=True)
+    def test_reset_rolled_back(self):
+        """ Inquiries are not reset when their verdicts can not be refreshed """
+        inquiry = self.set_up_answered_inquiry()
+        with mock.patch.object(technology_verdicts, 'refresh_all_verdicts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                Inquiry.reset_inquiries([inquiry.id])
+        self.assertTrue(inquiry.score_set.exists())
+
 
 class TechScoreNoteTestCase(TestCase):
 
@@ -446,3 +549,26 @@ class TechScoreNoteTestCase(TestCase):
 
         # 1 external (different technology)
         self.assertEqual(1, len(AnswerScoringNote.get_all_notes(self.technology_2, inquiry)))
+        # The notes are returned as a queryset
+        self.assertEqual(1, AnswerScoringNote.get_all_notes(self.technology_2, inquiry).count())
+
+    def test_notes_per_technology(self):
+        """ Tests that the notes of all technologies are computed at once in a fixed number of queries """
+        inquiry = set_up_inquiry()
+        InquiryQuestionAnswer.objects.create(inquiry=inquiry,
+                                             question=self.answer_option.question,
+                                             answer="x",
+                                             processed_answer=self.answer_option,
+                                             processed=True)
+        InquiryQuestionAnswer.objects.create(inquiry=inquiry,
+                                             question=self.other_answer_option.question,
+                                             answer="x",
+                                             processed_answer=self.other_answer_option,
+                                             processed=True)
+
+        with self.assertNumQueries(4):
+            notes = AnswerScoringNote.get_notes_per_technology(inquiry)
+
+        self.assertEqual(len(notes[self.technology_1.id]), 4)
+        self.assertEqual(len(notes[self.technology_2.id]), 1)
+        self.assertEqual([note.text for note in notes[self.technology_2.id]], ["B"])
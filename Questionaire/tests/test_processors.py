@@ -1,9 +1,28 @@
 import math
-from django.test import TestCase
-
-from Questionaire.processors.code_translation import IdEncoder
-from Questionaire.processors.replace_text_from_database import format_from_database
-from Questionaire.models import Score, ScoringDeclaration, InquiryQuestionAnswer, Question
+from decimal import Decimal
+from importlib import import_module
+from unittest import mock
+from django.apps import apps
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+
+from Questionaire.processors.code_translation import IdEncoder, inquiry_6encoder
+from Questionaire.processors.replace_text_from_database import format_from_database, compile_text, \
+    InquiryTextValues
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
+from Questionaire.processors.navigation import NavigationPlanner
+from Questionaire.processors.rescoring import rescore_inquiries
+from Questionaire.processors.score_processing import ScoreChanges
+from Questionaire.processors.what_if import WhatIfEvaluator
+from Questionaire.processors.technology_verdicts import refresh_all_verdicts
+from Questionaire.processors.score_vectors import get_inquiry_scores, refresh_score_vectors
+from Questionaire.processors.score_events import take_snapshots, prune_score_events, replay_scores, \
+    find_score_drift, repair_score_drift
+from Questionaire.processors import questionaire_definition
+from Questionaire.processors.questionaire_definition import get_questionaire_definition
+from Questionaire.models import Score, ScoringDeclaration, InquiryQuestionAnswer, Question, Technology, TechGroup, \
+    AnswerOption, AnswerScoring, Page, PageRequirement, DefinitionVersion, ScoreVector, \
+    ScoreEvent, ScoreSnapshot, Inquirer, TechScoreLink, TechnologyVerdict, QueuedVerdictRefreshTask
 
 from . import set_up_questionaire, set_up_questionaire_scoring, set_up_inquiry
 
@@ -35,6 +54,30 @@ class CodeTestCase(TestCase):
                 value=value, res_value=res_value, code=code)
             self.assertEqual(res_value, value, error_message)
 
+    def test_codes_unchanged(self):
+        """ Codes are handed out to inquirers, so the translation may never change """
+        ids = [1, 22, 176, 45789123]
+        codes = ['QHWMSP', 'HKPPXP', 'HWPHXY', 'GXJFTB']
+        self.assertEqual(inquiry_6encoder.encode_many(ids), codes)
+        self.assertEqual(inquiry_6encoder.decode_many(codes), ids)
+
+    def test_invalid_codes(self):
+        with self.assertRaises(ValueError):
+            inquiry_6encoder.get_id_from_code('QHWMSA')
+        with self.assertRaises(ValueError):
+            inquiry_6encoder.get_id_from_code('QHWMS')
+        with self.assertRaises(ValueError):
+            inquiry_6encoder.decode_many(['QHWMSP', 'QHWMSPP'])
+
+    def test_inquirers_from_codes(self):
+        inquirers = [Inquirer.objects.create() for i in range(3)]
+        codes = [inquirer.get_inquiry_code() for inquirer in inquirers]
+        unknown_code = inquiry_6encoder.get_code_from_id(inquirers[-1].id + 1)
+
+        with self.assertNumQueries(1):
+            result = Inquirer.get_inquiry_models_from_codes(codes + [unknown_code])
+        self.assertEqual(result, dict(zip(codes, inquirers)))
+
 
 class TextFormattingFromDbTestCase(TestCase):
     """ This class tests autoformatting of text with values from the database """
@@ -168,3 +211,575 @@ class TextFormattingFromDbTestCase(TestCase):
         test_message = format_from_database(message, inquiry=inquiry)
         correct_message = message.replace('{'+q_name+'}', "5612")
         self.assertEqual(test_message, correct_message)
+
+    def test_compiled_text(self):
+        """ Tests that texts are parsed once and record the values they require """
+        message = "Answer {q_OpenQ1}, code {q_ChoiceQ1__code}, postcode {q_Postcode__regex=[0-9]/{4/}} " \
+                  "and score {v_tech_1_score}"
+        compiled_text = compile_text(message)
+        self.assertIs(compile_text(message), compiled_text)
+        self.assertEqual(compiled_text.question_names, {"OpenQ1", "ChoiceQ1", "Postcode"})
+        self.assertEqual(compiled_text.declaration_names, {"tech_1_score"})
+
+    def test_batched_values(self):
+        """ Tests that all values for multiple texts are retrieved in a constant number of queries """
+        inquiry = set_up_inquiry()
+        Score.objects.create(inquiry=inquiry, declaration=ScoringDeclaration.objects.get(name="tech_1_score"),
+                             score=42)
+        InquiryQuestionAnswer.objects.create(question=Question.objects.get(name="OpenQ1"), inquiry=inquiry,
+                                             answer="An_answer")
+        messages = ["Score {v_tech_1_score}", "Answer {q_OpenQ1}", "Both {q_OpenQ1} {v_tech_1_score}"]
+
+        with self.assertNumQueries(2):
+            values = InquiryTextValues(inquiry)
+            results = [format_from_database(message, inquiry=inquiry, values=values) for message in messages]
+
+        self.assertEqual(results, [format_from_database(message, inquiry=inquiry) for message in messages])
+        self.assertEqual(results[2], "Both An_answer 42.00")
+
+
+class TechScoreResolverTestCase(TestCase):
+    """ This class tests the batched computation of technology results """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+
+        self.tech_group = TechGroup.objects.create(name="Tech_group")
+        self.tech_group.sub_technologies.add(*Technology.objects.filter(name__in=["Tech_1", "Tech_2", "Tech_3"]))
+
+    def assertResolverMatchesModels(self, inquiry):
+        resolver = TechScoreResolver(inquiry)
+        for technology in Technology.objects.filter(techgroup__isnull=True):
+            self.assertEqual(resolver.get_score(technology), technology.get_score(inquiry))
+        self.assertEqual(resolver.get_score(self.tech_group), self.tech_group.get_score(inquiry))
+
+    def test_resolver_results(self):
+        """ Tests that the resolver results are identical to the results of the model methods """
+        inquiry = set_up_inquiry()
+        resolver = TechScoreResolver(inquiry)
+        self.assertEqual(resolver.get_score(Technology.objects.get(name="Tech_1")), Technology.TECH_UNKNOWN)
+        self.assertEqual(resolver.get_score(Technology.objects.get(name="Tech_2")), Technology.TECH_FAIL)
+        self.assertEqual(resolver.get_score(Technology.objects.get(name="Tech_3")), Technology.TECH_SUCCESS)
+        self.assertEqual(resolver.get_score(self.tech_group), Technology.TECH_VARIES)
+        self.assertResolverMatchesModels(inquiry)
+
+        AnswerOption.objects.get(value=11).forward_for_inquiry(inquiry)
+        self.assertResolverMatchesModels(inquiry)
+
+    def test_resolver_without_inquiry(self):
+        resolver = TechScoreResolver(None)
+        self.assertEqual(resolver.get_score(self.tech_group), Technology.TECH_UNKNOWN)
+        self.assertEqual(resolver.get_score(Technology.objects.get(name="Tech_3")), Technology.TECH_UNKNOWN)
+
+    def test_resolver_does_not_create_scores(self):
+        """ Resolving results only reads scores, untracked scores use the declaration start value """
+        inquiry = set_up_inquiry()
+        TechScoreResolver(inquiry).get_score(self.tech_group)
+        self.assertFalse(Score.objects.filter(inquiry=inquiry).exists())
+
+    def test_query_count(self):
+        """ The number of queries does not depend on the number of technologies """
+        inquiry = set_up_inquiry()
+        technologies = list(Technology.objects.select_related('techgroup'))
+        # Ensure the questionaire definition is compiled
+        get_questionaire_definition()
+
+        # Only the definition version and the scores of the inquiry are queried
+        with self.assertNumQueries(2):
+            techs = TechScoreResolver(inquiry).annotate_technologies(technologies)
+
+        self.assertIsInstance(techs[-1], TechGroup)
+        self.assertEqual(techs[-1].score, Technology.TECH_VARIES)
+
+
+class QuestionaireDefinitionTestCase(TestCase):
+    """ This class tests the compiled questionaire definition """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+
+    def test_definition_content(self):
+        definition = get_questionaire_definition()
+
+        # Pages are ordered on position
+        self.assertEqual([page.position for page in definition.pages], [1, 3, 5, 99])
+        page = definition.get_page(Page.objects.get(position=3).id)
+        self.assertEqual(page.question_ids, [Question.objects.get(name="IntQ1").id,
+                                             Question.objects.get(name="ChoiceQ1").id])
+
+        # Answer options are ordered on value and contain their scorings
+        question = Question.objects.get(name="IntQ1")
+        self.assertEqual([option.value for option in definition.get_answer_options(question.id)],
+                         [11, 12, 13, 14, 15, 16])
+        answer_option = AnswerOption.objects.get(value=11)
+        self.assertEqual(len(definition.get_scorings(answer_option.id)), 3)
+
+        # Models can be retrieved without querying the database
+        with self.assertNumQueries(0):
+            self.assertEqual(definition.get_question(question.id).get_model(), question)
+            self.assertEqual(definition.answer_options_by_id[answer_option.id].get_model().answer, '400')
+
+    def test_step_1_technologies(self):
+        Technology.objects.update(display_in_step_1_list=True)
+        tech_group = TechGroup.objects.create(name="Tech_group", display_in_step_1_list=True)
+        definition = get_questionaire_definition()
+        technologies = definition.get_step_1_technologies()
+        self.assertEqual(technologies, list(Technology.objects.filter(display_in_step_1_list=True)))
+
+        # The technologies are not retrieved again and each call returns new instances
+        with self.assertNumQueries(0):
+            repeated_technologies = definition.get_step_1_technologies()
+            self.assertEqual(repeated_technologies, technologies)
+            self.assertIsNot(repeated_technologies[0], technologies[0])
+            self.assertEqual([technology.get_as_techgroup for technology in technologies],
+                             [tech_group if technology.id == tech_group.id else None for technology in technologies])
+
+    def test_invalidation(self):
+        """ Adjusting the questionaire increments the version and rebuilds the definition """
+        definition = get_questionaire_definition()
+        version = DefinitionVersion.objects.get().version
+        self.assertEqual(definition.version, version)
+        self.assertIs(get_questionaire_definition(), definition)
+
+        answer_option = AnswerOption.objects.get(value=12)
+        AnswerScoring.objects.create(answer_option=answer_option,
+                                     declaration=ScoringDeclaration.objects.get(name="Arb_score"),
+                                     score_change_value=2)
+        self.assertEqual(DefinitionVersion.objects.get().version, version + 1)
+
+        new_definition = get_questionaire_definition()
+        self.assertIsNot(new_definition, definition)
+        self.assertEqual(len(new_definition.get_scorings(answer_option.id)), 1)
+
+    def test_version_from_other_process(self):
+        """ A version change by another process results in a rebuild of the definition """
+        definition = get_questionaire_definition()
+        DefinitionVersion.objects.update(version=definition.version + 5)
+        self.assertEqual(get_questionaire_definition().version, definition.version + 5)
+
+    def test_version_verified_once_per_request(self):
+        get_questionaire_definition()
+        questionaire_definition.start_request()
+        try:
+            with self.assertNumQueries(1):
+                get_questionaire_definition()
+                get_questionaire_definition()
+        finally:
+            questionaire_definition.finish_request()
+
+
+class NavigationPlannerTestCase(TestCase):
+    """ This class tests the batched evaluation of page validity """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.inquiry = set_up_inquiry()
+
+        # Page 3 requires a score that has not been reached, page 5 requires an answered question
+        self.question = Question.objects.get(name="IntQ1")
+        declaration = ScoringDeclaration.objects.create(name="nav_score", score_start_value=1)
+        PageRequirement.objects.create(page=Page.objects.get(position=3),
+                                       score_declaration=declaration,
+                                       threshold=2,
+                                       comparison=1)
+        Page.objects.get(position=5).include_on.add(self.question)
+
+    def assertPlannerMatchesModels(self, planner):
+        for page in Page.objects.all():
+            self.assertEqual(planner.is_page_valid(planner.definition.get_page(page.id)),
+                             page.is_valid_for_inquiry(self.inquiry))
+
+    def test_valid_pages(self):
+        planner = NavigationPlanner(self.inquiry)
+        self.assertEqual([page.position for page in planner.get_valid_pages()], [1, 99])
+        self.assertPlannerMatchesModels(planner)
+
+        InquiryQuestionAnswer.objects.create(inquiry=self.inquiry, question=self.question, answer="50",
+                                             processed=True)
+        planner = NavigationPlanner(self.inquiry)
+        self.assertEqual([page.position for page in planner.get_valid_pages()], [1, 5, 99])
+        self.assertPlannerMatchesModels(planner)
+
+    def test_skipping_pages(self):
+        planner = NavigationPlanner(self.inquiry)
+        self.assertEqual(planner.get_next_page(1).position, 99)
+        self.assertEqual(planner.get_previous_page(99).position, 1)
+        self.assertIsNone(planner.get_previous_page(1))
+        self.assertIsNone(planner.get_next_page(99))
+        self.assertEqual(planner.get_next_page(1, inclusive=True).position, 1)
+        self.assertEqual(planner.get_progress(99), (1, 2))
+        self.assertEqual(planner.get_progress(3), (1, 3))
+
+    def test_query_count(self):
+        get_questionaire_definition()
+        with self.assertNumQueries(3):
+            # Definition version, scores and processed questions
+            planner = NavigationPlanner(self.inquiry)
+            planner.get_valid_pages()
+            planner.get_next_page(1)
+            planner.get_previous_page(99)
+
+
+class RescoringTestCase(TestCase):
+    """ This class tests the recomputation of scores after the scoring configuration changes """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.inquiry = set_up_inquiry()
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiry, 400).forward()
+        Question.objects.get(name="DoubleQ1").answer_for_inquiry(self.inquiry, 0.5).forward()
+
+    def get_scores(self):
+        return {score.declaration.name: score.score for score in Score.objects.filter(inquiry=self.inquiry)}
+
+    def test_unchanged_configuration(self):
+        scores = self.get_scores()
+        self.assertEqual(scores, {'tech_1_score': Decimal('2.5'), 'tech_2_score': 6, 'Arb_score': Decimal('3.5')})
+        self.assertEqual(rescore_inquiries(), [])
+        self.assertEqual(self.get_scores(), scores)
+
+    def test_rescoring(self):
+        AnswerScoring.objects.filter(declaration__name="tech_1_score").update(score_change_value=5)
+        ScoringDeclaration.objects.filter(name="tech_2_score").update(score_start_value=10)
+        # Adjust the definition as update() does not send signals
+        questionaire_definition.invalidate_questionaire_definition()
+
+        # A dry run does not adjust any scores
+        differences = rescore_inquiries(dry_run=True)
+        self.assertEqual(len(differences), 2)
+        self.assertEqual(self.get_scores(),
+                         {'tech_1_score': Decimal('2.5'), 'tech_2_score': 6, 'Arb_score': Decimal('3.5')})
+
+        rescore_inquiries(chunk_size=1)
+        self.assertEqual(self.get_scores(),
+                         {'tech_1_score': Decimal('10.5'), 'tech_2_score': 12, 'Arb_score': Decimal('3.5')})
+
+    def test_untracked_and_unadjusted_scores(self):
+        # A score that is no longer adjusted by any answer returns to the start value
+        AnswerScoring.objects.filter(declaration__name="Arb_score").delete()
+        # A score that is not yet tracked is created
+        Score.objects.filter(declaration__name="tech_1_score").delete()
+
+        rescore_inquiries()
+        self.assertEqual(self.get_scores(),
+                         {'tech_1_score': Decimal('2.5'), 'tech_2_score': 6, 'Arb_score': Decimal('0.5')})
+
+
+@override_settings(SCORE_VECTOR_STORAGE=True)
+class ScoreVectorTestCase(TestCase):
+    """ This class tests the compact storage of all scores of an inquiry """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.inquiry = set_up_inquiry()
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiry, 400).forward()
+
+    def get_row_scores(self):
+        return dict(Score.objects.filter(inquiry=self.inquiry).values_list('declaration_id', 'score'))
+
+    def test_vector_matches_scores(self):
+        # The vector is refreshed when scores are adjusted
+        self.assertTrue(ScoreVector.objects.filter(inquiry=self.inquiry).exists())
+        self.assertEqual(get_inquiry_scores(self.inquiry), self.get_row_scores())
+
+        Question.objects.get(name="DoubleQ1").answer_for_inquiry(self.inquiry, 0.5).forward()
+        self.assertEqual(get_inquiry_scores(self.inquiry), self.get_row_scores())
+
+    def test_single_row_fetch(self):
+        get_inquiry_scores(self.inquiry)
+        questionaire_definition.start_request()
+        try:
+            # Definition version and the vector itself
+            with self.assertNumQueries(2):
+                get_inquiry_scores(self.inquiry)
+        finally:
+            questionaire_definition.finish_request()
+
+    def test_direct_score_changes(self):
+        """ Direct changes on Score objects discard the vector, the scores are then read without writing """
+        score = Score.objects.filter(inquiry=self.inquiry).first()
+        score.score = 42
+        score.save()
+        self.assertFalse(ScoreVector.objects.filter(inquiry=self.inquiry).exists())
+        self.assertEqual(get_inquiry_scores(self.inquiry)[score.declaration_id], 42)
+        self.assertFalse(ScoreVector.objects.filter(inquiry=self.inquiry).exists())
+
+        refresh_score_vectors()
+        self.assertTrue(ScoreVector.objects.filter(inquiry=self.inquiry).exists())
+        self.assertEqual(get_inquiry_scores(self.inquiry)[score.declaration_id], 42)
+
+    def test_layout_change(self):
+        """ Adding a declaration changes the layout, outdated vectors are ignored until they are rebuilt """
+        layout = ScoreVector.objects.get(inquiry=self.inquiry).layout
+        ScoringDeclaration.objects.create(name="new_score")
+        self.assertEqual(get_inquiry_scores(self.inquiry), self.get_row_scores())
+        self.assertEqual(ScoreVector.objects.get(inquiry=self.inquiry).layout, layout)
+
+        refresh_score_vectors()
+        self.assertNotEqual(ScoreVector.objects.get(inquiry=self.inquiry).layout, layout)
+        self.assertEqual(get_inquiry_scores(self.inquiry), self.get_row_scores())
+
+
+class ScoreEventTestCase(TestCase):
+    """ This class tests the score event log and its replay """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.inquiry = set_up_inquiry()
+        self.question = Question.objects.get(name="IntQ1")
+        self.question.answer_for_inquiry(self.inquiry, 400).forward()
+
+    def get_row_scores(self):
+        return dict(Score.objects.filter(inquiry=self.inquiry).values_list('declaration_id', 'score'))
+
+    def test_events_logged(self):
+        # Answer option 400 adjusts 3 declarations
+        self.assertEqual(ScoreEvent.objects.filter(inquiry=self.inquiry).count(), 3)
+        # Changing the answer logs the net difference only
+        self.question.answer_for_inquiry(self.inquiry, 60)
+        self.assertEqual(ScoreEvent.objects.filter(inquiry=self.inquiry).count(), 6)
+
+    def test_replay(self):
+        self.question.answer_for_inquiry(self.inquiry, 60)
+        self.question.answer_for_inquiry(self.inquiry, 400)
+        self.assertEqual(replay_scores([self.inquiry.id])[self.inquiry.id], self.get_row_scores())
+        self.assertEqual(find_score_drift(), [])
+
+    def test_replay_from_snapshot(self):
+        self.assertEqual(take_snapshots([self.inquiry.id]), 1)
+        # Older events are no longer needed
+        ScoreEvent.objects.all().delete()
+        self.question.answer_for_inquiry(self.inquiry, 60)
+        self.assertEqual(replay_scores([self.inquiry.id])[self.inquiry.id], self.get_row_scores())
+
+    def test_snapshot_min_events(self):
+        self.assertEqual(take_snapshots([self.inquiry.id], min_events=4), 0)
+        self.assertEqual(take_snapshots([self.inquiry.id], min_events=3), 1)
+        self.assertEqual(take_snapshots([self.inquiry.id], min_events=1), 0)
+        self.assertEqual(ScoreSnapshot.objects.count(), 1)
+
+    def test_drift_repair(self):
+        scores = self.get_row_scores()
+        score = Score.objects.filter(inquiry=self.inquiry).first()
+        score.score += 5
+        score.save()
+
+        drift = find_score_drift()
+        self.assertEqual(len(drift), 1)
+        self.assertEqual(drift[0].declaration_id, score.declaration_id)
+
+        repair_score_drift()
+        self.assertEqual(self.get_row_scores(), scores)
+        self.assertEqual(find_score_drift(), [])
+
+    def test_prune_events(self):
+        take_snapshots([self.inquiry.id])
+        self.question.answer_for_inquiry(self.inquiry, 60)
+        take_snapshots([self.inquiry.id])
+        self.question.answer_for_inquiry(self.inquiry, 400)
+
+        self.assertEqual(prune_score_events([self.inquiry.id]), 6)
+        self.assertEqual(ScoreEvent.objects.filter(inquiry=self.inquiry).count(), 3)
+        self.assertEqual(ScoreSnapshot.objects.filter(inquiry=self.inquiry).count(), 1)
+        self.assertEqual(replay_scores([self.inquiry.id])[self.inquiry.id], self.get_row_scores())
+        self.assertEqual(find_score_drift(), [])
+
+    def test_baseline_snapshots(self):
+        """ Inquiries scored before events were logged do not drift """
+        migration = import_module('Questionaire.migrations.0014_scoreevent_scoresnapshot')
+        ScoreEvent.objects.all().delete()
+        migration.create_baseline_snapshots(apps, connection.schema_editor())
+
+        self.assertEqual(replay_scores([self.inquiry.id])[self.inquiry.id], self.get_row_scores())
+        self.assertEqual(find_score_drift(), [])
+
+
+class WhatIfEvaluatorTestCase(TestCase):
+    """ This class tests the evaluation of hypothetical answers """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+
+        self.tech_group = TechGroup.objects.create(name="Tech_group")
+        self.tech_group.sub_technologies.add(*Technology.objects.filter(name__in=["Tech_1", "Tech_2", "Tech_3"]))
+
+    def get_declaration_id(self, name):
+        return ScoringDeclaration.objects.get(name=name).id
+
+    def test_matches_processed_answers(self):
+        """ The hypothetical results are identical to those of an inquiry that processed the same answers """
+        inquiry = set_up_inquiry()
+        Question.objects.get(name="IntQ1").answer_for_inquiry(inquiry, 400).forward()
+        Question.objects.get(name="DoubleQ1").answer_for_inquiry(inquiry, 0.5).forward()
+
+        result = WhatIfEvaluator().evaluate({'IntQ1': 400, 'DoubleQ1': 0.5})
+
+        self.assertEqual(result.scores[self.get_declaration_id('tech_1_score')], Decimal('2.5'))
+        self.assertEqual(result.scores[self.get_declaration_id('tech_2_score')], 6)
+        self.assertEqual(result.scores[self.get_declaration_id('Arb_score')], Decimal('3.5'))
+        for score in Score.objects.filter(inquiry=inquiry):
+            self.assertEqual(result.scores[score.declaration_id], score.score)
+
+        resolver = TechScoreResolver(inquiry)
+        for technology in Technology.objects.select_related('techgroup'):
+            self.assertEqual(result.verdicts[technology.id], resolver.get_score_by_id(technology.id))
+
+        self.assertEqual(set(result.selected_options.keys()), {'IntQ1', 'DoubleQ1'})
+
+    def test_no_database_access(self):
+        """ Evaluating answers does not query or store anything """
+        evaluator = WhatIfEvaluator()
+        choice_question = Question.objects.get(name="ChoiceQ1")
+
+        with self.assertNumQueries(0):
+            results = evaluator.evaluate_many([
+                {'IntQ1': 400},
+                {'IntQ1': 20, 'ChoiceQ1': "22"},
+                {'ChoiceQ1': "", 'DoubleQ1': None},
+            ])
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[1].selected_options['ChoiceQ1'].get_model(),
+                         AnswerOption.objects.get(question=choice_question, value=22))
+        self.assertEqual(results[2].selected_options, {})
+        self.assertEqual(results[2].scores, get_questionaire_definition().declaration_start_values)
+        self.assertFalse(Score.objects.exists())
+
+    def test_unknown_question(self):
+        with self.assertRaises(ValueError):
+            WhatIfEvaluator().evaluate({'NonExistingQ': 1})
+
+
+@override_settings(TECHNOLOGY_VERDICT_STORAGE=True)
+class TechnologyVerdictTestCase(TestCase):
+    """ This class tests the stored technology results of inquiries """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.tech_group = TechGroup.objects.create(name="Tech_group")
+        self.tech_group.sub_technologies.add(*Technology.objects.filter(name__in=["Tech_1", "Tech_2", "Tech_3"]))
+        self.inquiries = [set_up_inquiry() for i in range(2)]
+        refresh_all_verdicts()
+
+    def run_verdict_refresh(self):
+        for task in QueuedVerdictRefreshTask.objects.filter(state=QueuedVerdictRefreshTask.QUEUED):
+            task.activate()
+            self.assertEqual(task.state, QueuedVerdictRefreshTask.SUCCESS)
+
+    def assertVerdictsMatchResolver(self):
+        for inquiry in self.inquiries:
+            resolver = TechScoreResolver(inquiry)
+            verdicts = dict(TechnologyVerdict.objects.filter(inquiry=inquiry).values_list('technology_id', 'verdict'))
+            self.assertEqual(verdicts, {technology.id: resolver.get_score_by_id(technology.id)
+                                        for technology in Technology.objects.all()})
+
+    def test_verdicts_on_answers(self):
+        self.assertVerdictsMatchResolver()
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiries[0], 400).forward()
+        Question.objects.get(name="DoubleQ1").answer_for_inquiry(self.inquiries[1], 0.5).forward()
+        self.assertVerdictsMatchResolver()
+
+        self.inquiries[0].reset()
+        self.assertVerdictsMatchResolver()
+
+    def test_verdicts_on_link_change(self):
+        tech_3 = Technology.objects.get(name="Tech_3")
+        self.assertEqual(set(TechnologyVerdict.get_inquiries(tech_3)), set(self.inquiries))
+
+        link = TechScoreLink.objects.get(technology=tech_3)
+        link.score_threshold_approve = 100
+        link.save()
+        # The verdicts of all inquiries are recomputed in the task queue
+        self.assertTrue(TechnologyVerdict.get_inquiries(tech_3).exists())
+        self.run_verdict_refresh()
+        self.assertVerdictsMatchResolver()
+        self.assertFalse(TechnologyVerdict.get_inquiries(tech_3).exists())
+
+        self.tech_group.sub_technologies.remove(tech_3)
+        self.run_verdict_refresh()
+        self.assertVerdictsMatchResolver()
+
+    def test_queued_refreshes_combined(self):
+        # Remove the refreshes queued while setting up
+        QueuedVerdictRefreshTask.objects.all().delete()
+        TechScoreLink.objects.get(technology__name="Tech_3").save()
+        TechScoreLink.objects.get(technology__name="Tech_1").save()
+        self.assertEqual(QueuedVerdictRefreshTask.objects.count(), 1)
+        task = QueuedVerdictRefreshTask.objects.get()
+        self.assertEqual(task.get_technology_ids(), set(Technology.objects.filter(
+            name__in=["Tech_1", "Tech_3", "Tech_group"]).values_list('id', flat=True)))
+
+    def test_inquiry_deletion(self):
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiries[0], 400).forward()
+        self.inquiries[0].delete()
+        self.assertFalse(TechnologyVerdict.objects.filter(inquiry_id=self.inquiries[0].id).exists())
+        self.inquiries = self.inquiries[1:]
+        self.assertVerdictsMatchResolver()
+
+    def test_verdicts_on_inquiry_creation(self):
+        self.inquiries.append(set_up_inquiry())
+        self.assertVerdictsMatchResolver()
+
+    def test_verdicts_of_inquiry_without_verdicts(self):
+        """ Inquiries created before the verdicts were stored receive all verdicts on their next answer """
+        TechnologyVerdict.objects.filter(inquiry=self.inquiries[0]).delete()
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiries[0], 400).forward()
+        self.assertVerdictsMatchResolver()
+
+
+class ScoreChangesTestCase(TestCase):
+    """ This class tests the application of score adjustments on an inquiry """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.inquiry = set_up_inquiry()
+        self.declarations = {declaration.name: declaration for declaration in ScoringDeclaration.objects.all()}
+        Score.objects.create(inquiry=self.inquiry, declaration=self.declarations['tech_1_score'], score=1)
+        Score.objects.create(inquiry=self.inquiry, declaration=self.declarations['tech_2_score'], score=2)
+
+    def get_scores(self):
+        return {declaration_id: score for declaration_id, score in
+                Score.objects.filter(inquiry=self.inquiry).values_list('declaration_id', 'score')}
+
+    def get_changes(self):
+        return ScoreChanges({
+            self.declarations['tech_1_score'].id: Decimal('1.5'),
+            self.declarations['tech_2_score'].id: Decimal('-3'),
+            self.declarations['Arb_score'].id: Decimal('2'),
+        })
+
+    def test_apply(self):
+        get_questionaire_definition()
+        questionaire_definition.start_request()
+        try:
+            # Log the events, retrieve and update the tracked scores, verify the definition version, create the
+            # untracked scores and mark the results as changed
+            with self.assertNumQueries(6):
+                self.get_changes().apply(self.inquiry)
+        finally:
+            questionaire_definition.finish_request()
+
+        self.assertEqual(self.get_scores(), {
+            self.declarations['tech_1_score'].id: Decimal('2.5'),
+            self.declarations['tech_2_score'].id: Decimal('-1'),
+            self.declarations['Arb_score'].id: self.declarations['Arb_score'].score_start_value + 2,
+        })
+
+    def test_atomic(self):
+        scores = self.get_scores()
+        with mock.patch.object(Score.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.get_changes().apply(self.inquiry)
+
+        self.assertEqual(self.get_scores(), scores)
+        self.assertFalse(ScoreEvent.objects.filter(inquiry=self.inquiry).exists())
@@ -1,3 +1,230 @@
+# Todo: automatic processing
+from unittest import mock
 
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Todo: automatic processing
\ No newline at end of file
+from Questionaire.models import Inquiry, Question, Technology
+from Questionaire.processors.result_fragments import get_fragment_cache
+from Questionaire.utils import get_inquirer, get_inquiry_from_request
+from reports.models import Report, RenderedReport, QueuedReportRenderTask
+from reports.report_plotter import ReportPlotter
+from reports.tests import TemporaryReportRootMixin
+from . import set_up_questionaire, set_up_inquiry, set_up_questionaire_scoring
+
+
+class InquirerResolutionTestCase(TestCase):
+    """ This class tests that the inquirer of the session is retrieved once per request """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        self.inquiry = set_up_inquiry()
+        self.inquirer = self.inquiry.inquirer
+
+    def test_get_inquirer(self):
+        request = RequestFactory().get('/')
+        request.session = {'inquirer_id': self.inquirer.id}
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_inquirer(request), self.inquirer)
+            self.assertEqual(get_inquiry_from_request(request), self.inquiry)
+            self.assertEqual(get_inquiry_from_request(request).current_page, self.inquiry.current_page)
+
+        # A change of inquirer in the session is picked up
+        request.session['inquirer_id'] = None
+        self.assertIsNone(get_inquirer(request))
+        self.assertIsNone(get_inquiry_from_request(None))
+
+    def test_single_retrieval_per_request(self):
+        self.inquiry.complete()
+        session = self.client.session
+        session['inquirer_id'] = self.inquirer.id
+        session.save()
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('results_display'))
+        self.assertEqual(response.status_code, 200)
+
+        inquirer_queries = [query for query in context.captured_queries
+                            if 'FROM "Questionaire_inquirer"' in query['sql']]
+        self.assertEqual(len(inquirer_queries), 1)
+
+
+@override_settings(RESULT_FRAGMENT_CACHING=True)
+class ResultFragmentTestCase(TestCase):
+    """ This class tests that the rendered results are reused until the inquiry results change """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        Technology.objects.update(display_in_step_2_list=True)
+        self.inquiry = set_up_inquiry()
+        self.inquiry.complete()
+        session = self.client.session
+        session['inquirer_id'] = self.inquiry.inquirer.id
+        session.save()
+        get_fragment_cache().clear()
+
+    def get_results(self, url_name):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode(), len(context)
+
+    def test_repeat_visits(self):
+        for url_name in ['results_display', 'results_advised', 'results_not_advised']:
+            content, num_queries = self.get_results(url_name)
+            repeated_content, repeated_num_queries = self.get_results(url_name)
+            self.assertEqual(content, repeated_content)
+            self.assertLessEqual(repeated_num_queries, num_queries)
+
+    def test_repeat_overview_visit(self):
+        """ The technologies are not retrieved and resolved when the overview is read from the cache """
+        self.get_results('results_display')
+        # Retrieve the session, the inquirer, the definition version, the reports and the page urls, and save the
+        # session within a savepoint
+        with self.assertNumQueries(8):
+            self.client.get(reverse('results_display'))
+
+    def test_score_version(self):
+        score_version = Inquiry.objects.get(id=self.inquiry.id).score_version
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiry, 400).forward()
+        self.assertGreater(Inquiry.objects.get(id=self.inquiry.id).score_version, score_version)
+
+        # Saving an outdated instance does not revert the version
+        score_version = Inquiry.objects.get(id=self.inquiry.id).score_version
+        self.inquiry.save()
+        self.assertEqual(Inquiry.objects.get(id=self.inquiry.id).score_version, score_version)
+
+        self.inquiry.reset()
+        self.assertGreater(Inquiry.objects.get(id=self.inquiry.id).score_version, score_version)
+
+    def test_invalidation(self):
+        content, num_queries = self.get_results('results_advised')
+        self.assertIn("Tech_3", content)
+
+        technology = Technology.objects.get(name="Tech_3")
+        technology.short_text = "Renamed technology text"
+        technology.save()
+        content, num_queries = self.get_results('results_advised')
+        self.assertIn("Renamed technology text", content)
+
+        # Adjusting the scores changes the advised technologies
+        self.assertNotIn("Tech_1", content)
+        Question.objects.get(name="IntQ1").answer_for_inquiry(self.inquiry, 400).forward()
+        self.assertIn("Tech_1", self.get_results('results_advised')[0])
+
+
+class QuestionPageTestCase(TestCase):
+    """ This class tests that question pages only query the data of the inquiry itself """
+
+    def setUp(self):
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        Technology.objects.update(display_in_step_1_list=True)
+        self.inquiry = set_up_inquiry()
+        session = self.client.session
+        session['inquirer_id'] = self.inquiry.inquirer.id
+        session['inquiry_id'] = self.inquiry.id
+        session.save()
+
+    def get_question_page(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('run_query'))
+        self.assertEqual(response.status_code, 200)
+        return response, " ".join(query['sql'] for query in context.captured_queries)
+
+    def test_cached_questionaire_structure(self):
+        self.get_question_page()
+        response, queries = self.get_question_page()
+        for table in ['Questionaire_page', 'Questionaire_technology', 'Questionaire_techgroup']:
+            self.assertNotIn(f'FROM "{table}"', queries)
+        self.assertEqual(len(response.context['techs']), 3)
+        self.assertTrue(response.context['has_next_page'])
+
+        # Adjusting a technology updates the list
+        technology = Technology.objects.get(name="Tech_2")
+        technology.display_in_step_1_list = False
+        technology.save()
+        response, queries = self.get_question_page()
+        self.assertEqual([technology.name for technology in response.context['techs']], ["Tech_1", "Tech_3"])
+
+
+def save_dummy_pdf(html_layout, filepath):
+    """ Replaces the PDF creation, which requires wkhtmltopdf """
+    with open(filepath, 'wb') as file:
+        file.write(b'%PDF-1.4')
+
+
+@override_settings(QUEUED_REPORT_RENDERING=True)
+@mock.patch.object(ReportPlotter, 'plot_report_as_html', return_value="<html></html>")
+@mock.patch.object(ReportPlotter, 'save_as_pdf', side_effect=save_dummy_pdf)
+class QueuedReportDownloadTestCase(TemporaryReportRootMixin, TestCase):
+    """ This class tests that reports are rendered in the task queue and served once they are finished """
+    fixtures = ['test_report.json']
+
+    def setUp(self):
+        super(QueuedReportDownloadTestCase, self).setUp()
+        set_up_questionaire()
+        set_up_questionaire_scoring()
+        Report.objects.update(is_live=True)
+        self.report = Report.objects.get(slug='test-basic-report')
+        self.inquiry = set_up_inquiry()
+        session = self.client.session
+        session['inquirer_id'] = self.inquiry.inquirer.id
+        session.save()
+
+    def test_queued_on_completion(self, mock_save, mock_plot):
+        self.inquiry.complete()
+        self.assertEqual(QueuedReportRenderTask.objects.count(), Report.objects.count())
+        task = QueuedReportRenderTask.get_latest(self.report, inquiry=self.inquiry)
+        self.assertEqual(task.state, QueuedReportRenderTask.QUEUED)
+        self.assertIsNone(RenderedReport.get_up_to_date(self.report, inquiry=self.inquiry))
+
+        task.activate()
+        self.assertEqual(task.state, QueuedReportRenderTask.SUCCESS)
+        self.assertEqual(RenderedReport.get_up_to_date(self.report, inquiry=self.inquiry), task.rendered_report)
+
+        # Completing the inquiry again does not queue reports that are already queued
+        QueuedReportRenderTask.queue_for_inquiry(self.inquiry)
+        self.assertEqual(QueuedReportRenderTask.objects.count(), Report.objects.count())
+
+    def test_download(self, mock_save, mock_plot):
+        self.inquiry.complete()
+        download_url = reverse('download_pdf', kwargs={'report_slug': self.report.slug})
+        status_url = reverse('download_pdf_status', kwargs={'report_slug': self.report.slug})
+
+        # The file is not finished, so the waiting page is displayed
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'inquiry/results/report_being_prepared.html')
+        self.assertEqual(QueuedReportRenderTask.objects.filter(rendered_report__report=self.report).count(), 1)
+        self.assertFalse(self.client.get(status_url).json()['ready'])
+
+        QueuedReportRenderTask.get_latest(self.report, inquiry=self.inquiry).activate()
+        status = self.client.get(status_url).json()
+        self.assertTrue(status['ready'])
+        self.assertEqual(status['download_url'], download_url)
+
+        response = self.client.get(download_url)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4')
+        response.close()
+
+    def test_requested_report_rendered_first(self, mock_save, mock_plot):
+        for report in Report.objects.exclude(id=self.report.id):
+            QueuedReportRenderTask.queue(report, inquiry=self.inquiry)
+        self.client.get(reverse('download_pdf', kwargs={'report_slug': self.report.slug}))
+        task = QueuedReportRenderTask.get_latest(self.report, inquiry=self.inquiry)
+        self.assertEqual(task.priority, QueuedReportRenderTask.REQUESTED_PRIORITY)
+
+        with mock.patch('builtins.print'):
+            call_command('run_queued_tasks')
+        task.refresh_from_db()
+        self.assertEqual(task.state, QueuedReportRenderTask.SUCCESS)
+        self.assertFalse(QueuedReportRenderTask.objects.exclude(state=QueuedReportRenderTask.QUEUED).exclude(
+            id=task.id).exists())
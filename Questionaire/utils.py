@@ -1,14 +1,42 @@
+from django.http import Http404
+
 from .models import Inquirer
 
 
+def get_inquirer(request):
+    """ Retrieves the inquirer of the current session
+
+    The inquirer is retrieved once per request together with its active inquiry and its current page. It is
+    retrieved again only when the inquirer in the session changes.
+    :return: The Inquirer or None if there is no (valid) inquirer in the session
+    """
+    if request is None or not hasattr(request, 'session'):
+        return None
+
+    inquirer_id = request.session.get('inquirer_id', None)
+    cached = getattr(request, '_inquirer_cache', None)
+    if cached is None or cached[0] != inquirer_id:
+        inquirer = None
+        if inquirer_id is not None:
+            inquirer = Inquirer.objects.select_related('active_inquiry__current_page').filter(id=inquirer_id).first()
+        cached = (inquirer_id, inquirer)
+        request._inquirer_cache = cached
+
+    return cached[1]
+
+
+def get_inquirer_or_404(request):
+    """ Retrieves the inquirer of the current session, raises Http404 if there is none """
+    inquirer = get_inquirer(request)
+    if inquirer is None:
+        raise Http404("No inquirer is active in this session")
+    return inquirer
+
+
 def get_inquiry_from_request(request):
     """ Retrieves the active inquiry from the request data """
-    if request:
-        try:
-            inquirer_id = request.session.get('inquirer_id', None)
-            if inquirer_id:
-                return Inquirer.objects.get(id=inquirer_id).active_inquiry
-        except Inquirer.DoesNotExist:
-            pass
-
-    return None
\ No newline at end of file
+    inquirer = get_inquirer(request)
+    if inquirer is not None:
+        return inquirer.active_inquiry
+
+    return None
@@ -1,17 +1,24 @@
 from django.views.generic import TemplateView, FormView, RedirectView
 from django.shortcuts import get_object_or_404
-from django.http import HttpResponseRedirect, Http404
+from django.conf import settings
+from django.http import HttpResponseRedirect, Http404, JsonResponse
 from django.urls import reverse, reverse_lazy
+from django.utils.functional import SimpleLazyObject
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
+from django.db import transaction
 
-from .models import Page, Inquiry, Technology, Inquirer
+from .models import Page, Inquiry, Technology
 from .forms import QuestionPageForm, EmailForm, InquirerLoadForm, CreateInquirerForm
+from .processors.tech_score_resolver import TechScoreResolver
+from .processors.questionaire_definition import get_questionaire_definition
+from .processors.navigation import NavigationPlanner
+from .utils import get_inquirer_or_404
 
 from general.views import StepDisplayMixin
 from PageDisplay.views import PageInfoView
-from reports.models import Report
-from reports.responses import StoredOrCreatePDFRespose
+from reports.models import Report, RenderedReport, QueuedReportRenderTask
+from reports.responses import StoredOrCreatePDFRespose, StoredPDFResponse
 from questionaire_mailing.models import TriggeredMailTask
 
 # Create your views here.
@@ -79,7 +86,7 @@ class InquiryStartScreen(FlexCssMixin, FirstStepMixin, FormView):
     @property
     def inquirer(self):
         """ The inquirer using the current view """
-        return get_object_or_404(Inquirer, id=self.request.session.get('inquirer_id', None))
+        return get_inquirer_or_404(self.request)
 
     def get_form_kwargs(self):
         form_kwargs = super(InquiryStartScreen, self).get_form_kwargs()
@@ -146,16 +153,16 @@ class QPageView(FlexCssMixin, FirstStepMixin, FormView):
         self.init_base_keys()
 
         # Check if the page can be processed for the current inquiry
-        # Some pages are blocked based on certain answers
-        if not self.page.is_valid_for_inquiry(self.inquiry):
+        # Some pages are blocked based on certain answers, those are skipped directly to the first valid page
+        if not self.navigation.is_page_valid(self.page_definition):
             # Determine the direction of the movement
-            if self.inquiry.current_page.position < self.page.position:
+            if self.get_current_position() < self.page.position:
                 return HttpResponseRedirect(self.get_redirect(True))
             else:
                 return HttpResponseRedirect(self.get_redirect(False))
 
         # If the page should automatically be processed. This occurs when external data needs to be retrieved
-        if self.page.auto_process and self.inquiry.current_page.position != self.page.position:
+        if self.page.auto_process and self.get_current_position() != self.page.position:
             auto_result = self.autoprocess()
             if auto_result is not None:
                 return auto_result
@@ -164,6 +171,10 @@ class QPageView(FlexCssMixin, FirstStepMixin, FormView):
         self.inquiry.set_current_page(self.page)
         return super().dispatch(request, *args, **kwargs)
 
+    def get_current_position(self):
+        """ Returns the position of the current page of the inquiry """
+        return self.navigation.definition.get_page(self.inquiry.current_page_id).position
+
     def autoprocess(self):
         """ Attempts to autoprocess a form in its entirety even though it is likely a GET request"""
         form = QuestionPageForm(self.request.GET, page=self.page, inquiry=self.inquiry)
@@ -172,7 +183,7 @@ class QPageView(FlexCssMixin, FirstStepMixin, FormView):
             form.save(self.inquiry)
 
             # Determine whether the movement is forward or backward
-            if self.inquiry.current_page.position < self.page.position:
+            if self.get_current_position() < self.page.position:
                 # Movement is forward
                 form.forward(self.inquiry)
                 return HttpResponseRedirect(self.get_redirect(get_next=True))
@@ -187,38 +198,50 @@ class QPageView(FlexCssMixin, FirstStepMixin, FormView):
         context['questionaire_form'] = context['form']
         context['current_question_page'] = self.page
 
-        total_page_count = Page.objects.count()
-        processed_pages = Page.objects.filter(position__lt=self.page.position)
-
-        context['progress_percentage'] = int(processed_pages.count() / total_page_count * 100)
+        # Progress is based on the pages valid for the inquiry at this moment
+        processed_page_count, total_page_count = self.navigation.get_progress(self.page.position)
+        context['progress_percentage'] = int(processed_page_count / total_page_count * 100)
+        context['valid_pages'] = self.navigation.get_valid_pages()
 
-        context['has_prev_page'] = processed_pages.exists()
-        context['has_next_page'] = Page.objects.filter(position__gt=self.page.position).exists()
+        context['has_prev_page'] = self.navigation.get_previous_page(self.page.position) is not None
+        # Pages further on can become valid through the answers on this page, so any further page counts
+        context['has_next_page'] = self.navigation.definition.has_page_after(self.page.position)
 
         context['inquiry'] = self.inquiry
-        context['techs'] = Technology.objects.filter(display_in_step_1_list=True)
+        context['techs'] = self.navigation.definition.get_step_1_technologies()
 
         return context
 
     def init_base_keys(self):
         self.inquiry = get_object_or_404(Inquiry, id=self.request.session.get('inquiry_id', None))
 
-        self.page = Page.objects.filter(id=self.request.session.get('page_id', None)).first()
-        if self.page is None:
-            self.page = self.inquiry.current_page
+        definition = get_questionaire_definition()
+        page_definition = definition.get_page(self.request.session.get('page_id', None))
+        if page_definition is None:
+            page_definition = definition.get_page(self.inquiry.current_page_id)
+
+        self.page_definition = page_definition
+        self.page = page_definition.get_model() if page_definition else None
+        self.navigation = NavigationPlanner(self.inquiry)
 
     def form_valid(self, form):
-        # Form is valid, save it
-        form.save(self.inquiry)
-        if 'prev' not in self.request.POST:
-            form.forward(self.inquiry)
+        # Form is valid, save it. The answers and score adjustments of the page are stored in a single transaction
+        with transaction.atomic():
+            form.save(self.inquiry)
+            if 'prev' in self.request.POST:
+                # Moving backwards, the answers on this page should no longer count
+                form.backward(self.inquiry)
+            else:
+                form.forward(self.inquiry)
         return super(QPageView, self).form_valid(form)
 
     def form_invalid(self, form):
         # Form is invalid, save it only if the movement is backwards
         if 'prev' in self.request.POST:
             # If backwards is pressed, save current state and redirect to previous page
-            form.save(self.inquiry, True)
+            with transaction.atomic():
+                form.save(self.inquiry, True)
+                form.backward(self.inquiry)
             return HttpResponseRedirect(self.get_redirect(False))
 
         return super(QPageView, self).form_invalid(form)
@@ -232,13 +255,17 @@ class QPageView(FlexCssMixin, FirstStepMixin, FormView):
     def get_redirect(self, get_next):
         """ Returns the next page url
 
+        Pages that are not valid for the inquiry are skipped, so the url directly leads to the first valid page
+
         :param get_next: Whether the next page needs to be returned (defaults True)
         :return: The url
         """
+        # Answers can have been processed since the start of the request, so re-evaluate the page validity
+        self.navigation = NavigationPlanner(self.inquiry)
         if get_next:
-            page = Page.objects.filter(position__gt=self.page.position).order_by('position').first()
+            page = self.navigation.get_next_page(self.page.position)
         else:
-            page = Page.objects.filter(position__lt=self.page.position).order_by('position').last()
+            page = self.navigation.get_previous_page(self.page.position)
 
         if page:
             # Set the id to the correct page id
@@ -327,9 +354,7 @@ class LogInInquiry(GetInquirerView):
 class JumpToCurrentView(RedirectView):
 
     def get_redirect_url(self):
-        inquirer = get_object_or_404(Inquirer, id=self.request.session.get('inquirer_id', None))
-
-        return get_continue_url(self.request, inquirer)
+        return get_continue_url(self.request, get_inquirer_or_404(self.request))
 
 
 # ###############################################
@@ -342,7 +367,7 @@ class StepTwoMixin(StepDisplayMixin):
     enable_step_3 = True
 
     def init_base_keys(self):
-        self.inquirer = get_object_or_404(Inquirer, id=self.request.session.get('inquirer_id', None))
+        self.inquirer = get_inquirer_or_404(self.request)
         self.inquiry = self.inquirer.active_inquiry
 
     def dispatch(self, request, *args, **kwargs):
@@ -363,20 +388,26 @@ class QuestionaireCompleteView(StepTwoMixin, BaseTemplateView):
     def get_context_data(self, **kwargs):
         context = super(QuestionaireCompleteView, self).get_context_data(**kwargs)
 
-        context['techs'] = Technology.objects.filter(display_in_step_2_list=True)
+        # The technology lists are only computed when they are displayed, so results that are read from the result
+        # fragment cache do not retrieve and resolve the technologies
+        technology_lists = SimpleLazyObject(self.get_technology_lists)
+        for list_name in ['techs_recommanded', 'techs_discouraged', 'techs_varies', 'techs_unknown']:
+            context[list_name] = SimpleLazyObject(lambda list_name=list_name: technology_lists[list_name])
+
+        context['applicable_reports'] = self.get_applicable_reports()
+
+        return context
 
-        # Create lists of various technology states
+    def get_technology_lists(self):
+        """ Returns the technologies displayed in step 2, divided over lists of the various technology states """
         techs_recommanded = []
         techs_unknown = []
         techs_varies = []
         techs_discouraged = []
 
-        for tech in context['techs']:
-            if hasattr(tech, 'techgroup'):
-                tech = tech.techgroup
-
-            tech_score = tech.get_score(self.inquiry)
-            tech.score = tech_score
+        technologies = Technology.objects.filter(display_in_step_2_list=True).select_related('techgroup')
+        for tech in TechScoreResolver.for_inquiry(self.inquiry).annotate_technologies(technologies):
+            tech_score = tech.score
 
             if tech_score == Technology.TECH_SUCCESS:
                 techs_recommanded.append(tech)
@@ -387,14 +418,12 @@ class QuestionaireCompleteView(StepTwoMixin, BaseTemplateView):
             elif tech_score == Technology.TECH_UNKNOWN:
                 techs_unknown.append(tech)
 
-        context['techs_recommanded'] = techs_recommanded
-        context['techs_discouraged'] = techs_discouraged
-        context['techs_varies'] = techs_varies
-        context['techs_unknown'] = techs_unknown
-
-        context['applicable_reports'] = self.get_applicable_reports()
-
-        return context
+        return {
+            'techs_recommanded': techs_recommanded,
+            'techs_discouraged': techs_discouraged,
+            'techs_varies': techs_varies,
+            'techs_unknown': techs_unknown,
+        }
 
     def get_applicable_reports(self):
         return Report.objects.filter(is_live=True).order_by('display_order')
@@ -408,11 +437,8 @@ class QuestionaireAdvisedView(StepTwoMixin, BaseTemplateView):
 
         techs_recommanded = []
 
-        for tech in Technology.objects.filter(display_in_step_2_list=True):
-            if hasattr(tech, 'techgroup'):
-                tech = tech.techgroup
-
-            tech.score = tech.get_score(self.inquiry)
+        technologies = Technology.objects.filter(display_in_step_2_list=True).select_related('techgroup')
+        for tech in TechScoreResolver.for_inquiry(self.inquiry).annotate_technologies(technologies):
             if tech.score == Technology.TECH_SUCCESS:
                 techs_recommanded.append(tech)
 
@@ -429,11 +455,8 @@ class QuestionaireRejectedView(StepTwoMixin, BaseTemplateView):
 
         techs_discouraged = []
 
-        for tech in Technology.objects.filter(display_in_step_2_list=True):
-            if hasattr(tech, 'techgroup'):
-                tech = tech.techgroup
-
-            tech.score = tech.get_score(self.inquiry)
+        technologies = Technology.objects.filter(display_in_step_2_list=True).select_related('techgroup')
+        for tech in TechScoreResolver.for_inquiry(self.inquiry).annotate_technologies(technologies):
             if tech.score == Technology.TECH_FAIL:
                 techs_discouraged.append(tech)
 
@@ -462,7 +485,10 @@ class ResetQueryView(StepTwoMixin, BaseTemplateView):
 
 
 class DownloadReport(StepTwoMixin, BaseTemplateView):
+    """ Returns the report file. When reports are rendered in the task queue, a page that waits for the file is
+    displayed while it is being rendered """
     download_response_class = StoredOrCreatePDFRespose
+    template_name = "inquiry/results/report_being_prepared.html"
 
     def dispatch(self, request, *args, **kwargs):
         self.report = get_object_or_404(Report, slug=self.kwargs.get('report_slug', None))
@@ -470,10 +496,43 @@ class DownloadReport(StepTwoMixin, BaseTemplateView):
             return Http404("Report kon niet worden gevonden")
         return super(DownloadReport, self).dispatch(request, *args, **kwargs)
 
+    def get_report_inquiry(self):
+        """ Returns the inquiry the report is rendered for, static reports do not use inquiry data """
+        return None if self.report.is_static else self.inquiry
+
     def get(self, request, *args, **kwargs):
         """ Get the report from the database and return it in the related response class """
+        if not settings.QUEUED_REPORT_RENDERING:
+            return self.download_response_class(
+                report=self.report,
+                inquiry=self.inquiry,
+            )
+
+        rendered_report = RenderedReport.get_up_to_date(self.report, inquiry=self.get_report_inquiry())
+        if rendered_report is not None:
+            return StoredPDFResponse(created_report=rendered_report)
 
-        return self.download_response_class(
-            report=self.report,
-            inquiry=self.inquiry,
-        )
+        QueuedReportRenderTask.queue(self.report, inquiry=self.get_report_inquiry(),
+                                     priority=QueuedReportRenderTask.REQUESTED_PRIORITY)
+        return super(DownloadReport, self).get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super(DownloadReport, self).get_context_data(**kwargs)
+        context['report'] = self.report
+        return context
+
+
+class ReportStatusView(DownloadReport):
+    """ Returns the rendering state of the report file as JSON, used to poll whether the report can be downloaded """
+
+    def get(self, request, *args, **kwargs):
+        inquiry = self.get_report_inquiry()
+        is_ready = RenderedReport.get_up_to_date(self.report, inquiry=inquiry) is not None
+        task = None if is_ready else QueuedReportRenderTask.get_latest(self.report, inquiry=inquiry)
+
+        return JsonResponse({
+            'ready': is_ready,
+            'failed': task is not None and task.state in (task.FAILED, task.CANCELLED),
+            'progress': task.progress if task is not None else None,
+            'download_url': reverse('download_pdf', kwargs={'report_slug': self.report.slug}),
+        })
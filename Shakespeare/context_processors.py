@@ -1,13 +1,13 @@
 from django.conf import settings
 
-from Questionaire.models import Inquirer
+from Questionaire.utils import get_inquirer
 
 
 def questionaire_context(request):
     """Adds some variables to every template context."""
     context = {
         # Get the current inquirer session
-        'inquirer': Inquirer.objects.filter(id=request.session.get('inquirer_id', None)).first(),
+        'inquirer': get_inquirer(request),
     }
     # Set some attributes from the settings in the glocal context
     context.update({
@@ -5,6 +5,24 @@ SHOW_DEBUG_CLASSES = True
 # Display the actual progress scores in the view
 DISPLAY_TECH_SCORES_IN_VIEW = False
 
+# Keep a compact copy of all scores of an inquiry in a single row, so they can be read with a single row fetch
+# Run the refresh_score_vectors command after enabling this setting
+SCORE_VECTOR_STORAGE = False
+
+# Store the result of each technology for each inquiry, so inquiries can be selected on their technology results
+# Run the refresh_verdicts command after enabling this setting. Changes in the scoring of technologies are processed in
+# the task queue, which requires the run_queued_tasks command to be scheduled
+TECHNOLOGY_VERDICT_STORAGE = False
+
+# Cache the rendered technology results of inquiries in the given cache of the CACHES setting. Cached results are only
+# renewed when the answers of the inquiry, the questionaire definition, the technology or its notes change
+RESULT_FRAGMENT_CACHING = False
+RESULT_FRAGMENT_CACHE = 'result_fragments'
+
+# Render report files in the task queue instead of in the download request, the reports of an inquiry are queued as
+# soon as it is completed. Requires the run_queued_tasks command to be scheduled
+QUEUED_REPORT_RENDERING = False
+
 DOMAIN_NAME = ""
 
 # Sessions settings
@@ -24,6 +42,18 @@ LOGOUT_REDIRECT_URL = '/'
 # Value is interpreted as percentage so it can possibly interact with other set values
 PDF_BASE_FONT_SIZE = 85
 
+# The maximum number of PDF files rendered at the same time on this server, shared by all web processes. Each web
+# process renders in a pool of this number of worker processes, 0 renders in the web process itself without a limit
+PDF_RENDER_WORKERS = 2
+# The maximum number of seconds wkhtmltopdf may take for a single file, and the maximum number of seconds a request
+# waits for its file including the time it is queued behind other files
+PDF_RENDER_TIMEOUT = 60
+PDF_RENDER_WAIT_TIMEOUT = 120
+# The path of the wkhtmltopdf executable, None looks it up on the PATH
+WKHTMLTOPDF_PATH = None
+# Only render the report pages that differ per inquiry and combine them with stored files of the other pages
+SPLICED_REPORT_RENDERING = False
+
 # An e-mail that will be displayed as contact point when an error occurs
 MAIN_CONTACT_EMAIL = "klimaat-menukaart@gmail.com"
 
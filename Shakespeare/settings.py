@@ -134,6 +134,26 @@ DATABASES = {
     }
 }
 
+# Caches
+# https://docs.djangoproject.com/en/2.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # The rendered results of inquiries, see Questionaire.processors.result_fragments
+    # Use 'django.core.cache.backends.filebased.FileBasedCache' with a directory as LOCATION to share the fragments
+    # between processes
+    'result_fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'result_fragments',
+        'TIMEOUT': 86400,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 STATIC_URL = '/static/'
@@ -1,4 +1,5 @@
-from Questionaire.models import TechScoreLink, Inquiry
+from Questionaire.models import TechScoreLink, Inquiry, Technology, TechnologyVerdict
+from Questionaire.processors import technology_verdicts
 
 
 def get_total_tech_scores(technology, inquiries=None):
@@ -14,6 +15,14 @@ def get_total_tech_scores(technology, inquiries=None):
         inquiries = Inquiry.objects.all()
 
     num_inquiries = inquiries.count()
+
+    if technology_verdicts.is_enabled():
+        # Count the stored verdicts instead of comparing all scores
+        verdicts = TechnologyVerdict.objects.filter(technology_id=technology.id, inquiry__in=inquiries)
+        num_approved = verdicts.filter(verdict=Technology.TECH_SUCCESS).count()
+        num_denied = verdicts.filter(verdict=Technology.TECH_FAIL).count()
+        return [num_approved, num_inquiries - num_approved - num_denied, num_denied]
+
     approved_inquiries = inquiries
     denied_inquiries = inquiries
     score_links = technology.techscorelink_set.all()
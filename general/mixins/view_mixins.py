@@ -5,7 +5,7 @@ from django.http import HttpResponseRedirect, QueryDict, Http404
 from django.utils.http import is_safe_url
 from django.contrib import messages
 
-from Questionaire.models import Inquirer
+from Questionaire.utils import get_inquirer
 
 
 class AccessMixin:
@@ -93,13 +93,13 @@ class InquiryMixin:
     raise_404_on_missing_inquirer = True
 
     def setup(self, request, *args, **kwargs):
-        try:
-            self.inquirer = Inquirer.objects.get(id=request.session.get('inquirer_id', None))
-        except Inquirer.DoesNotExist:
+        self.inquirer = get_inquirer(request)
+        if self.inquirer is None:
             if self.raise_404_on_missing_inquirer:
                 raise Http404("U heeft momenteel niet een actieve inquirer sessie")
-
-        self.inquiry = self.inquirer.active_inquiry
+            self.inquiry = None
+        else:
+            self.inquiry = self.inquirer.active_inquiry
         return super(InquiryMixin, self).setup(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
@@ -12,6 +12,7 @@ from mailing.mails import send_templated_mail
 from initiative_enabler.models import *
 from Questionaire.models import Inquirer, Technology, InquiryQuestionAnswer
 from Questionaire.fields import QuestionFieldFactory
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
 
 
 __all__ = ['RSVPAgreeForm', 'RSVPDenyForm', 'RSVPOnClosedForm', 'RSVPRefreshExpirationForm',
@@ -496,11 +497,12 @@ class EnableAllTechCollectiveInterestForm(NoFormDataMixin, Form):
     @staticmethod
     def get_advised_collectives(inquiry):
         advised_collectives = []
-        for collective in TechCollective.objects.all():
+        resolver = TechScoreResolver(inquiry)
+        for collective in TechCollective.objects.select_related('technology__techgroup'):
             technology = collective.technology
             if technology.get_as_techgroup:
                 technology = technology.get_as_techgroup
-            tech_score = technology.get_score(inquiry=inquiry)
+            tech_score = resolver.get_score(technology)
             if tech_score == Technology.TECH_SUCCESS or tech_score == Technology.TECH_VARIES:
                 advised_collectives.append(collective)
         return advised_collectives
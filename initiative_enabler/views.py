@@ -12,6 +12,8 @@ from general.views import StepDisplayMixin
 from general.mixins.view_mixins import AccessMixin, RedirectThroughUriOnSuccess, QuickEditMixin
 from Questionaire.models import *
 from Questionaire.forms import EmailForm
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
+from Questionaire.utils import get_inquirer_or_404
 from initiative_enabler.models import *
 from initiative_enabler.forms import *
 from reports.responses import StoredOrCreatePDFRespose
@@ -24,7 +26,7 @@ Mixins
 
 class InquiryMixin:
     def setup(self, request, *args, **kwargs):
-        self.inquirer = get_object_or_404(Inquirer, id=request.session.get('inquirer_id', None))
+        self.inquirer = get_inquirer_or_404(request)
         self.inquiry = self.inquirer.active_inquiry
         return super(InquiryMixin, self).setup(request, *args, **kwargs)
 
@@ -41,7 +43,7 @@ class EditCollectiveMixin:
     collective = None
 
     def dispatch(self, request, *args, **kwargs):
-        self.inquirer = get_object_or_404(Inquirer, id=self.request.session.get('inquirer_id', None))
+        self.inquirer = get_inquirer_or_404(self.request)
         self.collective = get_object_or_404(InitiatedCollective, id=kwargs['collective_id'])
         return super(EditCollectiveMixin, self).dispatch(request, *args, **kwargs)
 
@@ -270,10 +272,12 @@ class TakeActionOverview(InquiryMixin, CheckEmailMixin, ThirdStepDisplayMixin, T
         """ Gets and returns all advised improvements, takes into account improvmeents that should or should not appear
         """
         advised_techs = []
+        resolver = TechScoreResolver(self.inquiry)
 
-        for tech_collective in TechCollective.objects.filter(technology__display_in_step_3_list=True):
+        for tech_collective in TechCollective.objects.filter(
+                technology__display_in_step_3_list=True).select_related('technology'):
 
-            tech_score = tech_collective.technology.get_score(self.inquiry)
+            tech_score = resolver.get_score(tech_collective.technology)
             if tech_score == Technology.TECH_SUCCESS or tech_score == Technology.TECH_VARIES:
                 advised_techs.append(tech_collective.technology)
 
@@ -435,7 +439,7 @@ def render_collective_detail(request, *args, **kwargs):
     """ Determine which view needs to be used. As owner or as follower """
 
     collective = get_object_or_404(InitiatedCollective, id=kwargs.get('collective_id', None))
-    inquirer = get_object_or_404(Inquirer, id=request.session.get('inquirer_id', None))
+    inquirer = get_inquirer_or_404(request)
 
     if collective.inquirer == inquirer:
         view_class = InitiatedCollectiveStarterDetailsView
@@ -16,7 +16,7 @@ class Command(BaseCommand):
         currently_processing = QueuedTask.objects.filter(state=QueuedTask.PROCESSING).count()
         if currently_processing < self.process_limit:
             # Get the next task, if there is one, and activate it
-            next_task = QueuedTask.objects.filter(state=QueuedTask.QUEUED).first()
+            next_task = QueuedTask.objects.filter(state=QueuedTask.QUEUED).order_by('-priority', 'id').first()
             if next_task:
                 print(f"Activating task {next_task.id}")
                 next_task.get_as_child().activate()
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.7 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queued_tasks', '0003_auto_20200412_0421'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedtask',
+            name='priority',
+            field=models.IntegerField(default=0),
+        ),
+    ]
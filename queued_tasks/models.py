@@ -20,6 +20,9 @@ class QueuedTask(models.Model):
         (CANCELLED, "Cancelled"),
     ], default=QUEUED)
 
+    # Tasks with a higher priority are activated first, e.g. tasks a visitor is waiting for
+    priority = models.IntegerField(default=0)
+
     completed_on = models.DateTimeField(blank=True, null=True)
     progress = models.CharField(max_length=64, default="", blank=True, null=True)
     feedback = models.TextField(blank=True, null=True)
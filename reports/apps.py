@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class ReportsConfig(AppConfig):
     name = 'reports'
+
+    def ready(self):
+        super(ReportsConfig, self).ready()
+        from Questionaire.signals import inquiry_completed
+        from reports.processors import queue_reports_on_completion
+
+        # Prepare the reports of an inquiry as soon as it is completed
+        inquiry_completed.connect(queue_reports_on_completion)
@@ -29,18 +29,28 @@ class Command(BaseCommand):
             action='store_true',
             help='Prevents clearing of old static reports (except the newest version)',
         )
+        parser.add_argument(
+            '--keep_unreferenced',
+            action='store_true',
+            help='Prevents clearing files that are no longer referred to by any rendered report',
+        )
+        parser.add_argument(
+            '--keep_pages',
+            action='store_true',
+            help='Prevents clearing stored files of static report pages that have not been used recently',
+        )
 
     def handle(self, *args, **options):
         # If not all maximum running tasks, activate a task in the queue
         if not options['keep_unused']:
-            # Clear the contents of the onetime folder. This is used for pdf creation in the setup. For instance
-            # on single page PDF's.
-
+            # Clear the contents of the onetime folder. This was used for pdf creation in the setup, for instance
+            # on single page PDF's. These are now created in memory, so only files of older versions remain.
             dir = os.path.join(settings.REPORT_ROOT, 'onetime')
             num_deleted = 0
-            for f in os.listdir(dir):
-                os.remove(os.path.join(dir, f))
-                num_deleted += 1
+            if os.path.isdir(dir):
+                for f in os.listdir(dir):
+                    os.remove(os.path.join(dir, f))
+                    num_deleted += 1
             print(f"Removed {num_deleted} onetime files")
 
         if not options['keep_outdated']:
@@ -64,3 +74,35 @@ class Command(BaseCommand):
                         report.delete()
                         num_deleted += 1
             print(f"Removed {num_deleted} old static pdf-files")
+
+        if not options['keep_unreferenced']:
+            # Rendered reports share files with the same content, files without any remaining references are removed.
+            # Recent files are kept as they might be in the process of being stored
+            threshold = (timezone.now() - datetime.timedelta(hours=1)).timestamp()
+            referenced_file_names = RenderedReport.get_referenced_file_names()
+
+            num_deleted = 0
+            for f in os.listdir(settings.REPORT_ROOT):
+                file_path = os.path.join(settings.REPORT_ROOT, f)
+                if not f.endswith('.pdf') or not os.path.isfile(file_path) or f in referenced_file_names:
+                    continue
+                if os.path.getmtime(file_path) > threshold:
+                    continue
+                os.remove(file_path)
+                num_deleted += 1
+            print(f"Removed {num_deleted} unreferenced pdf-files")
+
+        if not options['keep_pages']:
+            # Clear the files of static pages that were not used in spliced reports recently
+            dif_days = 3
+            threshold = (timezone.now() - datetime.timedelta(days=dif_days)).timestamp()
+
+            dir = os.path.join(settings.REPORT_ROOT, 'pages')
+            num_deleted = 0
+            if os.path.isdir(dir):
+                for f in os.listdir(dir):
+                    file_path = os.path.join(dir, f)
+                    if os.path.getmtime(file_path) < threshold:
+                        os.remove(file_path)
+                        num_deleted += 1
+            print(f"Removed {num_deleted} unused page files")
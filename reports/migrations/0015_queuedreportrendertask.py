@@ -0,0 +1,23 @@
+# Generated by Django 2.2.7 on 2026-10-18 12:42
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('queued_tasks', '0003_auto_20200412_0421'),
+        ('reports', '0014_report_is_static'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedReportRenderTask',
+            fields=[
+                ('queuedtask_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, primary_key=True, serialize=False, to='queued_tasks.QueuedTask')),
+                ('rendered_report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='reports.RenderedReport')),
+            ],
+            bases=('queued_tasks.queuedtask',),
+        ),
+    ]
@@ -10,15 +10,18 @@ from django.conf import settings
 
 
 from Questionaire.models import Technology, Inquiry
+from Questionaire.modules.modules import TechScoreModule
 from PageDisplay.models import Page
+from queued_tasks.models import QueuedTask
 
 # Import the modules and containers
 from .renderers import *
 from .utils import TechListReportPageRetrieval
+from .processors import ReportRenderProcessor
 
 
 __all__ = ["Report", "ReportPage", "ReportDisplayOptions", "PageLayout", "ReportPageSingle", "ReportPageMultiGenerated",
-           "ReportPageLink", "PageCriteria", "TechnologyPageCriteria", "RenderedReport"]
+           "ReportPageLink", "PageCriteria", "TechnologyPageCriteria", "RenderedReport", "QueuedReportRenderTask"]
 
 
 class Report(models.Model):
@@ -43,9 +46,31 @@ class Report(models.Model):
             'reportpagelink__page_number'
         ).all()
 
+    def get_plotted_pages(self, inquiry=None):
+        """ Returns the pages that are displayed for the given inquiry
+        :return: A list of (page, page number) tuples in order of display
+        """
+        plotted_pages = []
+        page_num = 1
+        for page in self.get_pages():
+            meets_criteria = True
+            for criteria in page.pagecriteria_set.all():
+                if not criteria.is_met(inquiry):
+                    meets_criteria = False
+            if meets_criteria:
+                plotted_pages.append((page, page_num))
+                page_num += page.get_as_child().get_num_plotted_pages(inquiry)
+        return plotted_pages
+
     def __str__(self):
         return self.report_name
 
+    def get_render_threshold(self, inquiry=None):
+        """ Returns the moment after which a rendered file of this report needs to be created to be up to date """
+        if inquiry is None or self.is_static or inquiry.completed_on is None:
+            return self.last_edited
+        return max(inquiry.completed_on, self.last_edited)
+
     @property
     def list_other_uses(self):
         other_uses_list = []
@@ -66,16 +91,102 @@ class RenderedReport(models.Model):
     file = models.FileField(storage=report_storage, null=True)  # Null indicates that the report is being created
 
     def delete(self, **kwargs):
-        # delete the file
-        self.file.delete(False)
+        # Files are shared between rendered reports with the same content, only delete the last reference
+        if self.file and self.get_num_file_references() <= 1:
+            self.file.delete(False)
         return super(RenderedReport, self).delete(**kwargs)
 
+    def get_num_file_references(self):
+        """ Returns the number of rendered reports that refer to the file of this rendered report """
+        if not self.file:
+            return 0
+        return RenderedReport.objects.filter(file=self.file.name).count()
+
+    @classmethod
+    def get_referenced_file_names(cls):
+        """ Returns the names of all files that are referred to by rendered reports """
+        return set(cls.objects.exclude(file='').exclude(file__isnull=True).values_list('file', flat=True).distinct())
+
     def build_file(self):
         """ Build the file this represents"""
         from reports.report_plotter import ReportPlotter
         plotter = ReportPlotter(report=self.report)
         plotter.plot_report(inquiry=self.inquiry, plotted_report=self)
 
+    @property
+    def is_finished(self):
+        return bool(self.file)
+
+    @classmethod
+    def get_up_to_date(cls, report, inquiry=None):
+        """ Returns the latest finished file of the report for the inquiry, None if there is no up to date file
+        :param report: The report
+        :param inquiry: The inquiry, None for static reports
+        """
+        rendered_report = cls.objects.filter(
+            report=report,
+            inquiry=inquiry,
+            created_on__gte=report.get_render_threshold(inquiry),
+            file__isnull=False,
+        ).exclude(
+            file=''
+        ).order_by(
+            'created_on'
+        ).last()
+
+        # Shared files can be deleted together with another rendered report while this one was saved, in which case
+        # the report needs to be rendered again
+        if rendered_report is not None and not rendered_report.file.storage.exists(rendered_report.file.name):
+            return None
+        return rendered_report
+
+
+class QueuedReportRenderTask(QueuedTask):
+    """ Renders a report file in the task queue, so it is not created in the web request that requests it """
+    rendered_report = models.OneToOneField(RenderedReport, on_delete=models.CASCADE)
+
+    processor = ReportRenderProcessor
+
+    def __str__(self):
+        if self.rendered_report.inquiry_id:
+            return f"Render {self.rendered_report.report} for inquiry {self.rendered_report.inquiry_id}"
+        return f"Render {self.rendered_report.report}"
+
+    @classmethod
+    def get_latest(cls, report, inquiry=None):
+        """ Returns the latest task rendering an up to date file of the report for the inquiry, None if there is none
+        """
+        return cls.objects.filter(
+            rendered_report__report=report,
+            rendered_report__inquiry=inquiry,
+            rendered_report__created_on__gte=report.get_render_threshold(inquiry),
+        ).select_related('rendered_report').order_by('added_on').last()
+
+    # The priority of renders a visitor is waiting for, so they are not queued behind the pre-rendered reports
+    REQUESTED_PRIORITY = 1
+
+    @classmethod
+    def queue(cls, report, inquiry=None, priority=0):
+        """ Queues the rendering of the report for the inquiry, unless it is already queued or being rendered
+        :param priority: The priority of the task, a task that is already queued is raised to this priority
+        :return: The task that renders the file
+        """
+        task = cls.get_latest(report, inquiry)
+        if task is None or task.state not in (cls.QUEUED, cls.PROCESSING):
+            task = cls.objects.create(rendered_report=RenderedReport.objects.create(report=report, inquiry=inquiry),
+                                      priority=priority)
+        elif task.state == cls.QUEUED and task.priority < priority:
+            task.priority = priority
+            task.save(update_fields=['priority'])
+        return task
+
+    @classmethod
+    def queue_for_inquiry(cls, inquiry):
+        """ Queues the rendering of all live reports that are created for the given inquiry """
+        for report in Report.objects.filter(is_live=True, is_static=False):
+            if RenderedReport.get_up_to_date(report, inquiry) is None:
+                cls.queue(report, inquiry)
+
 
 def upload_layout_path(instance, filename):
     # Throws these files in their seperate report folder
@@ -201,6 +312,14 @@ class ReportPage(Page):
         """ Tests whether this page is valid for the given inquiry """
         return True
 
+    def is_inquiry_dependent(self):
+        """ Returns whether the content of this page differs per inquiry """
+        if self.multi_type is not None:
+            return True
+        if self.root_module is None:
+            return False
+        return bool(self.root_module.get_child().get_modules(filter_class_type=TechScoreModule))
+
     def get_num_plotted_pages(self, inquiry):
         return 1
 
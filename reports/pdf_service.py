@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import TimeoutError
+from contextlib import contextmanager
+from concurrent.futures.process import ProcessPoolExecutor, BrokenProcessPool
+
+import pdfkit
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    # File locks are not available on Windows, where the number of renders is only limited per web process
+    fcntl = None
+
+""" This file contains code that renders PDF files from HTML in a pool of long-lived worker processes
+
+wkhtmltopdf can only render a single document per process, so each job still starts a wkhtmltopdf process. These are
+started from the worker processes instead of the web process. Each render holds one of settings.PDF_RENDER_WORKERS
+render slots, which are file locks shared by all processes on the server, so the number of PDFs rendered at the same
+time is limited regardless of the number of web processes. Jobs that exceed settings.PDF_RENDER_TIMEOUT are killed and
+pools with a crashed worker are replaced.
+"""
+
+__all__ = ['PDFRenderError', 'render_pdf', 'shutdown_render_pool']
+
+
+class PDFRenderError(IOError):
+    """ Raised when a PDF file could not be rendered """
+    pass
+
+
+# The pdfkit configurations of a worker process by executable path, so the executable is only located once
+_configurations = {}
+
+
+def _get_configuration(wkhtmltopdf):
+    if wkhtmltopdf not in _configurations:
+        _configurations[wkhtmltopdf] = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf or '')
+    return _configurations[wkhtmltopdf]
+
+
+@contextmanager
+def _render_slot(slot_folder, num_slots, deadline):
+    """ Holds one of the render slots shared by all processes, waits for a free slot until the deadline """
+    if fcntl is None or not num_slots:
+        yield
+        return
+
+    os.makedirs(slot_folder, exist_ok=True)
+    while True:
+        for slot in range(num_slots):
+            slot_file = open(os.path.join(slot_folder, f'slot_{slot}.lock'), 'a')
+            try:
+                fcntl.flock(slot_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                slot_file.close()
+                continue
+
+            # Closing the file releases the lock, which also happens when the process crashes
+            try:
+                yield
+            finally:
+                slot_file.close()
+            return
+
+        if time.time() >= deadline:
+            raise PDFRenderError("No render slot became available in time")
+        time.sleep(0.05)
+
+
+def _run_wkhtmltopdf(html, file_path, options, wkhtmltopdf, timeout, slot_folder=None, num_slots=0, deadline=None):
+    """ Renders the HTML to a PDF file at file_path, or returns its content when file_path is None. Executed in the
+    worker processes, which hold a render slot while wkhtmltopdf runs when num_slots is given """
+    configuration = _get_configuration(wkhtmltopdf)
+    command = pdfkit.PDFKit(html, 'string', options=options, configuration=configuration).command(file_path)
+    try:
+        with _render_slot(slot_folder, num_slots, deadline):
+            result = subprocess.run(command, input=html.encode('utf-8'), stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise PDFRenderError(f"Rendering {file_path or 'PDF'} took longer than {timeout} seconds")
+
+    if result.returncode != 0:
+        raise PDFRenderError(f"wkhtmltopdf exited with code {result.returncode}: "
+                             f"{result.stderr.decode('utf-8', errors='replace')}")
+    if file_path is None:
+        if not result.stdout:
+            raise PDFRenderError("wkhtmltopdf did not return any content")
+        return result.stdout
+    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
+        raise PDFRenderError(f"wkhtmltopdf did not create {file_path}")
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    """ Returns the worker pool of this process, creates it when needed """
+    global _pool, _pool_pid
+    with _pool_lock:
+        # Forked processes can not use the pool of their parent
+        if _pool is None or _pool_pid != os.getpid():
+            # Workers are spawned, so they do not inherit the memory of the web process
+            _pool = ProcessPoolExecutor(max_workers=settings.PDF_RENDER_WORKERS,
+                                        mp_context=multiprocessing.get_context('spawn'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def _discard_pool(pool):
+    """ Removes the given pool, so the next job creates a new pool """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown_render_pool():
+    """ Stops the worker processes of this process """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None and _pool_pid == os.getpid():
+        pool.shutdown(wait=True)
+
+
+def render_pdf(html, file_path=None, options=None):
+    """ Renders the HTML to a PDF file
+    :param html: The HTML content of the PDF
+    :param file_path: The path the PDF file is stored at, None returns the content of the PDF instead
+    :param options: The wkhtmltopdf options
+    :return: The content of the PDF when no file_path is given
+    :raises PDFRenderError: When the file could not be rendered
+    """
+    args = (html, file_path, options or {}, settings.WKHTMLTOPDF_PATH, settings.PDF_RENDER_TIMEOUT)
+    if not settings.PDF_RENDER_WORKERS:
+        return _run_wkhtmltopdf(*args)
+
+    # Workers that did not get a render slot before the request stops waiting give up as well
+    slot_args = (os.path.join(settings.REPORT_ROOT, 'render_slots'), settings.PDF_RENDER_WORKERS,
+                 time.time() + settings.PDF_RENDER_WAIT_TIMEOUT)
+
+    # A crashed worker breaks the entire pool, in which case the job is retried once in a new pool
+    for _ in range(2):
+        pool = _get_pool()
+        try:
+            future = pool.submit(_run_wkhtmltopdf, *args, *slot_args)
+            return future.result(timeout=settings.PDF_RENDER_WAIT_TIMEOUT)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+        except TimeoutError:
+            future.cancel()
+            raise PDFRenderError(f"Rendering {file_path or 'PDF'} did not finish within "
+                                 f"{settings.PDF_RENDER_WAIT_TIMEOUT} seconds")
+    raise PDFRenderError(f"Rendering {file_path or 'PDF'} failed as the render workers crashed")
@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from queued_tasks.processors import TaskProcessor
+
+""" This file contains code that renders reports in the task queue instead of in the web request """
+
+__all__ = ['ReportRenderProcessor', 'queue_reports_on_completion']
+
+
+class ReportRenderProcessor(TaskProcessor):
+    """ Renders the report file of a QueuedReportRenderTask """
+    total_entries = 1
+
+    def get_iterator(self):
+        return [self.task.rendered_report]
+
+    def process_iteration(self, rendered_report, i):
+        rendered_report.build_file()
+
+    def tear_down(self, i):
+        return f"Rendered {self.task.rendered_report.report}"
+
+
+def queue_reports_on_completion(inquiry, **kwargs):
+    """ Queues the rendering of all live reports of a completed inquiry, so they are ready when requested.
+    Connected to the inquiry_completed signal """
+    # Import here to avoid circular imports
+    from reports.models import QueuedReportRenderTask
+
+    if settings.QUEUED_REPORT_RENDERING:
+        QueuedReportRenderTask.queue_for_inquiry(inquiry)
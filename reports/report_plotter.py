@@ -1,5 +1,6 @@
+import hashlib
+import io
 import os
-import pdfkit
 
 from django.conf import settings
 from django.utils import timezone
@@ -7,6 +8,7 @@ from django.template.loader import get_template
 
 from reports.renderers import ReportSinglePagePDFRenderer
 from reports.models import RenderedReport
+from reports.pdf_service import render_pdf
 
 
 class ReportPlotter:
@@ -24,7 +26,7 @@ class ReportPlotter:
         if using:
             self.template_engine = using
 
-    def plot_report(self, inquiry=None, file_name=None, plotted_report=None):
+    def plot_report(self, inquiry=None, plotted_report=None):
         """ Plots the report to a file and strores a reference in the database """
 
         # Create the plotting file
@@ -34,41 +36,122 @@ class ReportPlotter:
                 inquiry=inquiry,
             )
 
-        # Create the HTML content which is to be plotted to the PDF
-        html_content = self.plot_report_as_html(self.get_context_data(inquiry=inquiry))
-
-        # Ensure a (likely) unique name by including a timestamp
-        timestamp = timezone.now().timestamp()
-        file_name = file_name or self.file_name
-        if inquiry:
-            local_file_name = f"{file_name}_{inquiry.id}_{timestamp}.pdf"
-        else:
-            local_file_name = f"{file_name}_{timestamp}.pdf"
-        # For maintenance and privacy reasons the reports are stored elsewhere at REPORT_ROOT
-        local_file_path = os.path.join(settings.REPORT_ROOT, local_file_name)
-        self.save_as_pdf(html_content, local_file_path)
+        local_file_name = self.plot_report_file(inquiry)
 
         # Update the database with a reference to the file
         plotted_report.file.name = local_file_name
         plotted_report.save()
 
+        # The file can be shared with a rendered report that was deleted before the reference above was saved, which
+        # also deleted the file
+        if not plotted_report.file.storage.exists(local_file_name):
+            self.plot_report_file(inquiry)
+
         return plotted_report
 
+    def plot_report_file(self, inquiry=None):
+        """ Plots the report to a file in REPORT_ROOT, unless a file with the same content already exists
+        :return: The name of the file
+        """
+        local_file_name = None
+        if settings.SPLICED_REPORT_RENDERING:
+            local_file_name = self.plot_spliced_report(inquiry)
+
+        if local_file_name is None:
+            # Create the HTML content which is to be plotted to the PDF
+            html_content = self.plot_report_as_html(self.get_context_data(inquiry=inquiry))
+
+            # Reports with the same content share a single file, named after the fingerprint of the content
+            local_file_name = f"{self.get_fingerprint(html_content)}.pdf"
+            # For maintenance and privacy reasons the reports are stored elsewhere at REPORT_ROOT
+            self.store_pdf(os.path.join(settings.REPORT_ROOT, local_file_name),
+                           lambda file_path: self.save_as_pdf(html_content, file_path))
+
+        return local_file_name
+
+    def plot_spliced_report(self, inquiry=None):
+        """ Plots the pages that differ per inquiry and splices them with the stored files of the static pages
+        :return: The name of the created file, None if the report has no pages
+        """
+        # Import here as PyPDF2 is only required when reports are spliced
+        from PyPDF2 import PdfFileMerger
+
+        # Consecutive pages that differ per inquiry are rendered together, static pages are stored per page so they
+        # can be reused regardless of the pages around them
+        segments = []
+        for page, page_num in self.report.get_plotted_pages(inquiry):
+            is_static = not page.is_inquiry_dependent()
+            if is_static or not segments or segments[-1][0]:
+                segments.append((is_static, []))
+            segments[-1][1].append((page, page_num))
+        if not segments:
+            return None
+
+        segments = [(is_static, self.plot_report_as_html(self.get_context_data(inquiry=inquiry, plotted_pages=pages)))
+                    for is_static, pages in segments]
+        fingerprint = hashlib.sha256()
+        for is_static, html_content in segments:
+            fingerprint.update(self.get_fingerprint(html_content).encode())
+        local_file_name = f"{fingerprint.hexdigest()}.pdf"
+
+        def splice_pdf(file_path):
+            merger = PdfFileMerger()
+            for is_static, html_content in segments:
+                if is_static:
+                    page_file_path = os.path.join(settings.REPORT_ROOT, 'pages',
+                                                  f"{self.get_fingerprint(html_content)}.pdf")
+                    self.store_pdf(page_file_path, lambda path: self.save_as_pdf(html_content, path))
+                    with open(page_file_path, 'rb') as page_file:
+                        merger.append(io.BytesIO(page_file.read()))
+                else:
+                    merger.append(io.BytesIO(self.save_as_pdf(html_content)))
+            merger.write(file_path)
+            merger.close()
+
+        self.store_pdf(os.path.join(settings.REPORT_ROOT, local_file_name), splice_pdf)
+        return local_file_name
+
+    @staticmethod
+    def store_pdf(file_path, create_pdf):
+        """ Creates the file at file_path through create_pdf(path), unless the file already exists """
+        if os.path.exists(file_path):
+            # Mark the file as used, so it is not cleaned up
+            os.utime(file_path)
+            return
+
+        # Create the file under a temporary name, so a partially written file is never served
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_file_path = f"{file_path[:-len('.pdf')]}_{os.getpid()}_{timezone.now().timestamp()}.tmp.pdf"
+        try:
+            create_pdf(temp_file_path)
+            os.replace(temp_file_path, file_path)
+        finally:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    def get_fingerprint(self, html_content):
+        """ Returns the fingerprint of the PDF created from the given HTML content. The HTML contains all data of the
+        report and inquiry that is displayed, so equal fingerprints result in equal files """
+        fingerprint = hashlib.sha256(html_content.encode())
+        fingerprint.update(repr(sorted(self.pdf_options.items())).encode())
+        return fingerprint.hexdigest()
+
     def plot_report_as_html(self, context):
         """ Plots the report in HTML format ready for PDF translation """
         template = get_template(self.template_name, using=self.template_engine)
         html = template.render(context=context)
         return html
 
-    def get_context_data(self, inquiry=None):
+    def get_context_data(self, inquiry=None, plotted_pages=None):
         return {
             'template_engine': self.template_engine,
             'report': self.report,
             'renderer': self.page_renderer_class,
             'inquiry': inquiry,
+            'plotted_pages': plotted_pages,
         }
 
-    def save_as_pdf(self, html_layout, filepath):
+    def save_as_pdf(self, html_layout, filepath=None):
         pdfkit_options = {
             'dpi': 96,  # Set DPI to a fixed value to correspond with Windows (vital for things like line-width)
             'page-size': 'A4',
@@ -82,5 +165,5 @@ class ReportPlotter:
         }
         pdfkit_options.update(self.pdf_options)
 
-        # Create the pdf
-        pdfkit.from_string(html_layout, filepath, options=pdfkit_options)
+        # Create the pdf, its content is returned when no filepath is given
+        return render_pdf(html_layout, filepath, options=pdfkit_options)
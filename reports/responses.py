@@ -1,11 +1,9 @@
-import os
-import pdfkit
+import io
 
 from django.http import FileResponse
-from django.conf import settings
-from django.utils import timezone
 from django.template.loader import get_template
 
+from reports.pdf_service import render_pdf
 from reports.report_plotter import ReportPlotter
 from reports.models import RenderedReport
 from Questionaire.utils import get_inquiry_from_request
@@ -19,18 +17,14 @@ class SingleUsePDFResponse(FileResponse):
         template = get_template(template[0], using=using)
         html = template.render(context=context, request=request)
 
-        # Create a unique copy of the file
-        timestamp = timezone.now().timestamp()
-        local_file_name = f"{file_name}_{timestamp}.pdf"
-        local_file_path = os.path.join(settings.REPORT_ROOT, 'onetime', local_file_name)
-
-        self.save_as_pdf(html, local_file_path, options=page_options)
-        super(SingleUsePDFResponse, self).__init__(open(local_file_path, 'rb'))
+        # The file is only used once, so it is kept in memory instead of being stored
+        pdf_content = self.save_as_pdf(html, options=page_options)
+        super(SingleUsePDFResponse, self).__init__(io.BytesIO(pdf_content))
 
         self['Content-Type'] = 'application/pdf'
         self['Content-Disposition'] = 'attachment; filename={filename}'.format(filename=f'{file_name}.pdf')
 
-    def save_as_pdf(self, html_layout, filepath, options={}):
+    def save_as_pdf(self, html_layout, filepath=None, options={}):
         base_options = {
             'dpi': 96,  # Set DPI to a fixed value to correspond with Windows (vital for things like line-width)
             'page-size': 'A4',
@@ -45,8 +39,8 @@ class SingleUsePDFResponse(FileResponse):
         if options:
             base_options.update(options)
 
-        # Create the pdf
-        pdfkit.from_string(html_layout, filepath, options=base_options)
+        # Create the pdf, its content is returned when no filepath is given
+        return render_pdf(html_layout, filepath, options=base_options)
 
 
 class CreatedPDFResponse(FileResponse):
@@ -99,12 +93,7 @@ class StoredOrCreatePDFRespose(FileResponse):
 
     def get_rendered_static_report(self):
         """ Get the static report instance, construct it if neccesary """
-        rendered_report = RenderedReport.objects.filter(
-            report=self.report,
-            created_on__gte=self.report.last_edited
-        ).order_by(
-            'created_on'
-        ).last()
+        rendered_report = RenderedReport.get_up_to_date(self.report)
 
         if rendered_report is None:
             # The file is not yet build, so build the file.
@@ -115,18 +104,10 @@ class StoredOrCreatePDFRespose(FileResponse):
     def get_rendered_user_report(self):
         """ Create or get a plot of the user-specefied report """
         # Make sure that the processed file has the latest changes
-        threshold_date = max(self.inquiry.completed_on, self.report.last_edited)
-
-        rendered_report = RenderedReport.objects.filter(
-            report=self.report,
-            inquiry=self.inquiry,
-            created_on__gte=threshold_date
-        ).order_by(
-            'created_on'
-        ).last()
+        rendered_report = RenderedReport.get_up_to_date(self.report, inquiry=self.inquiry)
 
         if rendered_report is None:
             # The file is not yet build, so build the file.
             rendered_report = ReportPlotter(report=self.report).plot_report(inquiry=self.inquiry)
 
-        return rendered_report
\ No newline at end of file
+        return rendered_report
@@ -6,20 +6,16 @@ register = template.Library()
 
 
 @register.simple_tag(takes_context=True)
-def render_report(context, report):
+def render_report(context, report, plotted_pages=None):
+    """ Renders the report, plotted_pages optionally limits it to a list of (page, page number) tuples """
     context_dict = context.flatten()
     inquiry = context_dict.get('inquiry', None)
 
-    page_num = 1
-    rendered_html = ''
+    if not plotted_pages:
+        plotted_pages = report.get_plotted_pages(inquiry)
 
-    for page in report.get_pages():
-        meets_criteria = True
-        for criteria in page.pagecriteria_set.all():
-            if not criteria.is_met(inquiry):
-                meets_criteria = False
-        if meets_criteria:
-            rendered_html += page.render(**context_dict, report_page=page, p_num=page_num)
-            page_num += page.get_as_child().get_num_plotted_pages(inquiry)
+    rendered_html = ''
+    for page, page_num in plotted_pages:
+        rendered_html += page.render(**context_dict, report_page=page, p_num=page_num)
 
     return mark_safe(rendered_html)
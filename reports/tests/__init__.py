@@ -1,5 +1,7 @@
 import os
 import shutil
+import tempfile
+from unittest import mock
 
 from django.test import override_settings
 from django.conf import settings
@@ -38,3 +40,25 @@ def create_overwrite_media_folder_decorator(module_name):
 
 # The decorator to overwrite the media folder to the test reports
 override_media_folder = create_overwrite_media_folder_decorator('reports')
+
+
+class TemporaryReportRootMixin:
+    """ A test case mixin that moves the REPORT_ROOT to a temporary folder that is removed after each test, so
+    rendered report files are not stored in the actual report folder """
+
+    def setUp(self):
+        # Import here as the models can not be imported before the apps are loaded
+        from reports.models import report_storage
+
+        super(TemporaryReportRootMixin, self).setUp()
+        self.report_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.report_root, ignore_errors=True)
+
+        settings_override = override_settings(REPORT_ROOT=self.report_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # The storage of rendered reports determines its location when it is created
+        for attribute in ['base_location', 'location']:
+            patcher = mock.patch.object(report_storage, attribute, self.report_root)
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -1,12 +1,19 @@
+import io
+import os
 from copy import copy
+from unittest import mock
 
-from django.test import TestCase
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from . import override_media_folder
+from . import override_media_folder, TemporaryReportRootMixin
 from reports.models import *
+from reports.report_plotter import ReportPlotter
+from PyPDF2 import PdfFileReader, PdfFileWriter
+from Questionaire.models import Inquiry, Inquirer
 
 
 class ModelTestCaseMixin:
@@ -218,5 +225,115 @@ class TestPageLinkModel(ModelTestCaseMixin, TestCase):
     }
 
 
+def save_dummy_pdf(html_layout, filepath):
+    """ Replaces the PDF creation, which requires wkhtmltopdf """
+    with open(filepath, 'w') as file:
+        file.write(html_layout)
 
 
+@override_media_folder()
+@mock.patch.object(ReportPlotter, 'save_as_pdf', side_effect=save_dummy_pdf)
+class TestRenderedReportModel(TemporaryReportRootMixin, TestCase):
+    """ Tests that rendered reports with the same content share a single file """
+    fixtures = ['test_report.json']
+
+    def setUp(self):
+        super(TestRenderedReportModel, self).setUp()
+        self.report = Report.objects.get(id=1)
+        self.inquiries = [Inquiry.objects.create(inquirer=Inquirer.objects.create()) for i in range(3)]
+
+    def plot_report(self, inquiry, html="<html>Advice</html>"):
+        with mock.patch.object(ReportPlotter, 'plot_report_as_html', return_value=html):
+            return ReportPlotter(report=self.report).plot_report(inquiry=inquiry)
+
+    def test_shared_files(self, mock_save):
+        rendered_1 = self.plot_report(self.inquiries[0])
+        rendered_2 = self.plot_report(self.inquiries[1])
+        rendered_3 = self.plot_report(self.inquiries[2], html="<html>Other advice</html>")
+
+        # The PDF is only created once for the same content
+        self.assertEqual(mock_save.call_count, 2)
+        self.assertEqual(rendered_1.file.name, rendered_2.file.name)
+        self.assertNotEqual(rendered_1.file.name, rendered_3.file.name)
+        self.assertEqual(rendered_1.get_num_file_references(), 2)
+        self.assertEqual(RenderedReport.get_referenced_file_names(), {rendered_1.file.name, rendered_3.file.name})
+
+        # The file is only removed with its last reference
+        file_path = rendered_1.file.path
+        rendered_1.delete()
+        self.assertTrue(os.path.exists(file_path))
+        rendered_2.delete()
+        self.assertFalse(os.path.exists(file_path))
+
+    def test_missing_file(self, mock_save):
+        rendered_report = self.plot_report(self.inquiries[0])
+        self.assertEqual(RenderedReport.get_up_to_date(self.report, inquiry=self.inquiries[0]), rendered_report)
+
+        # A file deleted with another reference is no longer up to date
+        os.remove(rendered_report.file.path)
+        self.assertIsNone(RenderedReport.get_up_to_date(self.report, inquiry=self.inquiries[0]))
+
+    def test_file_deleted_while_plotting(self, mock_save):
+        """ Files deleted before the new reference is saved are stored again """
+        rendered_1 = self.plot_report(self.inquiries[0])
+        original_save = RenderedReport.save
+
+        def delete_other_then_save(rendered_report, **kwargs):
+            if rendered_report.file and RenderedReport.objects.filter(id=rendered_1.id).exists():
+                rendered_1.delete()
+            original_save(rendered_report, **kwargs)
+
+        with mock.patch.object(RenderedReport, 'save', delete_other_then_save):
+            rendered_2 = self.plot_report(self.inquiries[1])
+        self.assertTrue(os.path.exists(rendered_2.file.path))
+
+
+def save_dummy_paged_pdf(html_layout, filepath=None):
+    """ Replaces the PDF creation with a PDF containing a blank page for each page in the HTML """
+    writer = PdfFileWriter()
+    for i in range(max(html_layout.count('name="page_container"'), 1)):
+        writer.addBlankPage(210, 297)
+    content = io.BytesIO()
+    writer.write(content)
+    if filepath is None:
+        return content.getvalue()
+    with open(filepath, 'wb') as file:
+        file.write(content.getvalue())
+
+
+@override_media_folder()
+@override_settings(SPLICED_REPORT_RENDERING=True)
+@mock.patch.object(ReportPlotter, 'save_as_pdf', side_effect=save_dummy_paged_pdf)
+class TestSplicedReportPlotting(TemporaryReportRootMixin, TestCase):
+    """ Tests that only the pages that differ per inquiry are rendered when reports are spliced """
+    fixtures = ['test_report.json']
+
+    def setUp(self):
+        super(TestSplicedReportPlotting, self).setUp()
+        self.report = Report.objects.get(id=1)
+        # The third page in the report lists the advised technologies
+        ReportPage.objects.filter(id=3).update(multi_type=ReportPage.TECHS_ADVISED)
+        self.inquiries = [Inquiry.objects.create(inquirer=Inquirer.objects.create()) for i in range(2)]
+
+    def test_is_inquiry_dependent(self, mock_save):
+        self.assertTrue(ReportPage.objects.get(id=3).is_inquiry_dependent())
+        self.assertFalse(ReportPage.objects.get(id=4).is_inquiry_dependent())
+
+    def test_get_plotted_pages(self, mock_save):
+        plotted_pages = self.report.get_plotted_pages(self.inquiries[0])
+        self.assertEqual([(page.id, page_num) for page, page_num in plotted_pages], [(2, 1), (4, 2), (3, 3), (5, 3)])
+
+    def test_splicing(self, mock_save):
+        rendered_report = ReportPlotter(report=self.report).plot_report(inquiry=self.inquiries[0])
+        # Each distinct static page is stored separately, the page listing technologies is rendered for the inquiry
+        num_page_files = len(os.listdir(os.path.join(settings.REPORT_ROOT, 'pages')))
+        self.assertGreater(num_page_files, 0)
+        self.assertEqual(mock_save.call_count, num_page_files + 1)
+        with open(rendered_report.file.path, 'rb') as file:
+            self.assertEqual(PdfFileReader(io.BytesIO(file.read())).getNumPages(), 4)
+
+        # The static pages are reused for the next inquiry
+        os.remove(rendered_report.file.path)
+        mock_save.reset_mock()
+        ReportPlotter(report=self.report).plot_report(inquiry=self.inquiries[1])
+        self.assertEqual(mock_save.call_count, 1)
@@ -0,0 +1,95 @@
+import fcntl
+import os
+import signal
+import stat
+import tempfile
+import shutil
+
+from django.test import TestCase, override_settings
+
+from reports import pdf_service
+from reports.pdf_service import PDFRenderError, render_pdf, shutdown_render_pool
+
+
+# A replacement for wkhtmltopdf that writes the HTML from stdin to the output path (the last argument), or to stdout
+# when the output path is -
+FAKE_WKHTMLTOPDF = """#!/bin/sh
+for output_path; do :; done
+html=$(cat)
+case "$html" in *slow*) sleep 2;; esac
+if [ "$output_path" = "-" ]; then
+    printf '%s' "$html"
+else
+    printf '%s' "$html" > "$output_path"
+fi
+"""
+
+
+class PDFServiceTestCase(TestCase):
+    """ Tests rendering PDF files in the pool of render workers """
+
+    @classmethod
+    def setUpClass(cls):
+        super(PDFServiceTestCase, cls).setUpClass()
+        cls.folder = tempfile.mkdtemp()
+        cls.executable = os.path.join(cls.folder, 'wkhtmltopdf')
+        with open(cls.executable, 'w') as file:
+            file.write(FAKE_WKHTMLTOPDF)
+        os.chmod(cls.executable, stat.S_IRWXU)
+        # The render slots are stored in the REPORT_ROOT
+        cls.report_root = os.path.join(cls.folder, 'reports')
+        os.makedirs(cls.report_root)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_render_pool()
+        shutil.rmtree(cls.folder)
+        super(PDFServiceTestCase, cls).tearDownClass()
+
+    def render(self, html, file_name='report.pdf', **settings):
+        file_path = os.path.join(self.folder, file_name)
+        settings.setdefault('PDF_RENDER_WORKERS', 2)
+        with override_settings(WKHTMLTOPDF_PATH=self.executable, REPORT_ROOT=self.report_root, **settings):
+            render_pdf(html, file_path, options={'page-size': 'A4'})
+        with open(file_path) as file:
+            return file.read()
+
+    def test_render_in_process(self):
+        self.assertEqual(self.render("<html>Report</html>", PDF_RENDER_WORKERS=0), "<html>Report</html>")
+
+    def test_render_in_pool(self):
+        self.assertEqual(self.render("<html>Report</html>"), "<html>Report</html>")
+        self.assertEqual(self.render("<html>Other</html>", file_name='other.pdf'), "<html>Other</html>")
+
+    def test_render_in_memory(self):
+        files = set(os.listdir(self.folder))
+        for num_workers in [0, 2]:
+            with override_settings(WKHTMLTOPDF_PATH=self.executable, REPORT_ROOT=self.report_root,
+                                   PDF_RENDER_WORKERS=num_workers):
+                self.assertEqual(render_pdf("<html>Preview</html>"), b"<html>Preview</html>")
+        self.assertEqual(set(os.listdir(self.folder)), files)
+
+    def test_timeout(self):
+        with self.assertRaises(PDFRenderError):
+            self.render("<html>slow</html>", PDF_RENDER_TIMEOUT=0.5)
+        with self.assertRaises(PDFRenderError):
+            self.render("<html>slow</html>", PDF_RENDER_WAIT_TIMEOUT=0.5)
+
+    def test_render_slots(self):
+        """ The render slots are shared with other processes """
+        slot_folder = os.path.join(self.report_root, 'render_slots')
+        os.makedirs(slot_folder, exist_ok=True)
+        with open(os.path.join(slot_folder, 'slot_0.lock'), 'a') as slot_file:
+            # Occupy the only slot, as another web process would
+            fcntl.flock(slot_file, fcntl.LOCK_EX)
+            with self.assertRaises(PDFRenderError):
+                self.render("<html>Report</html>", PDF_RENDER_WORKERS=1, PDF_RENDER_WAIT_TIMEOUT=0.5)
+        self.assertEqual(self.render("<html>Report</html>", PDF_RENDER_WORKERS=1), "<html>Report</html>")
+
+    def test_crash_recovery(self):
+        self.render("<html>Report</html>")
+        # Kill the workers, the next file is rendered in a new pool
+        for process in list(pdf_service._pool._processes.values()):
+            os.kill(process.pid, signal.SIGKILL)
+            process.join()
+        self.assertEqual(self.render("<html>Recovered</html>"), "<html>Recovered</html>")
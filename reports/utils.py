@@ -2,6 +2,7 @@ from django.template import Context, Template, Engine
 
 from Questionaire.models import Technology, Inquiry
 from Questionaire.utils import get_inquiry_from_request
+from Questionaire.processors.tech_score_resolver import TechScoreResolver
 
 
 def full_render_layout(layout_html, context, p_num_increment=0, **kwargs):
@@ -31,11 +32,9 @@ class TechListReportPageRetrieval:
         # Create lists of various technology states
         techs = []
 
-        for tech in Technology.objects.filter(display_in_step_2_list=True):
-            if hasattr(tech, 'techgroup'):
-                tech = tech.techgroup
-
-            if tech.get_score(inquiry) == score_mode:
+        technologies = Technology.objects.filter(display_in_step_2_list=True).select_related('techgroup')
+        for tech in TechScoreResolver.for_inquiry(inquiry).annotate_technologies(technologies):
+            if tech.score == score_mode:
                 techs.append(tech)
 
         return techs